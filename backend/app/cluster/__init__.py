@@ -0,0 +1,16 @@
+from app.cluster.backplane import Backplane, InProcessBackplane, InProcessHub, UnixSocketBackplane, run_hub
+from app.cluster.node import Cluster
+from app.cluster.ring import HashRing
+
+cluster = Cluster()
+
+__all__ = [
+    "Backplane",
+    "InProcessBackplane",
+    "InProcessHub",
+    "UnixSocketBackplane",
+    "run_hub",
+    "Cluster",
+    "HashRing",
+    "cluster",
+]
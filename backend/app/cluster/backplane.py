@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import os
+import struct
+from typing import Any, Awaitable, Callable
+
+from app import codec
+
+MessageHandler = Callable[[dict[str, Any]], Awaitable[None]]
+MembersHandler = Callable[[list[str]], None]
+
+_FRAME_HEADER = struct.Struct(">I")
+
+
+class Backplane(abc.ABC):
+    """Ordered pub/sub link between the worker processes of one deployment.
+
+    publish() enqueues synchronously and delivers every message, in order, to every
+    other worker; on_members is called with the full worker list whenever a worker
+    joins or leaves.
+    """
+
+    def __init__(self, worker_id: str) -> None:
+        self.worker_id = worker_id
+        self._on_message: MessageHandler | None = None
+        self._on_members: MembersHandler | None = None
+
+    async def start(self, on_message: MessageHandler, on_members: MembersHandler) -> None:
+        self._on_message = on_message
+        self._on_members = on_members
+
+    async def stop(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def publish(self, message: dict[str, Any]) -> None:
+        """Send message to every other worker."""
+
+
+class InProcessHub:
+    """Connects InProcessBackplanes living in the same process (tests, single-worker runs)."""
+
+    def __init__(self) -> None:
+        self.backplanes: list[InProcessBackplane] = []
+
+    def members(self) -> list[str]:
+        return [backplane.worker_id for backplane in self.backplanes]
+
+    def announce(self) -> None:
+        members = self.members()
+        for backplane in self.backplanes:
+            if backplane._on_members:
+                backplane._on_members(members)
+
+
+_default_hub = InProcessHub()
+
+
+class InProcessBackplane(Backplane):
+    def __init__(self, worker_id: str, hub: InProcessHub | None = None) -> None:
+        super().__init__(worker_id)
+        self._hub = hub or _default_hub
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    async def start(self, on_message: MessageHandler, on_members: MembersHandler) -> None:
+        await super().start(on_message, on_members)
+        self._hub.backplanes.append(self)
+        self._task = asyncio.get_event_loop().create_task(self._deliver())
+        self._hub.announce()
+
+    async def stop(self) -> None:
+        if self in self._hub.backplanes:
+            self._hub.backplanes.remove(self)
+            self._hub.announce()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, message: dict[str, Any]) -> None:
+        for backplane in self._hub.backplanes:
+            if backplane is not self:
+                backplane._queue.put_nowait(message)
+
+    async def _deliver(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._on_message(message)
+            except Exception:
+                pass  # One bad message must not stop delivery
+
+
+def _encode_frame(message: dict[str, Any]) -> bytes:
+    body = codec.dumps_bytes(message)
+    return _FRAME_HEADER.pack(len(body)) + body
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> dict[str, Any]:
+    header = await reader.readexactly(_FRAME_HEADER.size)
+    (length,) = _FRAME_HEADER.unpack(header)
+    return codec.loads(await reader.readexactly(length))
+
+
+class UnixSocketBackplane(Backplane):
+    """Backplane client for the hub started by run_hub() on a local Unix socket."""
+
+    def __init__(self, worker_id: str, path: str, connect_timeout: float = 10.0) -> None:
+        super().__init__(worker_id)
+        self._path = path
+        self._connect_timeout = connect_timeout
+        self._outgoing: asyncio.Queue[bytes] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self, on_message: MessageHandler, on_members: MembersHandler) -> None:
+        await super().start(on_message, on_members)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self._connect_timeout
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self._path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # The hub is started by the parent process and may still be binding
+                if loop.time() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+        writer.write(_encode_frame({"type": "hello", "worker": self.worker_id}))
+        await writer.drain()
+        self._tasks = [
+            loop.create_task(self._read_loop(reader)),
+            loop.create_task(self._write_loop(writer)),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def publish(self, message: dict[str, Any]) -> None:
+        self._outgoing.put_nowait(_encode_frame(message))
+
+    async def _write_loop(self, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                writer.write(await self._outgoing.get())
+                # Coalesce whatever else is already queued into the same drain
+                while not self._outgoing.empty():
+                    writer.write(self._outgoing.get_nowait())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            message = await _read_frame(reader)
+            if message.get("type") == "members":
+                self._on_members(message["workers"])
+                continue
+            try:
+                await self._on_message(message)
+            except Exception:
+                pass  # One bad message must not stop delivery
+
+
+async def serve_hub(path: str) -> None:
+    """Relay every frame from one worker to all the others and track membership."""
+    workers: dict[asyncio.StreamWriter, str] = {}
+
+    def announce() -> None:
+        frame = _encode_frame({"type": "members", "workers": sorted(workers.values())})
+        for writer in workers:
+            writer.write(frame)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            hello = await _read_frame(reader)
+            workers[writer] = hello["worker"]
+            announce()
+            while True:
+                header = await reader.readexactly(_FRAME_HEADER.size)
+                frame = header + await reader.readexactly(_FRAME_HEADER.unpack(header)[0])
+                for other in workers:
+                    if other is not writer:
+                        other.write(frame)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            workers.pop(writer, None)
+            writer.close()
+            announce()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle, path)
+    async with server:
+        await server.serve_forever()
+
+
+def run_hub(path: str) -> None:
+    """Process entry point for the Unix-socket hub."""
+    asyncio.run(serve_hub(path))
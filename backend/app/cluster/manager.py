@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+from app.cluster.node import Cluster
+
+
+class BackplaneManager(AsyncPubSubManager):
+    """Socket.IO client manager that shares emits and room membership across workers over the Backplane."""
+
+    name = "backplane"
+
+    def __init__(self, cluster: Cluster, channel: str = "socketio") -> None:
+        super().__init__(channel=channel)
+        self._cluster = cluster
+        self._inbox: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        cluster.set_sio_listener(self._inbox.put_nowait)
+
+    async def _publish(self, data: dict[str, Any]) -> None:
+        self.publish_nowait(data)
+
+    def publish_nowait(self, data: dict[str, Any]) -> None:
+        """Publish synchronously so messages keep the order in which they were produced."""
+        if self._cluster.enabled:
+            self._cluster.publish_sio(data)
+
+    def enter_room_nowait(self, sid: str, namespace: str, room: str) -> None:
+        """Room join for a socket connected to another worker."""
+        self.publish_nowait({
+            "method": "enter_room", "sid": sid, "room": room, "namespace": namespace, "host_id": self.host_id,
+        })
+
+    def leave_room_nowait(self, sid: str, namespace: str, room: str) -> None:
+        self.publish_nowait({
+            "method": "leave_room", "sid": sid, "room": room, "namespace": namespace, "host_id": self.host_id,
+        })
+
+    async def _listen(self):
+        while True:
+            yield await self._inbox.get()
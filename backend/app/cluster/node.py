@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import os
+import uuid
+from typing import Any, Awaitable, Callable
+
+from app.cluster.backplane import Backplane
+from app.cluster.ring import HashRing
+
+RpcHandler = Callable[[dict[str, Any]], Awaitable[Any]]
+MembershipHandler = Callable[[], Awaitable[None]]
+
+
+def pack_data(data: Any) -> Any:
+    """Make a Socket.IO event payload JSON-safe for the backplane (binary events carry bytes)."""
+    if isinstance(data, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(data).decode()}
+    return data
+
+
+def unpack_data(data: Any) -> Any:
+    if isinstance(data, dict) and len(data) == 1 and "__bytes__" in data:
+        return base64.b64decode(data["__bytes__"])
+    return data
+
+
+class Cluster:
+    """This worker's view of the deployment: who owns which realm, and how to reach them.
+
+    Disabled (the default) it reports every realm as local, so single-process code paths
+    are unchanged. Enabled, realms are assigned to workers by consistent hashing of the
+    realm id, and workers reach each other over the configured Backplane.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.ring = HashRing([self.worker_id])
+        self._backplane: Backplane | None = None
+        self._rpc_handlers: dict[str, RpcHandler] = {}
+        self._event_handler: RpcHandler | None = None
+        self._membership_handler: MembershipHandler | None = None
+        self._sio_listener: Callable[[dict[str, Any]], None] | None = None
+        self._replies: dict[str, asyncio.Future] = {}
+
+    def configure(self, backplane: Backplane) -> None:
+        self.worker_id = backplane.worker_id
+        self.ring.set_workers([self.worker_id])
+        self._backplane = backplane
+        self.enabled = True
+
+    async def start(self) -> None:
+        if self._backplane is not None:
+            await self._backplane.start(self._on_message, self._set_workers)
+
+    async def stop(self) -> None:
+        if self._backplane is not None:
+            await self._backplane.stop()
+
+    # --- ownership ---
+
+    def _set_workers(self, workers: list[str]) -> None:
+        self.ring.set_workers(workers)
+        if self._membership_handler is not None:
+            asyncio.get_event_loop().create_task(self._membership_handler())
+
+    def owner_of(self, realm_id: str) -> str:
+        return self.ring.owner_of(realm_id) or self.worker_id
+
+    def is_local(self, realm_id: str) -> bool:
+        return not self.enabled or self.owner_of(realm_id) == self.worker_id
+
+    # --- handlers ---
+
+    def on(self, method: str, handler: RpcHandler) -> None:
+        """Register an RPC callable by other workers."""
+        self._rpc_handlers[method] = handler
+
+    def on_socket_event(self, handler: RpcHandler) -> None:
+        """Register the handler that runs Socket.IO events forwarded from another worker."""
+        self._event_handler = handler
+
+    def on_membership_change(self, handler: MembershipHandler) -> None:
+        """Register what runs after a worker joins or leaves, once the ring has moved realms to new owners."""
+        self._membership_handler = handler
+
+    def set_sio_listener(self, listener: Callable[[dict[str, Any]], None]) -> None:
+        self._sio_listener = listener
+
+    # --- sending ---
+
+    def publish_sio(self, data: dict[str, Any]) -> None:
+        self._backplane.publish({"type": "sio", "data": data})
+
+    def forward_event(self, worker: str, event: str, sid: str, data: Any, session: dict[str, Any]) -> None:
+        """Hand a Socket.IO event to the realm owner. Fire-and-forget, ordered with everything else."""
+        self._backplane.publish({
+            "type": "event",
+            "to": worker,
+            "event": event,
+            "sid": sid,
+            "data": pack_data(data),
+            "session": session,
+        })
+
+    async def call(self, worker: str, method: str, payload: dict[str, Any], timeout: float = 5.0) -> Any:
+        if worker == self.worker_id or not self.enabled:
+            return await self._rpc_handlers[method](payload)
+
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_event_loop().create_future()
+        self._replies[request_id] = future
+        self._backplane.publish({
+            "type": "rpc",
+            "to": worker,
+            "from": self.worker_id,
+            "id": request_id,
+            "method": method,
+            "payload": payload,
+        })
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._replies.pop(request_id, None)
+
+    async def call_all(self, method: str, payload: dict[str, Any], timeout: float = 5.0) -> list[Any]:
+        """Call method on every worker, this one included. Workers that fail or time out are skipped."""
+        results = await asyncio.gather(
+            *(self.call(worker, method, payload, timeout) for worker in self.ring.workers),
+            return_exceptions=True,
+        )
+        return [result for result in results if not isinstance(result, BaseException)]
+
+    # --- receiving ---
+
+    async def _on_message(self, message: dict[str, Any]) -> None:
+        kind = message.get("type")
+        if kind == "sio":
+            if self._sio_listener:
+                self._sio_listener(message["data"])
+            return
+
+        if message.get("to") != self.worker_id:
+            return
+
+        if kind == "event":
+            if self._event_handler:
+                message["data"] = unpack_data(message["data"])
+                asyncio.get_event_loop().create_task(self._event_handler(message))
+        elif kind == "rpc":
+            asyncio.get_event_loop().create_task(self._answer(message))
+        elif kind == "reply":
+            future = self._replies.get(message["id"])
+            if future is not None and not future.done():
+                if "error" in message:
+                    future.set_exception(RuntimeError(message["error"]))
+                else:
+                    future.set_result(message["result"])
+
+    async def _answer(self, message: dict[str, Any]) -> None:
+        reply: dict[str, Any] = {"type": "reply", "to": message["from"], "id": message["id"]}
+        try:
+            reply["result"] = await self._rpc_handlers[message["method"]](message["payload"])
+        except Exception as e:
+            reply["error"] = str(e)
+        self._backplane.publish(reply)
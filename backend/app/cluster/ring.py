@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import Iterable
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring mapping keys (realm ids) to worker ids.
+
+    Each worker is placed on the ring `replicas` times so keys spread evenly and only
+    about 1/n of them move when a worker joins or leaves.
+    """
+
+    def __init__(self, workers: Iterable[str] = (), replicas: int = 64) -> None:
+        self.replicas = replicas
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self.workers: tuple[str, ...] = ()
+        self.set_workers(workers)
+
+    def set_workers(self, workers: Iterable[str]) -> None:
+        self.workers = tuple(sorted(set(workers)))
+        ring = sorted(
+            (_hash(f"{worker}#{replica}"), worker)
+            for worker in self.workers
+            for replica in range(self.replicas)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [worker for _, worker in ring]
+
+    def owner_of(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
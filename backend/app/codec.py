@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any
+
+from starlette.responses import JSONResponse as _StarletteJSONResponse
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used without it
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None and settings.JSON_CODEC in ("auto", "orjson"):
+    name = "orjson"
+
+    def dumps_bytes(obj: Any) -> bytes:
+        # orjson encodes UUIDs and datetimes natively
+        return orjson.dumps(obj)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    loads = orjson.loads
+else:
+    name = "json"
+    _encoder = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default)
+
+    def dumps(obj: Any) -> str:
+        return _encoder.encode(obj)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode()
+
+    loads = json.loads
+
+
+class JSONResponse(_StarletteJSONResponse):
+    """JSONResponse rendered with the configured codec."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+class SocketIOJSON:
+    """The json-module interface python-socketio/engine.io expect, backed by the configured codec."""
+
+    @staticmethod
+    def dumps(obj: Any, *args: Any, **kwargs: Any) -> str:
+        # Separators and other stdlib options are ignored: output is always compact
+        return dumps(obj)
+
+    @staticmethod
+    def loads(data: str | bytes, *args: Any, **kwargs: Any) -> Any:
+        return loads(data)
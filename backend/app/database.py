@@ -1,38 +1,116 @@
 from __future__ import annotations
 
-import json
+import time
 from typing import Any, Optional
 
 import asyncpg
 
+from app import codec, metrics
 from app.config import settings
 
-pool: asyncpg.Pool | None = None
+pool: asyncpg.Pool | MeteredPool | None = None
 
 
 async def _init_connection(conn: asyncpg.Connection) -> None:
-    """Set up JSONB codec so asyncpg auto-decodes JSONB to Python dicts."""
+    """Set up JSONB codec so asyncpg auto-decodes JSONB to Python dicts, and UUIDs to strings."""
     await conn.set_type_codec(
         "jsonb",
-        encoder=json.dumps,
-        decoder=json.loads,
+        encoder=codec.dumps,
+        decoder=codec.loads,
         schema="pg_catalog",
     )
     await conn.set_type_codec(
         "json",
-        encoder=json.dumps,
-        decoder=json.loads,
+        encoder=codec.dumps,
+        decoder=codec.loads,
         schema="pg_catalog",
     )
+    # Ids are handled as strings everywhere, so decode them as such instead of converting per row
+    await conn.set_type_codec(
+        "uuid",
+        encoder=str,
+        decoder=str,
+        schema="pg_catalog",
+    )
+    if settings.METRICS_ENABLED:
+        conn.add_query_logger(metrics.observe_query)
+
+
+class _TimedAcquire:
+    """pool.acquire() context that records how long the acquire waited for a free connection."""
+
+    __slots__ = ("_context",)
+
+    def __init__(self, context) -> None:
+        self._context = context
+
+    async def __aenter__(self) -> asyncpg.Connection:
+        started = time.perf_counter()
+        try:
+            return await self._context.__aenter__()
+        finally:
+            metrics.pool_acquire_seconds.observe(time.perf_counter() - started)
+
+    async def __aexit__(self, *exc) -> None:
+        await self._context.__aexit__(*exc)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def _acquire(self) -> asyncpg.Connection:
+        started = time.perf_counter()
+        try:
+            return await self._context
+        finally:
+            metrics.pool_acquire_seconds.observe(time.perf_counter() - started)
+
+
+class MeteredPool:
+    """Wraps an asyncpg pool to record how long each acquire waits for a free connection.
+
+    Only the pool's public API is used: the query shortcuts run on a connection from
+    the timed acquire(), everything else goes to the pool as is.
+    """
+
+    def __init__(self, pool: asyncpg.Pool) -> None:
+        self._pool = pool
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+    def acquire(self, *, timeout: float | None = None) -> _TimedAcquire:
+        return _TimedAcquire(self._pool.acquire(timeout=timeout))
+
+    async def execute(self, query: str, *args: Any, timeout: float | None = None) -> str:
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command: str, args: Any, *, timeout: float | None = None) -> None:
+        async with self.acquire() as conn:
+            return await conn.executemany(command, args, timeout=timeout)
+
+    async def fetch(self, query: str, *args: Any, timeout: float | None = None) -> list[asyncpg.Record]:
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(self, query: str, *args: Any, timeout: float | None = None) -> asyncpg.Record | None:
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(self, query: str, *args: Any, column: int = 0, timeout: float | None = None) -> Any:
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, column=column, timeout=timeout)
 
 
-async def create_pool() -> asyncpg.Pool:
+async def create_pool() -> asyncpg.Pool | MeteredPool:
     global pool
     dsn = settings.DATABASE_URL
     # asyncpg expects "postgresql://" scheme
     if dsn.startswith("postgres://"):
         dsn = dsn.replace("postgres://", "postgresql://", 1)
     pool = await asyncpg.create_pool(dsn, init=_init_connection)
+    if settings.METRICS_ENABLED:
+        pool = MeteredPool(pool)
     return pool
 
 
@@ -43,21 +121,16 @@ async def close_pool() -> None:
         pool = None
 
 
-def get_pool() -> asyncpg.Pool:
+def get_pool() -> asyncpg.Pool | MeteredPool:
     assert pool is not None, "Database pool not initialized"
     return pool
 
 
 def record_to_dict(record: asyncpg.Record) -> dict[str, Any]:
-    """Convert asyncpg Record to dict, serializing UUIDs to strings and keeping JSON as-is."""
-    d = dict(record)
-    for k, v in d.items():
-        if hasattr(v, "hex") and hasattr(v, "int"):
-            # UUID object
-            d[k] = str(v)
-    return d
+    """Convert asyncpg Record to dict. UUIDs already arrive as strings (see _init_connection)."""
+    return dict(record)
 
 
 def json_dumps(obj: Any) -> str:
     """Serialize to JSON string for asyncpg JSONB columns."""
-    return json.dumps(obj)
+    return codec.dumps(obj)
@@ -1,19 +1,30 @@
-import asyncio
+import multiprocessing
 
 import socketio
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 
+from app import codec, metrics
+from app.cluster import InProcessBackplane, UnixSocketBackplane, cluster, run_hub
+from app.cluster.manager import BackplaneManager
+from app.codec import JSONResponse
 from app.config import settings
 from app.database import create_pool, close_pool
 from app.routes.game import router as game_router
 from app.routes.profiles import router as profiles_router
 from app.routes.realms import router as realms_router
+from app.services.chat import chat_archive
+from app.services.snapshot import session_snapshots
+from app.services.writebehind import profile_writer
 from app.session import session_manager
+from app.sockets.chat import chat_relay
+from app.sockets.counts import player_counts
 from app.sockets.handlers import register_handlers
-from app.sockets.helpers import kick_player, set_sio
+from app.sockets.helpers import RESTART_MESSAGE, drain, enter_game_room, leave_game_room, set_sio
+from app.sockets.outbound import outbound
+from app.sockets.routing import register_rpc
+from app.sockets.ticker import movement_ticker
 
 # --- FastAPI app ---
 app = FastAPI()
@@ -39,44 +50,103 @@ async def generic_exception_handler(request: Request, exc: Exception) -> JSONRes
 @app.on_event("startup")
 async def startup():
     await create_pool()
+    await cluster.start()
+    # Before the first join, so returning players find their place
+    session_snapshots.restore()
+    session_snapshots.start()
+    profile_writer.start()
+    if settings.CHAT_PERSIST:
+        chat_archive.start()
+    movement_ticker.start()
+    chat_relay.start()
+    player_counts.start()
+    if settings.METRICS_ENABLED:
+        metrics.loop_lag.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    # Deploys drain through POST /drain first, while sockets are still open; this only catches the rest
+    await drain(RESTART_MESSAGE, 0)
+    await session_snapshots.stop()
+    await metrics.loop_lag.stop()
+    await movement_ticker.stop()
+    await chat_relay.stop()
+    await player_counts.stop()
+    await cluster.stop()
+    await profile_writer.stop()
+    await chat_archive.stop()
     await close_pool()
 
 
+# --- Cluster ---
+# Each worker process owns the realms the hash ring assigns it; sockets connected
+# elsewhere reach them through the backplane.
+if settings.CLUSTER_BACKPLANE == "unix":
+    cluster.configure(UnixSocketBackplane(cluster.worker_id, settings.CLUSTER_SOCKET_PATH))
+elif settings.CLUSTER_BACKPLANE == "local":
+    cluster.configure(InProcessBackplane(cluster.worker_id))
+
 # --- Socket.IO server ---
-sio = socketio.AsyncServer(
-    async_mode="asgi",
-    cors_allowed_origins=[settings.FRONTEND_URL],
-)
+if cluster.enabled:
+    # Long-polling needs sticky sessions across workers; websocket-only does not
+    sio = socketio.AsyncServer(
+        async_mode="asgi",
+        cors_allowed_origins=[settings.FRONTEND_URL],
+        client_manager=BackplaneManager(cluster),
+        transports=["websocket"],
+        json=codec.SocketIOJSON,
+    )
+else:
+    sio = socketio.AsyncServer(
+        async_mode="asgi",
+        cors_allowed_origins=[settings.FRONTEND_URL],
+        json=codec.SocketIOJSON,
+    )
 
 # Inject sio into helpers and session manager
 set_sio(sio)
+outbound.set_sio(sio)
+
+# --- Metrics ---
+if settings.METRICS_ENABLED:
+    metrics.instrument_engineio(sio.eio)
+metrics.registry.gauge(
+    "realm_shards",
+    "Active session shards per realm on this worker.",
+    lambda: ((realm_id, len(session_manager.get_realm_shards(realm_id))) for realm_id in session_manager.get_realm_ids()),
+    label="realm",
+)
+metrics.registry.gauge(
+    "realm_players",
+    "Players in each realm on this worker.",
+    lambda: ((realm_id, session_manager.get_realm_player_count(realm_id)) for realm_id in session_manager.get_realm_ids()),
+    label="realm",
+)
+metrics.registry.gauge(
+    "event_loop_lag_last_seconds",
+    "Most recent event loop lag sample.",
+    lambda: [("", metrics.loop_lag.last)],
+)
 
-
-# Wrap kick_player for synchronous calling context from session_manager.terminate_session
-def _sync_kick_wrapper(uid: str, reason: str) -> None:
-    """Schedule async kick_player on the running event loop."""
-    loop = asyncio.get_event_loop()
-    if loop.is_running():
-        loop.create_task(kick_player(uid, reason))
-    else:
-        loop.run_until_complete(kick_player(uid, reason))
-
-
-session_manager.set_kick_fn(_sync_kick_wrapper)
+session_manager.set_room_fns(enter_game_room, leave_game_room)
 
 register_handlers(sio)
+register_rpc()
 
 # --- Combined ASGI app ---
 combined_app = socketio.ASGIApp(sio, other_asgi_app=app)
 
 if __name__ == "__main__":
+    workers = 1
+    if settings.CLUSTER_BACKPLANE == "unix":
+        workers = max(1, settings.CLUSTER_WORKERS)
+        hub = multiprocessing.Process(target=run_hub, args=(settings.CLUSTER_SOCKET_PATH,), daemon=True)
+        hub.start()
+
     uvicorn.run(
         "app.main:combined_app",
         host="0.0.0.0",
         port=settings.PORT,
-        workers=1,
+        workers=workers,
     )
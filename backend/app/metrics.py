@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from app.config import settings
+
+# Seconds; handler, query and loop-lag latencies
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Recipients per broadcast
+FANOUT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Distinct statements tracked by db_query_seconds; later ones share the "other" series
+_MAX_STATEMENTS = 200
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and three additions."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # Last slot is the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Family:
+    """A metric with at most one label. Children are created once and kept by callers on hot paths."""
+
+    def __init__(self, name: str, help: str, kind: str, label: str | None = None, buckets: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label = label
+        self.buckets = buckets
+        self.children: dict[str, Counter | Histogram] = {}
+
+    def labels(self, value: str = "") -> Counter | Histogram:
+        child = self.children.get(value)
+        if child is None:
+            child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+            self.children[value] = child
+        return child
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for value, child in self.children.items():
+            label = f'{self.label}="{_escape(value)}"' if self.label else ""
+            if isinstance(child, Counter):
+                yield f"{self.name}{{{label}}} {child.value}" if label else f"{self.name} {child.value}"
+                continue
+            sep = "," if label else ""
+            cumulative = 0
+            for bound, count in zip(child.bounds + (float("inf"),), child.counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label}{sep}le="{_format(bound)}"}} {cumulative}'
+            suffix = f"{{{label}}}" if label else ""
+            yield f"{self.name}_sum{suffix} {child.sum}"
+            yield f"{self.name}_count{suffix} {child.count}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._families: list[Family] = []
+        # Gauges read at scrape time: name -> (help, label, collect() -> [(label value, number)])
+        self._gauges: list[tuple[str, str, str | None, Callable[[], Iterable[tuple[str, float]]]]] = []
+
+    def counter(self, name: str, help: str, label: str | None = None) -> Family:
+        family = Family(name, help, "counter", label)
+        self._families.append(family)
+        return family
+
+    def histogram(self, name: str, help: str, buckets: tuple, label: str | None = None) -> Family:
+        family = Family(name, help, "histogram", label, buckets)
+        self._families.append(family)
+        return family
+
+    def gauge(self, name: str, help: str, collect: Callable[[], Iterable[tuple[str, float]]], label: str | None = None) -> None:
+        self._gauges.append((name, help, label, collect))
+
+    def render(self) -> str:
+        """Prometheus text exposition format, version 0.0.4."""
+        lines: list[str] = []
+        for family in self._families:
+            lines.extend(family.render())
+        for name, help, label, collect in self._gauges:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            try:
+                samples = list(collect())
+            except Exception:
+                samples = []  # A failing collector must not break the scrape
+            for value, number in samples:
+                if label:
+                    lines.append(f'{name}{{{label}="{_escape(value)}"}} {number}')
+                else:
+                    lines.append(f"{name} {number}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+registry = Registry()
+
+handler_seconds = registry.histogram(
+    "socketio_handler_seconds", "Socket.IO event handler latency.", LATENCY_BUCKETS, label="event"
+)
+fanout_recipients = registry.histogram(
+    "socketio_broadcast_recipients", "Recipients per outbound broadcast.", FANOUT_BUCKETS, label="event"
+)
+sent_messages = registry.counter("socketio_sent_messages_total", "Engine.IO messages sent to clients.", label="kind")
+sent_bytes = registry.counter("socketio_sent_bytes_total", "Engine.IO message payload bytes sent to clients.", label="kind")
+pool_acquire_seconds = registry.histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for a connection from the asyncpg pool.", LATENCY_BUCKETS
+).labels()
+query_seconds = registry.histogram("db_query_seconds", "Query latency per statement.", LATENCY_BUCKETS, label="statement")
+query_errors = registry.counter("db_query_errors_total", "Failed queries per statement.", label="statement")
+loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer scheduled LOOP_LAG_INTERVAL ahead.", LATENCY_BUCKETS
+).labels()
+
+_text_messages = sent_messages.labels("text")
+_binary_messages = sent_messages.labels("binary")
+_text_bytes = sent_bytes.labels("text")
+_binary_bytes = sent_bytes.labels("binary")
+# Raw SQL text -> its db_query_seconds and db_query_errors_total children
+_statements: dict[str, tuple[Histogram, Counter]] = {}
+
+
+def timed(event: str, handler: Callable) -> Callable:
+    """Wrap an async Socket.IO handler so each call is recorded in socketio_handler_seconds."""
+    if not settings.METRICS_ENABLED:
+        return handler
+    histogram = handler_seconds.labels(event)
+    perf_counter = time.perf_counter
+
+    async def run(*args):
+        started = perf_counter()
+        try:
+            return await handler(*args)
+        finally:
+            histogram.observe(perf_counter() - started)
+
+    return run
+
+
+def count_sent(data) -> None:
+    """Count one Engine.IO message payload sent to one client."""
+    if isinstance(data, (bytes, bytearray)):
+        _binary_messages.value += 1
+        _binary_bytes.value += len(data)
+    else:
+        _text_messages.value += 1
+        _text_bytes.value += len(data) if data is not None else 0
+
+
+def instrument_engineio(eio) -> None:
+    """Count every message the Engine.IO server sends: one call per recipient, so bytes reflect fan-out."""
+    send_packet = eio.send_packet
+
+    async def counted_send_packet(sid, pkt):
+        count_sent(pkt.data)
+        return await send_packet(sid, pkt)
+
+    eio.send_packet = counted_send_packet
+
+
+def _statement(query: str) -> tuple[Histogram, Counter]:
+    entry = _statements.get(query)
+    if entry is not None:
+        return entry
+    if len(_statements) >= _MAX_STATEMENTS:
+        return query_seconds.labels("other"), query_errors.labels("other")
+    label = " ".join(query.split())[:120]
+    entry = _statements[query] = (query_seconds.labels(label), query_errors.labels(label))
+    return entry
+
+
+def observe_query(logged) -> None:
+    """asyncpg query logger: record latency, and errors, per statement."""
+    latency, errors = _statement(logged.query)
+    latency.observe(logged.elapsed)
+    if logged.exception is not None:
+        errors.inc()
+
+
+class LoopLagMonitor:
+    """Measures event loop lag: how much later than scheduled a periodic sleep wakes up."""
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+        self._task: asyncio.Task | None = None
+        self.last = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            scheduled = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self.last = max(0.0, loop.time() - scheduled)
+            loop_lag_seconds.observe(self.last)
+
+
+loop_lag = LoopLagMonitor(settings.METRICS_LOOP_LAG_INTERVAL)
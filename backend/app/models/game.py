@@ -1,17 +1,25 @@
-from pydantic import BaseModel
+from typing import Annotated, Optional
+
+from pydantic import BaseModel, Field
+
+# Positions clients may move to: the int16 range of the binary protocol, so binary clients see every player
+Coord = Annotated[int, Field(ge=-0x8000, le=0x7FFF)]
 
 
 class JoinRealmData(BaseModel):
     realmId: str
     shareId: str
+    # Optional shard preference: a specific instance, or the one a friend is in
+    shardId: Optional[str] = None
+    followUid: Optional[str] = None
 
 
 class MovePlayerData(BaseModel):
-    x: int
-    y: int
+    x: Coord
+    y: Coord
 
 
 class TeleportData(BaseModel):
-    x: int
-    y: int
+    x: Coord
+    y: Coord
     roomIndex: int
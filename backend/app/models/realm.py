@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class CreateRealmBody(BaseModel):
@@ -16,3 +16,36 @@ class UpdateRealmBody(BaseModel):
     only_owner: bool | None = None
     name: str | None = None
     share_id: str | None = None
+
+
+TileField = Literal["floor", "above_floor", "object", "impassable", "teleporter", "privateAreaId"]
+
+
+class TeleporterTarget(BaseModel):
+    roomIndex: int
+    x: int
+    y: int
+
+
+class TileValues(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    floor: str | None = None
+    above_floor: str | None = None
+    object: str | None = None
+    impassable: bool | None = None
+    teleporter: TeleporterTarget | None = None
+    privateAreaId: str | None = None
+
+
+class TilePatch(BaseModel):
+    x: int
+    y: int
+    # Fields written on the tile, applied after erase
+    set: TileValues | None = None
+    # Fields removed from the tile; a tile left with no fields is deleted
+    erase: list[TileField] = []
+
+
+class RoomPatchBody(BaseModel):
+    tiles: list[TilePatch]
@@ -1,9 +1,19 @@
+import hmac
 from typing import List, Optional
 
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
 
-from app.session import session_manager
+from app import metrics
+from app.codec import JSONResponse
+from app.config import settings
+from app.services.realms import cache_stats
+from app.services.snapshot import session_snapshots
+from app.services.writebehind import profile_writer
+from app.sockets.admission import join_admission
+from app.sockets.helpers import RESTART_MESSAGE
+from app.sockets.outbound import outbound
+from app.sockets.routing import drain_all, players_in_room, shard_counts
 
 router = APIRouter()
 
@@ -21,12 +31,11 @@ async def get_players_in_room(roomIndex: Optional[str] = None, uid: Optional[str
     except (ValueError, TypeError):
         return JSONResponse({"message": "Invalid parameters"}, status_code=400)
 
-    session = session_manager.get_player_session(uid)
-    if not session:
+    players = await players_in_room(uid, room_index)
+    if players is None:
         return JSONResponse({"message": "User not in a realm."}, status_code=400)
 
-    players = session.get_players_in_room(room_index)
-    return JSONResponse({"players": [p.to_dict() for p in players]})
+    return JSONResponse({"players": players})
 
 
 @router.get("/getPlayerCounts")
@@ -38,12 +47,38 @@ async def get_player_counts(realmIds: Optional[str] = None) -> JSONResponse:
     if len(realm_id_list) > 100:
         return JSONResponse({"message": "Too many server IDs"}, status_code=400)
 
-    player_counts: List[int] = []
-    for realm_id in realm_id_list:
-        session = session_manager.get_session(realm_id)
-        if session:
-            player_counts.append(session.get_player_count())
-        else:
-            player_counts.append(0)
+    counts: List[List[int]] = await shard_counts(realm_id_list)
+    player_counts: List[int] = [sum(shard_list) for shard_list in counts]
 
-    return JSONResponse({"playerCounts": player_counts})
+    return JSONResponse({"playerCounts": player_counts, "shardCounts": counts})
+
+
+@router.get("/getOutboundStats")
+async def get_outbound_stats() -> JSONResponse:
+    return JSONResponse(outbound.stats())
+
+
+@router.get("/getCacheStats")
+async def get_cache_stats() -> JSONResponse:
+    return JSONResponse({
+        **cache_stats(),
+        "joins": join_admission.stats(),
+        "profileWrites": profile_writer.stats(),
+        "snapshots": session_snapshots.stats(),
+    })
+
+
+@router.get("/metrics")
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.post("/drain")
+async def drain_server(request: Request) -> JSONResponse:
+    """Before a deploy: refuse new joins and kick every player, returning once the kicks are delivered."""
+    token = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not settings.DRAIN_TOKEN or not hmac.compare_digest(token, settings.DRAIN_TOKEN):
+        return JSONResponse({"message": "Not found"}, status_code=404)
+
+    kicked = await drain_all(RESTART_MESSAGE, settings.DRAIN_TIMEOUT)
+    return JSONResponse({"kicked": kicked})
@@ -1,28 +1,57 @@
+from typing import Optional
+
 from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
 
+from app.codec import JSONResponse
 from app.database import get_pool, record_to_dict
+from app.services.realms import profile_exists, remember_skin
+from app.services.writebehind import profile_writer
+from app.sockets.routing import invalidate_cached
 
 router = APIRouter(prefix="/api/profiles")
 
 
+@router.get("/batch")
+async def get_profiles_batch(ids: Optional[str] = None) -> JSONResponse:
+    if not ids:
+        return JSONResponse({"message": "ids is required"}, status_code=400)
+
+    id_list = ids.split(",")
+    if len(id_list) > 100:
+        return JSONResponse({"message": "Too many ids"}, status_code=400)
+
+    pool = get_pool()
+    try:
+        rows = await pool.fetch(
+            "SELECT id, username, skin FROM profiles WHERE id = ANY($1::text[])",
+            id_list,
+        )
+        return JSONResponse([record_to_dict(r) for r in rows])
+    except Exception as e:
+        return JSONResponse({"message": str(e)}, status_code=500)
+
+
 @router.get("/{profile_id}")
 async def get_profile(profile_id: str) -> JSONResponse:
     pool = get_pool()
     try:
-        # Upsert: create profile if it doesn't exist
+        # Create the profile if it doesn't exist and return it, in one round trip
         row = await pool.fetchrow(
-            "INSERT INTO profiles (id) VALUES ($1) ON CONFLICT (id) DO NOTHING RETURNING *",
-            profile_id,
-        )
-        if row:
-            return JSONResponse(record_to_dict(row))
-        # Already exists, fetch it
-        existing = await pool.fetchrow(
-            "SELECT * FROM profiles WHERE id = $1",
+            """
+            WITH inserted AS (
+                INSERT INTO profiles (id) VALUES ($1) ON CONFLICT (id) DO NOTHING RETURNING *
+            )
+            SELECT * FROM inserted
+            UNION ALL
+            SELECT * FROM profiles WHERE id = $1
+            LIMIT 1
+            """,
             profile_id,
         )
-        return JSONResponse(record_to_dict(existing))
+        if row is None:
+            # A concurrent request inserted the row after this statement's snapshot was taken
+            row = await pool.fetchrow("SELECT * FROM profiles WHERE id = $1", profile_id)
+        return JSONResponse(record_to_dict(row))
     except Exception as e:
         return JSONResponse({"message": str(e)}, status_code=500)
 
@@ -31,55 +60,65 @@ async def get_profile(profile_id: str) -> JSONResponse:
 async def update_skin(profile_id: str, request: Request) -> JSONResponse:
     body = await request.json()
     skin = body.get("skin")
-    if not skin:
+    if not skin or not isinstance(skin, str):
         return JSONResponse({"message": "skin is required"}, status_code=400)
 
-    pool = get_pool()
     try:
-        row = await pool.fetchrow(
-            "UPDATE profiles SET skin = $1 WHERE id = $2 RETURNING *",
-            skin, profile_id,
-        )
-        if not row:
-            return JSONResponse({"message": "Profile not found"}, status_code=404)
-        return JSONResponse(record_to_dict(row))
+        # Read only: the write itself is queued. A profile whose upsert is still queued exists as well
+        row = await get_pool().fetchrow("SELECT * FROM profiles WHERE id = $1", profile_id)
     except Exception as e:
         return JSONResponse({"message": str(e)}, status_code=500)
+    if not row and not profile_writer.has_pending_profile(profile_id):
+        return JSONResponse({"message": "Profile not found"}, status_code=404)
+
+    profile_writer.update_skin(profile_id, skin)
+    await invalidate_cached(uid=profile_id)
+    # The write is still queued: joins on this worker must see the new skin right away
+    remember_skin(profile_id, skin)
+    profile = record_to_dict(row) if row else {"id": profile_id}
+    return JSONResponse({**profile, "skin": skin})
 
 
 @router.get("/{profile_id}/visited-realms")
 async def get_visited_realms(profile_id: str) -> JSONResponse:
     pool = get_pool()
     try:
-        profile_row = await pool.fetchrow(
-            "SELECT visited_realms FROM profiles WHERE id = $1",
+        # One row per visited share id, in visit order; realm columns are NULL for deleted realms
+        rows = await pool.fetch(
+            """
+            SELECT v.share_id AS visited, r.id, r.name, r.share_id
+            FROM profiles p
+            CROSS JOIN LATERAL unnest(p.visited_realms) WITH ORDINALITY AS v(share_id, ord)
+            LEFT JOIN realms r ON r.share_id = v.share_id::uuid
+            WHERE p.id = $1
+            ORDER BY v.ord
+            """,
             profile_id,
         )
-        if not profile_row:
-            return JSONResponse([])
-
-        visited_share_ids: list[str] = profile_row["visited_realms"] or []
-        if not visited_share_ids:
-            return JSONResponse([])
 
         realms = []
         to_remove: list[str] = []
-        for share_id in visited_share_ids:
-            realm_row = await pool.fetchrow(
-                "SELECT id, name, share_id FROM realms WHERE share_id = $1::uuid",
-                share_id,
-            )
-            if realm_row:
-                realms.append(record_to_dict(realm_row))
-            else:
-                to_remove.append(share_id)
+        for row in rows:
+            if row["id"] is None:
+                to_remove.append(row["visited"])
+                continue
+            realm = record_to_dict(row)
+            del realm["visited"]
+            realms.append(realm)
 
         # Clean up stale visited realms
         if to_remove:
-            cleaned = [sid for sid in visited_share_ids if sid not in to_remove]
             await pool.execute(
-                "UPDATE profiles SET visited_realms = $1 WHERE id = $2",
-                cleaned, profile_id,
+                """
+                UPDATE profiles
+                SET visited_realms = ARRAY(
+                    SELECT v FROM unnest(visited_realms) WITH ORDINALITY AS t(v, ord)
+                    WHERE v <> ALL($2::text[])
+                    ORDER BY ord
+                )
+                WHERE id = $1
+                """,
+                profile_id, to_remove,
             )
 
         return JSONResponse(realms)
@@ -91,27 +130,14 @@ async def get_visited_realms(profile_id: str) -> JSONResponse:
 async def update_visited_realms(profile_id: str, request: Request) -> JSONResponse:
     body = await request.json()
     share_id = body.get("shareId")
-    if not share_id:
+    if not share_id or not isinstance(share_id, str):
         return JSONResponse({"message": "shareId is required"}, status_code=400)
 
-    pool = get_pool()
     try:
-        profile_row = await pool.fetchrow(
-            "SELECT visited_realms FROM profiles WHERE id = $1",
-            profile_id,
-        )
-        if not profile_row:
+        if not await profile_exists(profile_id):
             return JSONResponse({"message": "Profile not found"}, status_code=404)
-
-        visited: list[str] = profile_row["visited_realms"] or []
-        if share_id in visited:
-            return JSONResponse({"success": True})
-
-        visited.append(share_id)
-        await pool.execute(
-            "UPDATE profiles SET visited_realms = $1 WHERE id = $2",
-            visited, profile_id,
-        )
-        return JSONResponse({"success": True})
     except Exception as e:
         return JSONResponse({"message": str(e)}, status_code=500)
+
+    profile_writer.add_visited_realm(profile_id, share_id)
+    return JSONResponse({"success": True})
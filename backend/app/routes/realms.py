@@ -1,16 +1,78 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import uuid
 from typing import Optional
 
 from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
+from app.codec import JSONResponse
 from app.database import get_pool, record_to_dict
-from app.session import session_manager
+from app.models.realm import RoomPatchBody
+from app.services import realms as realm_store
+from app.services.encoding import EncodedBody
+from app.session.tilemap import diff_tilemap, is_structural_change
+from app.sockets.routing import invalidate_cached, patch_room_live, terminate_realm
 
 router = APIRouter(prefix="/api/realms")
 
+_MAX_PATCH_TILES = 10000
+
+# Columns of a realm as returned by the write endpoints (the row without its version)
+_ROW_COLUMNS = "id, owner_id, name, map_data, share_id, only_owner"
+
+# Rewrites only the patched keys of one room's tilemap: each tile is merged with its
+# edit (erase, then put) and dropped if no field is left. Returns the patched tiles.
+_PATCH_ROOM_SQL = """
+UPDATE realms
+SET version = version + 1,
+    map_data = jsonb_set(
+    map_data,
+    ARRAY['rooms', $2::int::text, 'tilemap'],
+    (coalesce(map_data #> ARRAY['rooms', $2::int::text, 'tilemap'], '{}'::jsonb) - $3::text[])
+    || coalesce((
+        SELECT jsonb_object_agg(merged.key, merged.tile)
+        FROM (
+            SELECT d.key,
+                   (coalesce(map_data #> ARRAY['rooms', $2::int::text, 'tilemap', d.key], '{}'::jsonb)
+                       - coalesce(d.erase, '{}'::text[]))
+                   || coalesce(d.put, '{}'::jsonb) AS tile
+            FROM jsonb_to_recordset($4::jsonb) AS d(key text, erase text[], put jsonb)
+        ) AS merged
+        WHERE merged.tile <> '{}'::jsonb
+    ), '{}'::jsonb)
+)
+WHERE id = $1::uuid AND jsonb_array_length(map_data -> 'rooms') > $2::int
+RETURNING (
+    SELECT jsonb_object_agg(k, map_data #> ARRAY['rooms', $2::int::text, 'tilemap', k])
+    FROM unnest($3::text[]) AS k
+) AS tiles
+"""
+
+
+def _encoded_response(request: Request, body: EncodedBody) -> Response:
+    """Serve a cached body: 304 if the client has this version, else the smallest encoding it accepts."""
+    headers = {"ETag": body.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if body.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    content, coding = body.negotiate(request.headers.get("accept-encoding", ""))
+    if coding:
+        headers["Content-Encoding"] = coding
+    return Response(content, media_type="application/json", headers=headers)
+
+
+def _classify_map_change(old: dict, new: dict) -> tuple[bool, list[tuple[int, dict]]]:
+    """(structural, [(roomIndex, changed tiles)]) for a full-map save."""
+    if is_structural_change(old, new):
+        return True, []
+    changes = []
+    for room_index, (old_room, new_room) in enumerate(zip(old["rooms"], new["rooms"])):
+        tiles = diff_tilemap(old_room.get("tilemap") or {}, new_room.get("tilemap") or {})
+        if tiles:
+            changes.append((room_index, tiles))
+    return False, changes
+
 
 @router.post("")
 async def create_realm(request: Request) -> JSONResponse:
@@ -26,12 +88,12 @@ async def create_realm(request: Request) -> JSONResponse:
     try:
         if map_data is not None:
             row = await pool.fetchrow(
-                "INSERT INTO realms (owner_id, name, map_data) VALUES ($1, $2, $3) RETURNING *",
+                f"INSERT INTO realms (owner_id, name, map_data) VALUES ($1, $2, $3) RETURNING {_ROW_COLUMNS}",
                 owner_id, name, map_data,
             )
         else:
             row = await pool.fetchrow(
-                "INSERT INTO realms (owner_id, name) VALUES ($1, $2) RETURNING *",
+                f"INSERT INTO realms (owner_id, name) VALUES ($1, $2) RETURNING {_ROW_COLUMNS}",
                 owner_id, name,
             )
         return JSONResponse(record_to_dict(row))
@@ -55,32 +117,49 @@ async def get_realms(ownerId: Optional[str] = None) -> JSONResponse:
         return JSONResponse({"message": str(e)}, status_code=500)
 
 
-@router.get("/by-share/{share_id}")
-async def get_realm_by_share(share_id: str) -> JSONResponse:
+@router.get("/batch")
+async def get_realms_batch(ids: Optional[str] = None) -> JSONResponse:
+    """Realm summaries (no map_data) for up to 100 comma-separated realm ids."""
+    if not ids:
+        return JSONResponse({"message": "ids is required"}, status_code=400)
+
+    id_list = ids.split(",")
+    if len(id_list) > 100:
+        return JSONResponse({"message": "Too many ids"}, status_code=400)
+    try:
+        id_list = [str(uuid.UUID(realm_id)) for realm_id in id_list]
+    except ValueError:
+        return JSONResponse({"message": "Invalid realm id"}, status_code=400)
+
     pool = get_pool()
     try:
-        row = await pool.fetchrow(
-            "SELECT id, name, map_data, owner_id, only_owner FROM realms WHERE share_id = $1::uuid",
-            share_id,
+        rows = await pool.fetch(
+            "SELECT id, name, owner_id, share_id, only_owner FROM realms WHERE id = ANY($1::uuid[])",
+            id_list,
         )
-        if not row:
+        return JSONResponse([record_to_dict(r) for r in rows])
+    except Exception as e:
+        return JSONResponse({"message": str(e)}, status_code=500)
+
+
+@router.get("/by-share/{share_id}")
+async def get_realm_by_share(share_id: str, request: Request) -> Response:
+    try:
+        body = await realm_store.get_share_body(share_id)
+        if not body:
             return JSONResponse({"message": "Realm not found"}, status_code=404)
-        return JSONResponse(record_to_dict(row))
+        return _encoded_response(request, body)
     except Exception as e:
         return JSONResponse({"message": str(e)}, status_code=500)
 
 
 @router.get("/{realm_id}")
-async def get_realm(realm_id: str) -> JSONResponse:
-    pool = get_pool()
+async def get_realm(realm_id: str, request: Request) -> Response:
     try:
-        row = await pool.fetchrow(
-            "SELECT id, name, owner_id, map_data, share_id, only_owner FROM realms WHERE id = $1::uuid",
-            realm_id,
-        )
-        if not row:
+        body = await realm_store.get_realm_body(realm_id)
+        if not body:
             return JSONResponse({"message": "Realm not found"}, status_code=404)
-        return JSONResponse(record_to_dict(row))
+        return _encoded_response(request, body)
     except Exception as e:
         return JSONResponse({"message": str(e)}, status_code=500)
 
@@ -117,6 +196,8 @@ async def update_realm(realm_id: str, request: Request) -> JSONResponse:
     if not set_clauses:
         return JSONResponse({"message": "No fields to update"}, status_code=400)
 
+    # Names the new version of the realm's GET bodies (their ETag)
+    set_clauses.append("version = version + 1")
     values.append(realm_id)
 
     pool = get_pool()
@@ -126,32 +207,80 @@ async def update_realm(realm_id: str, request: Request) -> JSONResponse:
             realm_id,
         )
         row = await pool.fetchrow(
-            f"UPDATE realms SET {', '.join(set_clauses)} WHERE id = ${param_index}::uuid RETURNING *",
+            f"UPDATE realms SET {', '.join(set_clauses)} WHERE id = ${param_index}::uuid RETURNING {_ROW_COLUMNS}",
             *values,
         )
         if not row:
             return JSONResponse({"message": "Realm not found"}, status_code=404)
 
         result = record_to_dict(row)
+        await invalidate_cached(realm_id=realm_id)
 
-        # Terminate session if relevant fields changed
+        # Terminate session if relevant fields changed; tile-only map edits are applied live
         if old_row:
             old = dict(old_row)
             should_terminate = False
-            if map_data is not None and json.dumps(old["map_data"], sort_keys=True) != json.dumps(result["map_data"], sort_keys=True):
-                should_terminate = True
+            room_changes: list[tuple[int, dict]] = []
+            if map_data is not None:
+                # Comparing whole maps is CPU-heavy: keep it off the event loop
+                should_terminate, room_changes = await asyncio.to_thread(
+                    _classify_map_change, old["map_data"], result["map_data"]
+                )
             if share_id is not None and str(old["share_id"]) != str(result["share_id"]):
                 should_terminate = True
             if only_owner is not None and result["only_owner"]:
                 should_terminate = True
             if should_terminate:
-                session_manager.terminate_session(realm_id, "This realm has been changed by the owner.")
+                await terminate_realm(realm_id, "This realm has been changed by the owner.")
+            else:
+                for room_index, tiles in room_changes:
+                    await patch_room_live(realm_id, room_index, tiles)
 
         return JSONResponse(result)
     except Exception as e:
         return JSONResponse({"message": str(e)}, status_code=500)
 
 
+@router.patch("/{realm_id}/rooms/{room_index}")
+async def patch_room(realm_id: str, room_index: int, request: Request) -> JSONResponse:
+    """Apply tile-level edits to one room without replacing the map or kicking anyone."""
+    # jsonb paths count negative indices from the end: -1 would patch the last room
+    if room_index < 0:
+        return JSONResponse({"message": "Invalid room index"}, status_code=400)
+    try:
+        body = RoomPatchBody(**await request.json())
+    except Exception:
+        return JSONResponse({"message": "Invalid patch"}, status_code=400)
+    if not body.tiles:
+        return JSONResponse({"message": "No tiles to update"}, status_code=400)
+    if len(body.tiles) > _MAX_PATCH_TILES:
+        return JSONResponse({"message": "Too many tiles"}, status_code=400)
+
+    # Last edit of a tile wins within one patch
+    edits: dict[str, dict] = {}
+    for tile in body.tiles:
+        edits[f"{tile.x}, {tile.y}"] = {
+            "erase": list(tile.erase),
+            "put": tile.set.model_dump(exclude_none=True) if tile.set else {},
+        }
+    keys = list(edits)
+    deltas = [{"key": key, **edit} for key, edit in edits.items()]
+
+    pool = get_pool()
+    try:
+        row = await pool.fetchrow(_PATCH_ROOM_SQL, realm_id, room_index, keys, deltas)
+        if not row:
+            return JSONResponse({"message": "Realm or room not found"}, status_code=404)
+
+        # "x, y" -> tile as saved, None where the tile was deleted
+        tiles = dict(row["tiles"] or {})
+        await invalidate_cached(realm_id=realm_id)
+        await patch_room_live(realm_id, room_index, tiles)
+        return JSONResponse({"roomIndex": room_index, "tiles": tiles})
+    except Exception as e:
+        return JSONResponse({"message": str(e)}, status_code=500)
+
+
 @router.delete("/{realm_id}")
 async def delete_realm(realm_id: str) -> JSONResponse:
     pool = get_pool()
@@ -163,7 +292,8 @@ async def delete_realm(realm_id: str) -> JSONResponse:
         if not row:
             return JSONResponse({"message": "Realm not found"}, status_code=404)
 
-        session_manager.terminate_session(realm_id, "This realm is no longer available.")
-        return JSONResponse({"success": True})
+        await invalidate_cached(realm_id=realm_id)
+        kicked = await terminate_realm(realm_id, "This realm is no longer available.")
+        return JSONResponse({"success": True, "kicked": kicked})
     except Exception as e:
         return JSONResponse({"message": str(e)}, status_code=500)
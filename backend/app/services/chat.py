@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.database import get_pool
+
+_INSERT_MESSAGE = (
+    "INSERT INTO chat_messages (realm_id, room_index, uid, message, created_at) "
+    "VALUES ($1::uuid, $2, $3, $4, $5)"
+)
+
+
+class ChatArchive:
+    """Background writer that appends chat messages to Postgres in batches.
+
+    Messages wait in memory and are written with executemany every `interval`
+    seconds or once `batch_size` are pending. A failed batch is kept and retried.
+    If the database stays down, the oldest messages beyond `max_pending` are dropped.
+    """
+
+    def __init__(self, interval: float, batch_size: int, max_pending: int, max_backoff: float = 5.0) -> None:
+        self._interval = interval
+        self._batch_size = batch_size
+        self._max_pending = max_pending
+        self._max_backoff = max_backoff
+        self._pending: list[tuple[str, int, str, str, datetime]] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def add(self, realm_id: str, room_index: int, uid: str, message: str, ts: float) -> None:
+        self._pending.append((realm_id, room_index, uid, message, datetime.fromtimestamp(ts, timezone.utc)))
+        overflow = len(self._pending) - self._max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            self.dropped += overflow
+        if len(self._pending) >= self._batch_size:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            try:
+                await self.flush()
+            except Exception:
+                self.failures += 1
+
+    async def flush(self) -> None:
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            await get_pool().executemany(_INSERT_MESSAGE, batch)
+        except Exception:
+            self._pending = batch + self._pending
+            raise
+        self.written += len(batch)
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": len(self._pending), "written": self.written, "dropped": self.dropped, "failures": self.failures}
+
+    async def _run(self) -> None:
+        backoff = self._interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                backoff = self._interval
+            except Exception:
+                self.failures += 1
+                backoff = min(self._max_backoff, backoff * 2)
+
+
+chat_archive = ChatArchive(
+    settings.CHAT_PERSIST_INTERVAL,
+    settings.CHAT_PERSIST_BATCH,
+    settings.CHAT_PERSIST_MAX_PENDING,
+)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+from typing import Any
+
+from app import codec
+
+try:
+    import brotli
+except ImportError:  # optional: served only when installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: served only when installed
+    zstandard = None
+
+
+class EncodedBody:
+    """A JSON response body serialized and compressed once.
+
+    Served under the given ETag, or under a hash of the body when there is none.
+    """
+
+    __slots__ = ("etag", "identity", "encodings")
+
+    def __init__(self, content: Any, etag: str | None = None) -> None:
+        # Same serializer as JSONResponse
+        self.identity = codec.dumps_bytes(content)
+        if etag is None:
+            etag = '"' + hashlib.blake2b(self.identity, digest_size=16).hexdigest() + '"'
+        self.etag = etag
+        # content-coding -> compressed body
+        self.encodings: dict[str, bytes] = {"gzip": gzip.compress(self.identity, 6)}
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(self.identity, quality=5)
+        if zstandard is not None:
+            self.encodings["zstd"] = zstandard.ZstdCompressor(level=10).compress(self.identity)
+
+    @property
+    def size(self) -> int:
+        return len(self.identity) + sum(len(body) for body in self.encodings.values()) + 256
+
+    def negotiate(self, accept_encoding: str) -> tuple[bytes, str | None]:
+        """Pick the smallest body the client accepts: (body, content-encoding or None)."""
+        accepted = set()
+        for part in accept_encoding.lower().split(","):
+            coding, _, params = part.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(coding)
+
+        best, best_coding = self.identity, None
+        for coding, body in self.encodings.items():
+            if (coding in accepted or "*" in accepted) and len(body) < len(best):
+                best, best_coding = body, coding
+        return best, best_coding
+
+    def matches(self, if_none_match: str | None) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return self.etag in tags
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from app.config import settings
+from app.database import get_pool, record_to_dict
+from app.services.cache import LRUCache, SingleFlight
+from app.services.encoding import EncodedBody
+from app.services.writebehind import profile_writer
+from app.session import DEFAULT_SKIN
+
+_REALM_COLUMNS = "id, name, owner_id, map_data, share_id, only_owner, version"
+
+# realmId -> realm row (with map_data), the bulk of every join
+realm_cache: LRUCache[dict[str, Any]] = LRUCache(settings.REALM_CACHE_MAX_BYTES)
+# shareId -> realmId, for /by-share lookups
+share_cache: LRUCache[str] = LRUCache(settings.SHARE_CACHE_MAX_BYTES)
+# uid -> skin
+skin_cache: LRUCache[str] = LRUCache(settings.SKIN_CACHE_MAX_BYTES)
+# (view, realmId) -> serialized and compressed GET response body
+body_cache: LRUCache[EncodedBody] = LRUCache(settings.REALM_BODY_CACHE_MAX_BYTES)
+# Fields, in order, of each realm GET endpoint's response
+_BODY_VIEWS = {
+    "full": ("id", "name", "owner_id", "map_data", "share_id", "only_owner"),
+    "share": ("id", "name", "map_data", "owner_id", "only_owner"),
+}
+# Rough serialized size of one tile, for realm rows that come without their map's length
+_TILE_BYTES = 48
+# A cold realm or skin is loaded once however many joins ask for it at the same time
+_realm_loads: SingleFlight[dict[str, Any] | None] = SingleFlight()
+_skin_loads: SingleFlight[str] = SingleFlight()
+_body_loads: SingleFlight[EncodedBody] = SingleFlight()
+
+
+def _store_realm(realm: dict[str, Any], size: int, generation: int) -> None:
+    realm_cache.put(realm["id"], realm, size, generation)
+    share_cache.put(realm["share_id"], realm["id"], 128)
+
+
+def _realm_size(realm: dict[str, Any], map_bytes: int | None) -> int:
+    """Cache size of a realm row: its map's JSON length as Postgres reports it, else a per-tile estimate."""
+    if map_bytes is None:
+        rooms = realm["map_data"].get("rooms") or ()
+        map_bytes = _TILE_BYTES * sum(len(room.get("tilemap") or ()) for room in rooms)
+    return map_bytes + 256
+
+
+async def _load_realm(where: str, key: str) -> dict[str, Any] | None:
+    generation = realm_cache.generation
+    # The map's JSON length comes along with the row, so sizing the entry never serializes the map here
+    row = await get_pool().fetchrow(
+        f"SELECT {_REALM_COLUMNS}, octet_length(map_data::text) AS map_bytes FROM realms WHERE {where} = $1::uuid",
+        key,
+    )
+    if not row:
+        return None
+    realm = record_to_dict(row)
+    _store_realm(realm, _realm_size(realm, realm.pop("map_bytes", None)), generation)
+    return realm
+
+
+async def get_realm(realm_id: str) -> dict[str, Any] | None:
+    """Realm row by id, read through the cache. The returned dict is shared: do not mutate it."""
+    realm = realm_cache.get(realm_id)
+    if realm is not None:
+        return realm
+    return await _realm_loads.do(("id", realm_id), lambda: _load_realm("id", realm_id))
+
+
+async def get_realm_by_share(share_id: str) -> dict[str, Any] | None:
+    realm_id = share_cache.get(share_id)
+    if realm_id is not None:
+        realm = realm_cache.get(realm_id)
+        # The share link may have been rotated since the index entry was written
+        if realm is not None and realm["share_id"] == share_id:
+            return realm
+    return await _realm_loads.do(("share", share_id), lambda: _load_realm("share_id", share_id))
+
+
+def invalidate_realm(realm_id: str) -> None:
+    realm = realm_cache.peek(realm_id)
+    if realm is not None:
+        share_cache.invalidate(realm["share_id"])
+    realm_cache.invalidate(realm_id)
+    for view in _BODY_VIEWS:
+        body_cache.invalidate((view, realm_id))
+
+
+async def _encode_body(view: str, realm: dict[str, Any], generation: int) -> EncodedBody:
+    # The row's version is bumped by every write, so it names this body without hashing it;
+    # rows from a store without versions (e.g. bench.swarm_server's memory pool) fall back to a hash
+    version = realm.get("version")
+    etag = f'"{view}.{realm["id"]}.{version}"' if version is not None else None
+    # Serializing and compressing a large map takes a while: keep it off the event loop
+    encoded = await asyncio.to_thread(EncodedBody, {field: realm[field] for field in _BODY_VIEWS[view]}, etag)
+    body_cache.put((view, realm["id"]), encoded, encoded.size, generation)
+    return encoded
+
+
+async def _encoded_body(view: str, realm: dict[str, Any], generation: int) -> EncodedBody:
+    key = (view, realm["id"])
+    body = body_cache.get(key)
+    if body is not None:
+        return body
+    return await _body_loads.do(key, lambda: _encode_body(view, realm, generation))
+
+
+async def get_realm_body(realm_id: str) -> EncodedBody | None:
+    """Encoded GET /api/realms/{id} response, built once per realm version."""
+    generation = body_cache.generation
+    realm = await get_realm(realm_id)
+    if realm is None:
+        return None
+    return await _encoded_body("full", realm, generation)
+
+
+async def get_share_body(share_id: str) -> EncodedBody | None:
+    """Encoded GET /api/realms/by-share/{share_id} response."""
+    generation = body_cache.generation
+    realm = await get_realm_by_share(share_id)
+    if realm is None:
+        return None
+    return await _encoded_body("share", realm, generation)
+
+
+async def get_skin(uid: str) -> str:
+    skin = skin_cache.get(uid)
+    if skin is not None:
+        return skin
+    return await _skin_loads.do(uid, lambda: _load_skin(uid))
+
+
+async def _load_skin(uid: str) -> str:
+    generation = skin_cache.generation
+    row = await get_pool().fetchrow(
+        "SELECT skin FROM profiles WHERE id = $1",
+        uid,
+    )
+    if not row or not row["skin"]:
+        return DEFAULT_SKIN
+    skin_cache.put(uid, row["skin"], len(row["skin"]) + 64, generation)
+    return row["skin"]
+
+
+async def profile_exists(uid: str) -> bool:
+    """Whether uid has a profile. Profiles are never deleted, so a cached skin or a queued upsert is proof enough."""
+    if skin_cache.peek(uid) is not None or profile_writer.has_pending_profile(uid):
+        return True
+    return await get_pool().fetchval("SELECT EXISTS (SELECT 1 FROM profiles WHERE id = $1)", uid)
+
+
+def remember_skin(uid: str, skin: str) -> None:
+    skin_cache.put(uid, skin, len(skin) + 64)
+
+
+def invalidate_skin(uid: str) -> None:
+    skin_cache.invalidate(uid)
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {
+        "realms": {**realm_cache.stats(), "coalesced": _realm_loads.coalesced},
+        "shares": share_cache.stats(),
+        "bodies": body_cache.stats(),
+        "skins": {**skin_cache.stats(), "coalesced": _skin_loads.coalesced},
+    }
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import os
+import signal
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from app import codec
+from app.cluster import cluster
+from app.config import settings
+from app.session import RealmData, SessionManager, session_manager
+
+# Bumped whenever the layout below changes; files of any other version are ignored
+SNAPSHOT_VERSION = 2
+
+
+@dataclass(slots=True)
+class ResumePoint:
+    """Where a player stood when the snapshot was taken."""
+
+    realm_id: str
+    shard_id: str
+    room: int
+    x: int
+    y: int
+    expires: float
+
+
+class SessionSnapshots:
+    """Saves live session state to a local file and restores it after a restart.
+
+    A snapshot holds, per realm, the shard ids and, per shard, its chat history
+    and where each player stood. It is written on a timer and once more at
+    shutdown, to a temporary file that replaces the previous snapshot in one
+    rename, so a crash mid-write leaves the old file.
+
+    Realms are not rebuilt from the file alone: the first join after a restart
+    loads the realm row from the database as usual, and only a realm that still
+    exists gets its shards and chat back (restore_realm). Each player's position
+    is kept as a ResumePoint until they rejoin or resume_ttl runs out.
+    """
+
+    def __init__(self, manager: SessionManager, path: str, interval: float, resume_ttl: float) -> None:
+        self._manager = manager
+        self.path = path
+        self._interval = interval
+        self._resume_ttl = resume_ttl
+        # uid -> position to resume at on the next join
+        self._resume: dict[str, ResumePoint] = {}
+        # realm id -> saved realm waiting for its first join
+        self._realms: dict[str, dict[str, Any]] = {}
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # State captured as the exit signal arrived, before the server closes every socket
+        self._exit_capture: dict[str, Any] | None = None
+        # Set by the final save at shutdown: the realms are being closed and must not overwrite it
+        self._final = False
+        self.saved = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        # Workers get a new id and a new share of the realms on every start, so clusters run without snapshots
+        return bool(self.path) and not cluster.enabled
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._loop = asyncio.get_event_loop()
+            self._task = self._loop.create_task(self._run())
+            self._capture_on_exit_signals()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def save(self, final: bool = False) -> bool:
+        """Write a snapshot of every live realm. After a final save, later saves are skipped."""
+        if not self.enabled or self._final:
+            return False
+        self._final = final
+        # Captured on the loop so the state is consistent; encoding and I/O run in a thread
+        data = self._exit_capture if final and self._exit_capture is not None else self.capture()
+        try:
+            await asyncio.to_thread(self._write, data)
+        except Exception:
+            self.failures += 1
+            return False
+        self.saved += 1
+        return True
+
+    def capture(self) -> dict[str, Any]:
+        manager = self._manager
+        now = time.time()
+        expires = now + self._resume_ttl
+        realms = []
+        for realm_id in manager.get_realm_ids():
+            shards = manager.get_realm_shards(realm_id)
+            if not shards:
+                continue
+            realms.append({
+                "id": realm_id,
+                "expires": expires,
+                "shardCounter": manager.get_shard_counter(realm_id),
+                "shards": [
+                    {
+                        "id": shard.id,
+                        "chat": {str(room): shard.get_chat_history(room) for room in shard.get_chat_rooms()},
+                        "players": [[p.uid, p.room, p.x, p.y] for p in shard.players.values()],
+                    }
+                    for shard in shards
+                ],
+            })
+
+        # Realms restored from the last snapshot that nobody has rejoined yet, with the players still to come back
+        resume = self._resume
+        for realm_id, saved in self._realms.items():
+            if saved["expires"] <= now or manager.get_session(realm_id):
+                continue
+            realms.append({
+                **saved,
+                "shards": [
+                    {
+                        **shard,
+                        "players": [
+                            player for player in shard["players"]
+                            if (point := resume.get(player[0])) is not None and point.realm_id == realm_id
+                        ],
+                    }
+                    for shard in saved["shards"]
+                ],
+            })
+        return {"version": SNAPSHOT_VERSION, "savedAt": now, "realms": realms}
+
+    def _capture_on_exit_signals(self) -> None:
+        """Capture the realms as soon as SIGINT/SIGTERM arrives.
+
+        Uvicorn closes every socket, logging all players out, before the shutdown
+        hook runs; the final save writes what was captured here instead.
+        """
+        loop = self._loop
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(sig)
+            if not callable(previous):
+                continue
+
+            def handler(signum, frame, previous=previous) -> None:
+                # Run on the loop, between callbacks, so no session is caught mid-update
+                loop.call_soon_threadsafe(self._capture_for_exit)
+                previous(signum, frame)
+
+            try:
+                signal.signal(sig, handler)
+            except ValueError:
+                return  # Not the main thread: only the periodic snapshots are taken
+
+    def _capture_for_exit(self) -> None:
+        if self._exit_capture is None:
+            self._exit_capture = self.capture()
+
+    def _write(self, data: dict[str, Any]) -> None:
+        body = gzip.compress(codec.dumps_bytes(data), compresslevel=6)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return  # Directories cannot be opened on this platform; the rename is still atomic
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def restore(self) -> int:
+        """Read the last snapshot. Returns the number of players that can resume.
+
+        The realms come back one by one, on their first join (see restore_realm).
+        """
+        if not self.enabled:
+            return 0
+        try:
+            with open(self.path, "rb") as f:
+                data = codec.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return 0
+        except Exception:
+            self.failures += 1  # Unreadable snapshot: start cold
+            return 0
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+            return 0
+
+        now = time.time()
+        for realm in data["realms"]:
+            expires = realm["expires"]
+            if expires <= now:
+                continue
+            realm_id = realm["id"]
+            self._realms[realm_id] = realm
+            for shard in realm["shards"]:
+                for uid, room, x, y in shard["players"]:
+                    self._resume[uid] = ResumePoint(realm_id, shard["id"], room, x, y, expires)
+        return len(self._resume)
+
+    def restore_realm(self, realm_id: str, map_data: RealmData) -> bool:
+        """Start a realm from its snapshot, with map_data freshly loaded from the database.
+
+        False if the snapshot has nothing (current) for the realm; the caller then
+        creates the session as usual.
+        """
+        saved = self._realms.pop(realm_id, None)
+        if saved is None or saved["expires"] <= time.time():
+            return False
+        shards = self._manager.restore_realm(
+            realm_id, map_data, [shard["id"] for shard in saved["shards"]], saved["shardCounter"]
+        )
+        by_id = {shard.id: shard for shard in shards}
+        for saved_shard in saved["shards"]:
+            shard = by_id.get(saved_shard["id"])
+            if shard is None:
+                continue
+            for room, entries in saved_shard["chat"].items():
+                if 0 <= int(room) < len(shard.rooms):
+                    for entry in entries:
+                        shard.add_chat_message(int(room), entry)
+        return True
+
+    def take_resume(self, uid: str, realm_id: str) -> ResumePoint | None:
+        """The position uid had in realm_id before the restart, once; None if there is none or it expired."""
+        point = self._resume.pop(uid, None)
+        if point is None or point.realm_id != realm_id or point.expires <= time.time():
+            return None
+        return point
+
+    def pending_resumes(self) -> int:
+        return len(self._resume)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "saved": self.saved,
+            "failures": self.failures,
+            "pendingResumes": self.pending_resumes(),
+            "pendingRealms": len(self._realms),
+        }
+
+    def _expire(self) -> None:
+        if not (self._resume or self._realms):
+            return
+        now = time.time()
+        self._realms = {realm_id: saved for realm_id, saved in self._realms.items() if saved["expires"] > now}
+        self._resume = {uid: point for uid, point in self._resume.items() if point.expires > now}
+        if not self._resume:
+            # Restored shards nobody came back to
+            self._manager.drop_empty_shards()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            self._expire()
+            await self.save()
+
+
+session_snapshots = SessionSnapshots(
+    session_manager, settings.SNAPSHOT_PATH, settings.SNAPSHOT_INTERVAL, settings.SNAPSHOT_RESUME_TTL
+)
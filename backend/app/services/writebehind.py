@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import asyncpg
+
+from app.config import settings
+from app.database import get_pool
+
+_UPSERT_PROFILE = (
+    "INSERT INTO profiles (id, username) VALUES ($1, $2) "
+    "ON CONFLICT (id) DO UPDATE SET username = EXCLUDED.username"
+)
+_UPDATE_SKIN = "UPDATE profiles SET skin = $2 WHERE id = $1"
+_APPEND_VISITED = (
+    "UPDATE profiles SET visited_realms = array_append(coalesce(visited_realms, '{}'), $2) "
+    "WHERE id = $1 AND NOT ($2 = ANY(coalesce(visited_realms, '{}')))"
+)
+
+
+def _is_row_error(exc: BaseException) -> bool:
+    """Whether a write failed because of the row itself rather than the database being unavailable."""
+    if isinstance(exc, (ValueError, TypeError)):
+        return True  # Argument encoding, e.g. an int where text is expected
+    # Data exceptions (22) and constraint violations (23) fail the same way on every retry
+    return isinstance(exc, asyncpg.PostgresError) and (exc.sqlstate or "")[:2] in ("22", "23")
+
+
+class ProfileWriter:
+    """Write-behind queue for profile writes that nobody waits on.
+
+    Writes are collected per uid (latest username/skin wins, visits are kept in
+    order) and flushed with executemany, one transaction per batch, every
+    `interval` seconds or as soon as `batch_size` writes are pending. If a row
+    makes the batch fail, the rows are written one by one and the rows that still
+    fail are dropped. A batch that fails because the database is unavailable is
+    merged back under any newer writes and retried with backoff; beyond
+    `max_pending` queued writes the oldest, across all kinds, are dropped.
+    """
+
+    def __init__(self, interval: float, batch_size: int, max_pending: int, max_backoff: float = 5.0) -> None:
+        self._interval = interval
+        self._batch_size = batch_size
+        self._max_pending = max_pending
+        self._max_backoff = max_backoff
+        self._usernames: dict[str, str] = {}
+        self._skins: dict[str, str] = {}
+        # (uid, shareId) in arrival order, deduplicated
+        self._visits: dict[tuple[str, str], None] = {}
+        # (kind, key) of every queued write, oldest first; a rewrite moves to the end
+        self._order: dict[tuple[str, Any], None] = {}
+        # Profile upserts of the batch being written
+        self._flushing_usernames: dict[str, str] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.flushed = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def upsert_profile(self, uid: str, username: str) -> None:
+        self._usernames[uid] = username
+        self._added("username", uid)
+
+    def update_skin(self, uid: str, skin: str) -> None:
+        self._skins[uid] = skin
+        self._added("skin", uid)
+
+    def add_visited_realm(self, uid: str, share_id: str) -> None:
+        self._visits[(uid, share_id)] = None
+        self._added("visit", (uid, share_id))
+
+    def pending(self) -> int:
+        return len(self._usernames) + len(self._skins) + len(self._visits)
+
+    def has_pending_profile(self, uid: str) -> bool:
+        """Whether a profile upsert for uid is queued or being written, i.e. the profile exists or is about to."""
+        return uid in self._usernames or uid in self._flushing_usernames
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.pending():
+            try:
+                await self.flush()
+            except Exception:
+                self.failures += 1  # Database gone at shutdown: nothing left to retry against
+
+    async def flush(self) -> None:
+        usernames, self._usernames = self._usernames, {}
+        skins, self._skins = self._skins, {}
+        visits, self._visits = self._visits, {}
+        order, self._order = self._order, {}
+        if not (usernames or skins or visits):
+            return
+
+        self._flushing_usernames = usernames
+        try:
+            try:
+                await self._write_batch(usernames, skins, visits)
+                self.flushed += len(usernames) + len(skins) + len(visits)
+            except Exception as exc:
+                if not _is_row_error(exc):
+                    raise
+                # One bad row fails the whole transaction: find it by writing the rows one by one
+                await self._write_rows(usernames, skins, visits)
+        except Exception:
+            # Put back what was not written, without overwriting anything queued since
+            self._usernames = {**usernames, **self._usernames}
+            self._skins = {**skins, **self._skins}
+            self._visits = {**visits, **self._visits}
+            # Unwritten rows keep their place ahead of newer writes, unless rewritten since
+            self._order = {
+                entry: None for entry in order
+                if entry not in self._order and entry[1] in self._rows(entry[0])
+            } | self._order
+            self._trim()
+            raise
+        finally:
+            self._flushing_usernames = {}
+
+    async def _write_batch(self, usernames: dict[str, str], skins: dict[str, str], visits: dict[tuple[str, str], None]) -> None:
+        async with get_pool().acquire() as conn:
+            async with conn.transaction():
+                # Profiles first: skin and visit updates may target a profile created in this batch
+                if usernames:
+                    await conn.executemany(_UPSERT_PROFILE, list(usernames.items()))
+                if skins:
+                    await conn.executemany(_UPDATE_SKIN, list(skins.items()))
+                if visits:
+                    await conn.executemany(_APPEND_VISITED, list(visits))
+
+    async def _write_rows(self, usernames: dict[str, str], skins: dict[str, str], visits: dict[tuple[str, str], None]) -> None:
+        """Write each row on its own, dropping rows that fail by themselves.
+
+        Written and dropped rows are removed from the dicts, so on any other error
+        they hold exactly what is left to retry.
+        """
+        pool = get_pool()
+        writes: list[tuple[str, dict[Any, Any], bool]] = [
+            (_UPSERT_PROFILE, usernames, False),
+            (_UPDATE_SKIN, skins, False),
+            (_APPEND_VISITED, visits, True),
+        ]
+        for query, rows, key_is_args in writes:
+            for key in list(rows):
+                args = key if key_is_args else (key, rows[key])
+                try:
+                    await pool.execute(query, *args)
+                    self.flushed += 1
+                except Exception as exc:
+                    if not _is_row_error(exc):
+                        raise
+                    self.dropped += 1
+                del rows[key]
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": self.pending(), "flushed": self.flushed, "dropped": self.dropped, "failures": self.failures}
+
+    def _rows(self, kind: str) -> dict[Any, Any]:
+        return {"username": self._usernames, "skin": self._skins, "visit": self._visits}[kind]
+
+    def _added(self, kind: str, key: Any) -> None:
+        self._order.pop((kind, key), None)
+        self._order[(kind, key)] = None
+        # Over the cap the database has been down for a while: drop the oldest writes
+        self._trim()
+        if self.pending() >= self._batch_size:
+            self._wakeup.set()
+
+    def _trim(self) -> None:
+        """Drop the oldest writes until at most max_pending are queued."""
+        while self._order and self.pending() > self._max_pending:
+            kind, key = next(iter(self._order))
+            del self._order[(kind, key)]
+            del self._rows(kind)[key]
+            self.dropped += 1
+
+    async def _run(self) -> None:
+        backoff = self._interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                backoff = self._interval
+            except Exception:
+                self.failures += 1
+                backoff = min(self._max_backoff, backoff * 2)
+
+
+profile_writer = ProfileWriter(
+    settings.WRITE_BEHIND_INTERVAL,
+    settings.WRITE_BEHIND_BATCH,
+    settings.WRITE_BEHIND_MAX_PENDING,
+)
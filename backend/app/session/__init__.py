@@ -1,4 +1,4 @@
-from app.session.session import Player, Session, RealmData, DEFAULT_SKIN
+from app.session.session import Player, Session, RealmData, DEFAULT_SKIN, game_room_name
 from app.session.manager import SessionManager, session_manager
 
 __all__ = [
@@ -6,6 +6,7 @@ __all__ = [
     "Session",
     "RealmData",
     "DEFAULT_SKIN",
+    "game_room_name",
     "SessionManager",
     "session_manager",
 ]
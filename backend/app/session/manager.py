@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Callable
+from typing import TYPE_CHECKING
 
-from app.session.session import RealmData, Session
+from app.config import settings
+from app.session.session import RealmData, RoomFn, Session
 
 if TYPE_CHECKING:
     pass
@@ -10,45 +11,207 @@ if TYPE_CHECKING:
 
 class SessionManager:
     def __init__(self) -> None:
+        # shard id -> Session; a realm's first shard uses the realm id itself
         self._sessions: dict[str, Session] = {}
-        self._player_id_to_realm_id: dict[str, str] = {}
+        # realm id -> its shards, oldest first
+        self._realm_shards: dict[str, list[Session]] = {}
+        self._shard_counters: dict[str, int] = {}
+        self._player_id_to_session_id: dict[str, str] = {}
         self._socket_id_to_player_id: dict[str, str] = {}
-        self._kick_fn: Callable[[str, str], None] | None = None
+        # realm id -> players across its shards, kept up to date on every join and leave
+        self._realm_player_counts: dict[str, int] = {}
+        # Realms whose player count changed since the last take_count_changes()
+        self._changed_counts: set[str] = set()
+        self._enter_room_fn: RoomFn | None = None
+        self._leave_room_fn: RoomFn | None = None
 
-    def set_kick_fn(self, fn: Callable[[str, str], None]) -> None:
-        """Inject kick_player to avoid circular imports."""
-        self._kick_fn = fn
+    def set_room_fns(self, enter: RoomFn, leave: RoomFn) -> None:
+        """Inject Socket.IO room membership so sessions keep game-room broadcast groups in sync."""
+        self._enter_room_fn = enter
+        self._leave_room_fn = leave
 
     def create_session(self, id: str, map_data: RealmData) -> None:
-        self._sessions[id] = Session(id, map_data)
+        """Create the first shard of realm id."""
+        session = Session(id, map_data, self._enter_room_fn, self._leave_room_fn, realm_id=id)
+        self._sessions[id] = session
+        self._realm_shards[id] = [session]
 
     def get_session(self, id: str) -> Session | None:
+        """Look up a shard by id. A realm id resolves to the realm's first shard."""
         return self._sessions.get(id)
 
+    def get_realm_ids(self) -> list[str]:
+        return list(self._realm_shards)
+
+    def get_realm_shards(self, realm_id: str) -> list[Session]:
+        return self._realm_shards.get(realm_id, [])
+
+    def get_realm_player_count(self, realm_id: str) -> int:
+        return self._realm_player_counts.get(realm_id, 0)
+
+    def take_count_changes(self) -> dict[str, int]:
+        """Player count of every realm whose count changed since the last call."""
+        if not self._changed_counts:
+            return {}
+        counts = self._realm_player_counts
+        changes = {realm_id: counts.get(realm_id, 0) for realm_id in self._changed_counts}
+        self._changed_counts = set()
+        return changes
+
+    def _add_to_count(self, realm_id: str, delta: int) -> None:
+        count = self._realm_player_counts.get(realm_id, 0) + delta
+        if count:
+            self._realm_player_counts[realm_id] = count
+        else:
+            self._realm_player_counts.pop(realm_id, None)
+        self._changed_counts.add(realm_id)
+
+    def has_capacity(self, realm_id: str) -> bool:
+        """Whether a player could join the realm now, possibly by opening a new shard."""
+        shards = self.get_realm_shards(realm_id)
+        if len(shards) < settings.MAX_SHARDS_PER_REALM:
+            return True
+        return any(shard.get_player_count() < settings.SHARD_CAPACITY for shard in shards)
+
+    def assign_shard(
+        self,
+        realm_id: str,
+        shard_id: str | None = None,
+        follow_uid: str | None = None,
+    ) -> Session | None:
+        """Pick the shard a joining player goes to.
+
+        A requested shard (from a share link) or the shard of the player being followed
+        wins if it has room; otherwise the least-loaded shard with room is used, and a
+        new shard is opened once every shard is full. Returns None if the realm is at
+        MAX_SHARDS_PER_REALM full shards.
+        """
+        shards = self._realm_shards.get(realm_id)
+        if not shards:
+            return None
+        capacity = settings.SHARD_CAPACITY
+
+        preferred = None
+        if shard_id is not None:
+            preferred = self._sessions.get(shard_id)
+        elif follow_uid is not None:
+            preferred = self.get_player_session(follow_uid)
+        if preferred is not None and preferred.realm_id == realm_id and preferred.get_player_count() < capacity:
+            return preferred
+
+        open_shards = [shard for shard in shards if shard.get_player_count() < capacity]
+        if open_shards:
+            return min(open_shards, key=Session.get_player_count)
+
+        if len(shards) >= settings.MAX_SHARDS_PER_REALM:
+            return None
+        return self._add_shard(realm_id)
+
+    def _add_shard(self, realm_id: str) -> Session:
+        shards = self._realm_shards[realm_id]
+        number = self._shard_counters.get(realm_id, 0) + 1
+        self._shard_counters[realm_id] = number
+        shard = Session(
+            f"{realm_id}~{number}",
+            shards[0].map_data,
+            self._enter_room_fn,
+            self._leave_room_fn,
+            realm_id=realm_id,
+        )
+        self._sessions[shard.id] = shard
+        shards.append(shard)
+        return shard
+
+    def restore_realm(self, realm_id: str, map_data: RealmData, shard_ids: list[str], shard_counter: int) -> list[Session]:
+        """Recreate a realm's shards, empty, under the ids they had before a restart (see services.snapshot)."""
+        self.create_session(realm_id, map_data)
+        shards = self._realm_shards[realm_id]
+        for shard_id in shard_ids:
+            if shard_id == realm_id or shard_id in self._sessions:
+                continue
+            shard = Session(shard_id, map_data, self._enter_room_fn, self._leave_room_fn, realm_id=realm_id)
+            self._sessions[shard_id] = shard
+            shards.append(shard)
+        if shard_counter:
+            self._shard_counters[realm_id] = shard_counter
+        return shards
+
+    def get_shard_counter(self, realm_id: str) -> int:
+        return self._shard_counters.get(realm_id, 0)
+
+    def drop_empty_shards(self) -> None:
+        """Close every extra shard without players, such as restored shards nobody came back to."""
+        for shards in list(self._realm_shards.values()):
+            for shard in list(shards):
+                self._drop_shard_if_empty(shard)
+
+    def patch_room_tiles(self, realm_id: str, room_index: int, tiles: dict[str, dict | None]) -> bool:
+        """Apply tile changes ("x, y" -> tile, None to delete) to every live shard of a realm.
+
+        The map is copied on write down to the patched room's tilemap, so map dicts
+        shared with the realm cache are never mutated. False if the realm is not live.
+        """
+        shards = self._realm_shards.get(realm_id)
+        if not shards:
+            return False
+        old = shards[0].map_data
+        if not 0 <= room_index < len(old["rooms"]):
+            return False
+
+        room = old["rooms"][room_index]
+        tilemap = dict(room.get("tilemap") or {})
+        for key, tile in tiles.items():
+            if tile:
+                tilemap[key] = tile
+            else:
+                tilemap.pop(key, None)
+        rooms = list(old["rooms"])
+        rooms[room_index] = {**room, "tilemap": tilemap}
+        map_data = {**old, "rooms": rooms}
+
+        for shard in shards:
+            shard.apply_map(map_data, room_index)
+        return True
+
+    def _drop_shard_if_empty(self, session: Session) -> None:
+        """Close an extra shard once its last player leaves. The first shard lives as long as the realm."""
+        if session.id == session.realm_id or session.get_player_count():
+            return
+        self._sessions.pop(session.id, None)
+        shards = self._realm_shards.get(session.realm_id)
+        if shards and session in shards:
+            shards.remove(session)
+
     def get_player_session(self, uid: str) -> Session | None:
-        realm_id = self._player_id_to_realm_id.get(uid)
-        if realm_id is None:
+        session_id = self._player_id_to_session_id.get(uid)
+        if session_id is None:
             return None
-        return self._sessions.get(realm_id)
+        return self._sessions.get(session_id)
 
     def add_player_to_session(
         self,
         socket_id: str,
-        realm_id: str,
+        session_id: str,
         uid: str,
         username: str,
         skin: str,
+        binary: bool = False,
     ) -> None:
-        self._sessions[realm_id].add_player(socket_id, uid, username, skin)
-        self._player_id_to_realm_id[uid] = realm_id
+        session = self._sessions[session_id]
+        before = session.get_player_count()
+        session.add_player(socket_id, uid, username, skin, binary)
+        # A rejoin of the same shard replaces the player instead of adding one
+        if session.get_player_count() != before:
+            self._add_to_count(session.realm_id, 1)
+        self._player_id_to_session_id[uid] = session_id
         self._socket_id_to_player_id[socket_id] = uid
 
     def log_out_player(self, uid: str) -> None:
-        realm_id = self._player_id_to_realm_id.get(uid)
-        if not realm_id:
+        session_id = self._player_id_to_session_id.get(uid)
+        if not session_id:
             return
 
-        session = self._sessions.get(realm_id)
+        session = self._sessions.get(session_id)
         if not session:
             return
 
@@ -56,11 +219,14 @@ class SessionManager:
         if player:
             self._socket_id_to_player_id.pop(player.socket_id, None)
 
-        self._player_id_to_realm_id.pop(uid, None)
-        session.remove_player(uid)
+        self._player_id_to_session_id.pop(uid, None)
+        if uid in session.players:
+            session.remove_player(uid)
+            self._add_to_count(session.realm_id, -1)
+        self._drop_shard_if_empty(session)
 
-    def get_socket_ids_in_room(self, realm_id: str, room_index: int) -> list[str]:
-        session = self._sessions.get(realm_id)
+    def get_socket_ids_in_room(self, session_id: str, room_index: int) -> list[str]:
+        session = self._sessions.get(session_id)
         if not session:
             return []
         return [p.socket_id for p in session.get_players_in_room(room_index)]
@@ -72,17 +238,27 @@ class SessionManager:
         self.log_out_player(uid)
         return True
 
-    def terminate_session(self, id: str, reason: str) -> None:
-        session = self._sessions.get(id)
-        if not session:
-            return
+    def terminate_session(self, id: str) -> list[Session]:
+        """Drop every shard of realm id along with the index entries of all their players, in one pass.
 
-        player_ids = session.get_player_ids()
-        for uid in player_ids:
-            if self._kick_fn:
-                self._kick_fn(uid, reason)
+        Returns the dropped shards, players still in place, so the caller can notify
+        them (see sockets.helpers.close_realm).
+        """
+        shards = self._realm_shards.pop(id, None)
+        if not shards:
+            return []
 
-        self._sessions.pop(id, None)
+        player_sessions = self._player_id_to_session_id
+        socket_players = self._socket_id_to_player_id
+        for session in shards:
+            self._sessions.pop(session.id, None)
+            for uid, player in session.players.items():
+                player_sessions.pop(uid, None)
+                socket_players.pop(player.socket_id, None)
+        self._shard_counters.pop(id, None)
+        if self._realm_player_counts.pop(id, 0):
+            self._changed_counts.add(id)
+        return shards
 
 
 session_manager = SessionManager()
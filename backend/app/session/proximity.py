@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.session.session import Session
+
+
+class ProximityEngine:
+    """Incrementally groups a session's players into video chat channels.
+
+    Players standing in a private area share that area's channel. Everyone else is
+    grouped into connected components of players within `radius` tiles of each other
+    (on both axes); a component of two or more players gets a server-assigned channel.
+    Only the components touched by a move are recomputed.
+    """
+
+    def __init__(self, session: Session, radius: int) -> None:
+        self._session = session
+        self.radius = radius
+        self._next_id = 0
+        # uid -> channel id
+        self._channel: dict[str, str] = {}
+        # channel id -> member uids
+        self._members: dict[str, set[str]] = {}
+        # channel ids that belong to private areas
+        self._area_channels: set[str] = set()
+        # uid -> (channel before the first pending change, latest channel)
+        self._changes: dict[str, tuple[str | None, str | None]] = {}
+
+    def get_channel(self, uid: str) -> str | None:
+        return self._channel.get(uid)
+
+    def get_members(self, channel_id: str) -> set[str]:
+        return self._members.get(channel_id, set())
+
+    def update(self, uid: str) -> None:
+        """Recompute the groups affected by uid's current position."""
+        player = self._session.players[uid]
+        area = self._area_at(player.room, player.x, player.y)
+        old = self._channel.get(uid)
+
+        if area is not None:
+            channel = f"{self._session.id}:{player.room}:{area}"
+            if old == channel:
+                return
+            remaining = set()
+            if old is not None and old not in self._area_channels:
+                remaining = self._members[old] - {uid}
+            self._leave(uid)
+            self._area_channels.add(channel)
+            self._set_channel(uid, channel)
+            if remaining:
+                self._regroup(remaining)
+            return
+
+        affected = {uid}
+        if old is not None:
+            if old in self._area_channels:
+                self._leave(uid)
+            else:
+                affected |= self._members[old]
+        for other in self._neighbors(uid):
+            affected.add(other)
+            channel = self._channel.get(other)
+            if channel is not None:
+                affected |= self._members[channel]
+        self._regroup(affected)
+
+    def remove(self, uid: str) -> None:
+        """Drop a player that left the session or is about to change rooms."""
+        old = self._channel.get(uid)
+        if old is None:
+            return
+        remaining = self._members[old] - {uid}
+        self._leave(uid)
+        if remaining and old not in self._area_channels:
+            self._regroup(remaining)
+
+    def drain(self) -> list[tuple[str, str | None, str | None]]:
+        """Return (uid, left channel, joined channel) for every player whose channel changed."""
+        changes = [(uid, old, new) for uid, (old, new) in self._changes.items() if old != new]
+        self._changes = {}
+        return changes
+
+    def _area_at(self, room_index: int, x: int, y: int) -> str | None:
+        return self._session.rooms[room_index].private_area_at(x, y)
+
+    def _neighbors(self, uid: str) -> list[str]:
+        player = self._session.players[uid]
+        return [
+            other.uid
+            for other in self._session.get_players_near(player.room, player.x, player.y, self.radius)
+            if other.uid != uid and self._area_at(other.room, other.x, other.y) is None
+        ]
+
+    def _regroup(self, affected: set[str]) -> None:
+        players = self._session.players
+        pending = {uid for uid in affected if uid in players}
+        components: list[set[str]] = []
+        while pending:
+            start = pending.pop()
+            component = {start}
+            stack = [start]
+            while stack:
+                for other in self._neighbors(stack.pop()):
+                    if other not in component:
+                        component.add(other)
+                        pending.discard(other)
+                        stack.append(other)
+            components.append(component)
+
+        # Larger groups keep their channel id first so merges and splits disturb as few players as possible
+        components.sort(key=len, reverse=True)
+        taken: set[str] = set()
+        for component in components:
+            if len(component) < 2:
+                for uid in component:
+                    self._leave(uid)
+                continue
+
+            counts: dict[str, int] = {}
+            for uid in component:
+                channel = self._channel.get(uid)
+                if channel is not None and channel not in taken and channel not in self._area_channels:
+                    counts[channel] = counts.get(channel, 0) + 1
+            channel = max(counts, key=counts.__getitem__) if counts else self._new_channel_id()
+            taken.add(channel)
+            for uid in component:
+                self._set_channel(uid, channel)
+
+    def _new_channel_id(self) -> str:
+        self._next_id += 1
+        return f"{self._session.id}:p{self._next_id}"
+
+    def _set_channel(self, uid: str, channel: str) -> None:
+        old = self._channel.get(uid)
+        if old == channel:
+            return
+        if old is not None:
+            self._discard_member(uid, old)
+        self._channel[uid] = channel
+        self._members.setdefault(channel, set()).add(uid)
+        self._record(uid, old, channel)
+
+    def _leave(self, uid: str) -> None:
+        old = self._channel.pop(uid, None)
+        if old is None:
+            return
+        self._discard_member(uid, old)
+        self._record(uid, old, None)
+
+    def _discard_member(self, uid: str, channel: str) -> None:
+        members = self._members[channel]
+        members.discard(uid)
+        if not members:
+            del self._members[channel]
+            self._area_channels.discard(channel)
+
+    def _record(self, uid: str, old: str | None, new: str | None) -> None:
+        first = self._changes.get(uid)
+        self._changes[uid] = (first[0] if first else old, new)
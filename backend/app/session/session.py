@@ -1,7 +1,13 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Any, TypedDict
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, TypedDict
+
+from app.config import settings
+from app.session.proximity import ProximityEngine
+from app.session.spatial import SpatialGrid
+from app.session.tilemap import CompiledRoom, compile_rooms
 
 
 class SpawnPoint(TypedDict):
@@ -17,8 +23,21 @@ class RealmData(TypedDict):
 
 DEFAULT_SKIN = "009"
 
+# (socket_id, socket_room) -> None; joins or leaves a Socket.IO room
+RoomFn = Callable[[str, str], None]
+
+
+def game_room_name(realm_id: str, room_index: int) -> str:
+    """Name of the Socket.IO room holding every socket in one game-room of a realm."""
+    return f"{realm_id}:{room_index}"
+
+
+def stream_room_name(realm_id: str, room_index: int, binary: bool) -> str:
+    """Name of the Socket.IO room receiving position streams of one game-room in one wire format."""
+    return f"{realm_id}:{room_index}:{'bin' if binary else 'json'}"
+
 
-@dataclass
+@dataclass(slots=True)
 class Player:
     uid: str
     username: str
@@ -27,10 +46,14 @@ class Player:
     room: int
     socket_id: str
     skin: str
+    # Per-session id used by the binary protocol instead of the uid
+    index: int = 0
+    binary: bool = False
 
     def to_dict(self) -> dict[str, Any]:
         return {
             "uid": self.uid,
+            "index": self.index,
             "username": self.username,
             "x": self.x,
             "y": self.y,
@@ -41,20 +64,45 @@ class Player:
 
 
 class Session:
-    def __init__(self, id: str, map_data: RealmData) -> None:
+    def __init__(
+        self,
+        id: str,
+        map_data: RealmData,
+        enter_room: RoomFn | None = None,
+        leave_room: RoomFn | None = None,
+        realm_id: str | None = None,
+    ) -> None:
         self.id = id
+        # A realm may run several Session shards; id names the shard, realm_id the realm
+        self.realm_id = realm_id or id
         self.map_data = map_data
+        self._enter_room = enter_room
+        self._leave_room = leave_room
+        # Compiled once per session: collision, teleporter and private-area lookups per room
+        self.rooms: list[CompiledRoom] = compile_rooms(map_data)
+        self.proximity: ProximityEngine | None = (
+            ProximityEngine(self, settings.PROXIMITY_RADIUS) if settings.PROXIMITY_ENABLED else None
+        )
         self.players: dict[str, Player] = {}
         # roomIndex -> set of uids
         self._player_rooms: dict[int, set[str]] = {}
-        # roomIndex -> "x, y" -> set of uids
-        self._player_positions: dict[int, dict[str, set[str]]] = {}
+        # roomIndex -> spatial hash of uids
+        self._grids: dict[int, SpatialGrid] = {}
+        # Released player indices, reused oldest-first so a fresh index is not recycled right away
+        self._free_indices: deque[int] = deque()
+        # player index -> Player, None for released indices
+        self._slots: list[Player | None] = []
+        # (roomIndex, binary) -> players receiving that room's position stream in that format.
+        # Kept here rather than read off Socket.IO rooms, which only know this worker's sockets.
+        self._stream_counts: dict[tuple[int, bool], int] = {}
+        # roomIndex -> the last CHAT_HISTORY_SIZE chat messages, oldest first
+        self._chat: dict[int, deque[dict[str, Any]]] = {}
 
         for i in range(len(map_data["rooms"])):
             self._player_rooms[i] = set()
-            self._player_positions[i] = {}
+            self._grids[i] = SpatialGrid(settings.AOI_CELL_SIZE)
 
-    def add_player(self, socket_id: str, uid: str, username: str, skin: str) -> None:
+    def add_player(self, socket_id: str, uid: str, username: str, skin: str, binary: bool = False) -> None:
         self.remove_player(uid)
 
         spawn = self.map_data["spawnpoint"]
@@ -70,14 +118,17 @@ class Session:
             room=spawn_index,
             socket_id=socket_id,
             skin=skin,
+            index=self._allocate_index(),
+            binary=binary,
         )
 
         self._player_rooms[spawn_index].add(uid)
-        coord_key = f"{spawn_x}, {spawn_y}"
-        if coord_key not in self._player_positions[spawn_index]:
-            self._player_positions[spawn_index][coord_key] = set()
-        self._player_positions[spawn_index][coord_key].add(uid)
+        self._grids[spawn_index].insert(uid, spawn_x, spawn_y)
         self.players[uid] = player
+        self._slots[player.index] = player
+        self._join_socket_rooms(player, spawn_index)
+        if self.proximity:
+            self.proximity.update(uid)
 
     def remove_player(self, uid: str) -> None:
         if uid not in self.players:
@@ -85,12 +136,14 @@ class Session:
 
         player = self.players[uid]
         self._player_rooms[player.room].discard(uid)
-
-        coord_key = f"{player.x}, {player.y}"
-        if coord_key in self._player_positions[player.room]:
-            self._player_positions[player.room][coord_key].discard(uid)
+        self._grids[player.room].remove(uid)
 
         del self.players[uid]
+        if self.proximity:
+            self.proximity.remove(uid)
+        self._slots[player.index] = None
+        self._free_indices.append(player.index)
+        self._leave_socket_rooms(player, player.room)
 
     def change_room(self, uid: str, room_index: int, x: int, y: int) -> None:
         if uid not in self.players:
@@ -100,14 +153,77 @@ class Session:
 
         self._player_rooms[player.room].discard(uid)
         self._player_rooms[room_index].add(uid)
+        self._grids[player.room].remove(uid)
 
-        coord_key = f"{player.x}, {player.y}"
-        if coord_key in self._player_positions[player.room]:
-            self._player_positions[player.room][coord_key].discard(uid)
+        self._leave_socket_rooms(player, player.room)
+        self._join_socket_rooms(player, room_index)
 
         player.room = room_index
         self.move_player(uid, x, y)
 
+    def place_player(self, uid: str, room_index: int, x: int, y: int) -> bool:
+        """Put a player on (x, y) of room_index if it may stand there, e.g. where it was before a restart."""
+        if uid not in self.players or not 0 <= room_index < len(self.rooms):
+            return False
+        if not self.rooms[room_index].can_stand(x, y):
+            return False
+        self.change_room(uid, room_index, x, y)
+        return True
+
+    def apply_map(self, map_data: RealmData, room_index: int) -> None:
+        """Swap in an edited map whose changes are confined to the tiles of room_index."""
+        self.map_data = map_data
+        self.rooms[room_index] = CompiledRoom(map_data["rooms"][room_index].get("tilemap") or {})
+        if self.proximity:
+            # Private areas may have moved under players that are standing still
+            for uid in list(self._player_rooms[room_index]):
+                self.proximity.update(uid)
+
+    def room_name(self, room_index: int) -> str:
+        return game_room_name(self.id, room_index)
+
+    def stream_room_name(self, room_index: int, binary: bool) -> str:
+        return stream_room_name(self.id, room_index, binary)
+
+    def get_player_by_index(self, index: int) -> Player | None:
+        if 0 <= index < len(self._slots):
+            return self._slots[index]
+        return None
+
+    def _allocate_index(self) -> int:
+        if self._free_indices:
+            return self._free_indices.popleft()
+        self._slots.append(None)
+        return len(self._slots) - 1
+
+    def add_chat_message(self, room_index: int, entry: dict[str, Any]) -> None:
+        history = self._chat.get(room_index)
+        if history is None:
+            history = self._chat[room_index] = deque(maxlen=settings.CHAT_HISTORY_SIZE)
+        history.append(entry)
+
+    def get_chat_history(self, room_index: int) -> list[dict[str, Any]]:
+        return list(self._chat.get(room_index, ()))
+
+    def get_chat_rooms(self) -> list[int]:
+        return [room_index for room_index, history in self._chat.items() if history]
+
+    def has_stream_members(self, room_index: int, binary: bool) -> bool:
+        return self._stream_counts.get((room_index, binary), 0) > 0
+
+    def _join_socket_rooms(self, player: Player, room_index: int) -> None:
+        key = (room_index, player.binary)
+        self._stream_counts[key] = self._stream_counts.get(key, 0) + 1
+        if self._enter_room:
+            self._enter_room(player.socket_id, self.room_name(room_index))
+            self._enter_room(player.socket_id, self.stream_room_name(room_index, player.binary))
+
+    def _leave_socket_rooms(self, player: Player, room_index: int) -> None:
+        self._stream_counts[(room_index, player.binary)] -= 1
+        if self._leave_room:
+            self._leave_room(player.socket_id, self.room_name(room_index))
+            self._leave_room(player.socket_id, self.stream_room_name(room_index, player.binary))
+
     def get_players_in_room(self, room_index: int) -> list[Player]:
         uids = self._player_rooms.get(room_index, set())
         return [self.players[uid] for uid in uids if uid in self.players]
@@ -124,16 +240,53 @@ class Session:
     def get_player_room(self, uid: str) -> int:
         return self.players[uid].room
 
-    def move_player(self, uid: str, x: int, y: int) -> None:
+    def move_player(self, uid: str, x: int, y: int) -> bool:
+        """Move a player within its room. Returns True if it crossed into another grid cell."""
         player = self.players[uid]
-        old_coord_key = f"{player.x}, {player.y}"
-        if old_coord_key in self._player_positions[player.room]:
-            self._player_positions[player.room][old_coord_key].discard(uid)
-
         player.x = x
         player.y = y
-
-        coord_key = f"{x}, {y}"
-        if coord_key not in self._player_positions[player.room]:
-            self._player_positions[player.room][coord_key] = set()
-        self._player_positions[player.room][coord_key].add(uid)
+        grid = self._grids[player.room]
+        if uid not in grid:
+            grid.insert(uid, x, y)
+            entered_cell = True
+        else:
+            entered_cell = grid.move(uid, x, y)
+        if self.proximity:
+            self.proximity.update(uid)
+        return entered_cell
+
+    def can_move_to(self, uid: str, x: int, y: int) -> bool:
+        """Whether the player may stand on (x, y) in its current room."""
+        return self.rooms[self.players[uid].room].can_stand(x, y)
+
+    def can_teleport_to(self, uid: str, room_index: int, x: int, y: int) -> bool:
+        """Whether some teleporter in the player's current room leads to (room_index, x, y)."""
+        if not 0 <= room_index < len(self.rooms):
+            return False
+        return (room_index, x, y) in self.rooms[self.players[uid].room].teleport_targets
+
+    def get_players_near(self, room_index: int, x: int, y: int, radius: int) -> list[Player]:
+        """Players in room_index within radius tiles of (x, y) on both axes."""
+        grid = self._grids.get(room_index)
+        if grid is None:
+            return []
+        players = self.players
+        found = []
+        for cell in grid.iter_cells(x, y, radius):
+            for uid in cell:
+                player = players[uid]
+                if abs(player.x - x) <= radius and abs(player.y - y) <= radius:
+                    found.append(player)
+        return found
+
+    def in_view(self, room_index: int, ax: int, ay: int, bx: int, by: int) -> bool:
+        """Whether players at (ax, ay) and (bx, by) in room_index see each other in AOI mode."""
+        return self._grids[room_index].in_view(ax, ay, bx, by, settings.AOI_VIEW_CELLS)
+
+    def get_players_in_view(self, room_index: int, x: int, y: int) -> list[Player]:
+        """Players in room_index whose view cells overlap the cell containing (x, y)."""
+        grid = self._grids.get(room_index)
+        if grid is None:
+            return []
+        players = self.players
+        return [players[uid] for cell in grid.iter_view(x, y, settings.AOI_VIEW_CELLS) for uid in cell]
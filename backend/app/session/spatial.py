@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from typing import Iterator
+
+_CELL_MASK = 0xFFFFFFFF
+
+
+def cell_key(cx: int, cy: int) -> int:
+    """Pack a cell coordinate pair into a single int (valid for |cy| < 2**31)."""
+    return (cx << 32) | (cy & _CELL_MASK)
+
+
+class SpatialGrid:
+    """Spatial hash of uids bucketed into cell_size x cell_size tile cells."""
+
+    def __init__(self, cell_size: int) -> None:
+        self.cell_size = max(1, cell_size)
+        # cell key -> uids in that cell
+        self._cells: dict[int, set[str]] = {}
+        # uid -> cell key
+        self._uid_cells: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._uid_cells)
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._uid_cells
+
+    def cell_of(self, x: int, y: int) -> int:
+        size = self.cell_size
+        return cell_key(x // size, y // size)
+
+    def insert(self, uid: str, x: int, y: int) -> None:
+        self.remove(uid)
+        key = self.cell_of(x, y)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = set()
+        cell.add(uid)
+        self._uid_cells[uid] = key
+
+    def remove(self, uid: str) -> None:
+        key = self._uid_cells.pop(uid, None)
+        if key is None:
+            return
+        cell = self._cells[key]
+        cell.discard(uid)
+        if not cell:
+            del self._cells[key]
+
+    def move(self, uid: str, x: int, y: int) -> bool:
+        """Update a uid's position. Returns True if it crossed into another cell."""
+        key = self.cell_of(x, y)
+        old_key = self._uid_cells.get(uid)
+        if old_key == key:
+            return False
+        self.insert(uid, x, y)
+        return old_key is not None
+
+    def in_view(self, ax: int, ay: int, bx: int, by: int, view_cells: int) -> bool:
+        """Whether the cells containing (ax, ay) and (bx, by) are within view_cells cells of each other."""
+        size = self.cell_size
+        return abs(ax // size - bx // size) <= view_cells and abs(ay // size - by // size) <= view_cells
+
+    def iter_cells(self, x: int, y: int, radius: int) -> Iterator[set[str]]:
+        """Yield the non-empty cells overlapping the square of half-width radius tiles around (x, y)."""
+        size = self.cell_size
+        cells = self._cells
+        for cx in range((x - radius) // size, (x + radius) // size + 1):
+            base = cx << 32
+            for cy in range((y - radius) // size, (y + radius) // size + 1):
+                cell = cells.get(base | (cy & _CELL_MASK))
+                if cell:
+                    yield cell
+
+    def iter_view(self, x: int, y: int, view_cells: int) -> Iterator[set[str]]:
+        """Yield the non-empty cells within view_cells cells of the cell containing (x, y)."""
+        size = self.cell_size
+        cx0 = x // size
+        cy0 = y // size
+        cells = self._cells
+        for cx in range(cx0 - view_cells, cx0 + view_cells + 1):
+            base = cx << 32
+            for cy in range(cy0 - view_cells, cy0 + view_cells + 1):
+                cell = cells.get(base | (cy & _CELL_MASK))
+                if cell:
+                    yield cell
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from array import array
+from typing import Any
+
+
+class CompiledRoom:
+    """Dense, array-backed view of one room's tilemap for O(1) server-side lookups.
+
+    Tiles are addressed by (x - min_x) + (y - min_y) * width inside the bounding box
+    of the room's tilemap.
+    """
+
+    __slots__ = (
+        "min_x",
+        "min_y",
+        "width",
+        "height",
+        "collision",
+        "teleport_targets",
+        "private_areas",
+        "private_area_ids",
+    )
+
+    def __init__(self, tilemap: dict[str, Any]) -> None:
+        coords: list[tuple[int, int, dict[str, Any]]] = []
+        for key, tile in tilemap.items():
+            try:
+                x_str, y_str = key.split(",")
+                coords.append((int(x_str), int(y_str), tile or {}))
+            except ValueError:
+                continue
+
+        if coords:
+            self.min_x = min(c[0] for c in coords)
+            self.min_y = min(c[1] for c in coords)
+            self.width = max(c[0] for c in coords) - self.min_x + 1
+            self.height = max(c[1] for c in coords) - self.min_y + 1
+        else:
+            self.min_x = self.min_y = self.width = self.height = 0
+
+        size = self.width * self.height
+        # 1 bit per tile, set when impassable
+        self.collision = bytearray((size + 7) // 8)
+        # every (roomIndex, x, y) some teleporter in this room leads to
+        self.teleport_targets: set[tuple[int, int, int]] = set()
+        # tile offset -> index into private_area_ids, 0 for no private area
+        self.private_areas = array("H", bytes(2 * size))
+        self.private_area_ids: list[str | None] = [None]
+
+        area_lookup: dict[str, int] = {}
+        for x, y, tile in coords:
+            offset = (x - self.min_x) + (y - self.min_y) * self.width
+            if tile.get("impassable"):
+                self.collision[offset >> 3] |= 1 << (offset & 7)
+
+            teleporter = tile.get("teleporter")
+            if teleporter:
+                try:
+                    target = (int(teleporter["roomIndex"]), int(teleporter["x"]), int(teleporter["y"]))
+                except (KeyError, TypeError, ValueError):
+                    target = None
+                if target is not None:
+                    self.teleport_targets.add(target)
+
+            area_id = tile.get("privateAreaId")
+            if area_id:
+                area_index = area_lookup.get(area_id)
+                if area_index is None:
+                    area_index = area_lookup[area_id] = len(self.private_area_ids)
+                    self.private_area_ids.append(area_id)
+                self.private_areas[offset] = area_index
+
+    def _offset(self, x: int, y: int) -> int:
+        """Tile offset of (x, y), or -1 if outside the room's bounding box."""
+        dx = x - self.min_x
+        dy = y - self.min_y
+        if dx < 0 or dy < 0 or dx >= self.width or dy >= self.height:
+            return -1
+        return dx + dy * self.width
+
+    def can_stand(self, x: int, y: int) -> bool:
+        """Whether a player may stand on (x, y).
+
+        Only impassable tiles block, as on the client: positions outside the
+        tilemap's bounding box are free.
+        """
+        offset = self._offset(x, y)
+        return offset < 0 or not self.collision[offset >> 3] & (1 << (offset & 7))
+
+    def private_area_at(self, x: int, y: int) -> str | None:
+        offset = self._offset(x, y)
+        if offset < 0:
+            return None
+        return self.private_area_ids[self.private_areas[offset]]
+
+
+def compile_rooms(map_data: dict[str, Any]) -> list[CompiledRoom]:
+    return [CompiledRoom(room.get("tilemap") or {}) for room in map_data.get("rooms", [])]
+
+
+def is_structural_change(old: dict[str, Any], new: dict[str, Any]) -> bool:
+    """Whether new differs from old beyond tile contents: rooms added, removed or renamed, or the spawn moved."""
+    if old.get("spawnpoint") != new.get("spawnpoint"):
+        return True
+    old_rooms = old.get("rooms", [])
+    new_rooms = new.get("rooms", [])
+    if len(old_rooms) != len(new_rooms):
+        return True
+    for old_room, new_room in zip(old_rooms, new_rooms):
+        if {k: v for k, v in old_room.items() if k != "tilemap"} != {k: v for k, v in new_room.items() if k != "tilemap"}:
+            return True
+    return False
+
+
+def diff_tilemap(old: dict[str, Any], new: dict[str, Any]) -> dict[str, Any]:
+    """Tiles of new that differ from old, keyed by "x, y"; removed tiles map to None."""
+    changes: dict[str, Any] = {key: tile for key, tile in new.items() if old.get(key) != tile}
+    for key in old.keys() - new.keys():
+        changes[key] = None
+    return changes
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+
+from app.config import settings
+from app.sockets.outbound import outbound
+
+
+class _Ticket:
+    __slots__ = ("sid", "future", "position")
+
+    def __init__(self, sid: str, future: asyncio.Future) -> None:
+        self.sid = sid
+        self.future = future
+        # Last position sent to the client
+        self.position = 0
+
+
+class JoinAdmission:
+    """FIFO gate in front of the join path: at most `concurrency` joins load at once.
+
+    Joins beyond that wait in arrival order, up to `max_waiting`, and are told their
+    place in line ("joinQueued" {"position"}) at most once per notify_interval.
+    """
+
+    def __init__(self, concurrency: int, max_waiting: int, notify_interval: float) -> None:
+        self._concurrency = max(1, concurrency)
+        self._max_waiting = max_waiting
+        self._notify_interval = notify_interval
+        self._active = 0
+        self._waiting: deque[_Ticket] = deque()
+        self._notify_task: asyncio.Task | None = None
+
+    def full(self) -> bool:
+        return self._active >= self._concurrency and len(self._waiting) >= self._max_waiting
+
+    async def acquire(self, sid: str) -> bool:
+        """Wait for a join slot. False if the socket went away (cancel) while waiting."""
+        if self._active < self._concurrency and not self._waiting:
+            self._active += 1
+            return True
+
+        ticket = _Ticket(sid, asyncio.get_event_loop().create_future())
+        self._waiting.append(ticket)
+        ticket.position = len(self._waiting)
+        await outbound.emit("joinQueued", {"position": ticket.position}, to=sid)
+        return await ticket.future
+
+    def release(self) -> None:
+        """Give the slot to the next waiter, or free it."""
+        while self._waiting:
+            ticket = self._waiting.popleft()
+            if not ticket.future.done():
+                # The slot passes straight to the waiter, so _active is unchanged
+                ticket.future.set_result(True)
+                self._schedule_notify()
+                return
+        self._active -= 1
+
+    def cancel(self, sid: str) -> None:
+        for ticket in self._waiting:
+            if ticket.sid == sid:
+                self._waiting.remove(ticket)
+                if not ticket.future.done():
+                    ticket.future.set_result(False)
+                self._schedule_notify()
+                return
+
+    def stats(self) -> dict[str, int]:
+        return {"active": self._active, "waiting": len(self._waiting), "concurrency": self._concurrency}
+
+    def _schedule_notify(self) -> None:
+        if self._notify_task is None and self._waiting:
+            self._notify_task = asyncio.get_event_loop().create_task(self._notify_positions())
+
+    async def _notify_positions(self) -> None:
+        try:
+            await asyncio.sleep(self._notify_interval)
+            emits = []
+            for position, ticket in enumerate(self._waiting, start=1):
+                if position != ticket.position:
+                    ticket.position = position
+                    emits.append(outbound.emit("joinQueued", {"position": position}, to=ticket.sid))
+            if emits:
+                await asyncio.gather(*emits)
+        finally:
+            self._notify_task = None
+
+
+join_admission = JoinAdmission(
+    settings.JOIN_CONCURRENCY,
+    settings.JOIN_QUEUE_MAX,
+    settings.JOIN_QUEUE_NOTIFY_INTERVAL,
+)
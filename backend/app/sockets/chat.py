@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.config import settings
+from app.services.chat import chat_archive
+from app.session import Player, Session, session_manager
+from app.sockets.outbound import outbound
+
+
+class ChatRelay:
+    """Record chat in each room's history and deliver it as one "receiveMessages" batch per room per tick."""
+
+    def __init__(self, tick_rate: int) -> None:
+        self._interval = 1 / max(1, tick_rate)
+        # (sessionId, roomIndex) -> messages posted since the last flush
+        self._pending: dict[tuple[str, int], list[dict]] = {}
+        self._task: asyncio.Task | None = None
+
+    def post(self, session: Session, player: Player, message: str) -> None:
+        ts = time.time()
+        entry = {"uid": player.uid, "username": player.username, "message": message, "ts": int(ts * 1000)}
+        session.add_chat_message(player.room, entry)
+        self._pending.setdefault((session.id, player.room), []).append(entry)
+        if settings.CHAT_PERSIST:
+            chat_archive.add(session.realm_id, player.room, player.uid, message, ts)
+
+    def history(self, session: Session, room_index: int) -> list[dict]:
+        """The room's chat history without the messages still waiting for the next batch, which the caller gets anyway."""
+        history = session.get_chat_history(room_index)
+        pending = self._pending.get((session.id, room_index))
+        if pending:
+            del history[max(0, len(history) - len(pending)):]
+        return history
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = {}
+
+        emits = []
+        for (session_id, room_index), messages in pending.items():
+            session = session_manager.get_session(session_id)
+            if not session:
+                continue
+            # The sender gets its own messages back too; clients only render messages of other players
+            emits.append(outbound.emit("receiveMessages", messages, room=session.room_name(room_index)))
+        if emits:
+            await asyncio.gather(*emits)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            started = loop.time()
+            try:
+                await self.flush()
+            except Exception:
+                pass  # A failed broadcast must not stop the relay
+            await asyncio.sleep(max(0.0, self._interval - (loop.time() - started)))
+
+
+chat_relay = ChatRelay(settings.TICK_RATE)
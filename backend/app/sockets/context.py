@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from app.session import Player, Session
+
+
+class ConnectionContext:
+    """What the event handlers need about one socket, resolved once instead of on every event."""
+
+    __slots__ = ("sid", "uid", "session", "player")
+
+    def __init__(self, sid: str, uid: str) -> None:
+        self.sid = sid
+        self.uid = uid
+        # Set while the socket's player is in a realm on this worker
+        self.session: Session | None = None
+        self.player: Player | None = None
+
+
+class ConnectionRegistry:
+    """sid -> ConnectionContext.
+
+    A context is opened at connect (or at the first forwarded join, on the worker
+    owning the realm), bound to the Session and Player at joinRealm, unbound when
+    the player is kicked or its realm is closed, and closed at disconnect. Every
+    path that removes a player from a session must unbind it here.
+    """
+
+    def __init__(self) -> None:
+        self._contexts: dict[str, ConnectionContext] = {}
+        # Hot path: a plain dict lookup
+        self.get = self._contexts.get
+
+    def open(self, sid: str, uid: str) -> ConnectionContext:
+        context = self._contexts[sid] = ConnectionContext(sid, uid)
+        return context
+
+    def bind(self, sid: str, uid: str, session: Session, player: Player) -> None:
+        context = self._contexts.get(sid)
+        if context is None or context.uid != uid:
+            context = self.open(sid, uid)
+        context.session = session
+        context.player = player
+
+    def unbind(self, sid: str) -> None:
+        context = self._contexts.get(sid)
+        if context is not None:
+            context.session = None
+            context.player = None
+
+    def close(self, sid: str) -> None:
+        self._contexts.pop(sid, None)
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+
+connections = ConnectionRegistry()
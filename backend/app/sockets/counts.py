@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.config import settings
+from app.session import session_manager
+from app.sockets.outbound import outbound
+
+# Realms one socket may follow, as many as one /getPlayerCounts request
+MAX_SUBSCRIBED_REALMS = 100
+
+
+def player_count_room(realm_id: str) -> str:
+    """Name of the Socket.IO room of sockets subscribed to a realm's player count."""
+    return f"playerCount:{realm_id}"
+
+
+class PlayerCountPublisher:
+    """Push realm player counts to subscribed dashboards instead of having them poll /getPlayerCounts.
+
+    Every `interval` seconds the realms whose count changed on this worker (see
+    SessionManager.take_count_changes) get one "playerCounts" message to their
+    subscription room, so a realm with many joins and leaves still sends at most
+    one update per interval, and a join undone within the interval sends none.
+    In cluster mode each worker publishes the realms it owns; the backplane
+    reaches subscribers on every worker.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+        # realm id -> count last sent, for realms with players
+        self._published: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def flush(self) -> None:
+        changes = session_manager.take_count_changes()
+        if not changes:
+            return
+
+        published = self._published
+        emits = []
+        for realm_id, count in changes.items():
+            if published.get(realm_id, 0) == count:
+                continue
+            if count:
+                published[realm_id] = count
+            else:
+                published.pop(realm_id, None)
+            emits.append(outbound.emit("playerCounts", {realm_id: count}, room=player_count_room(realm_id)))
+        if emits:
+            await asyncio.gather(*emits)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            started = loop.time()
+            try:
+                await self.flush()
+            except Exception:
+                pass  # A failed broadcast must not stop the publisher
+            await asyncio.sleep(max(0.0, self._interval - (loop.time() - started)))
+
+
+player_counts = PlayerCountPublisher(settings.PLAYER_COUNTS_INTERVAL)
@@ -1,17 +1,41 @@
 from __future__ import annotations
 
+import asyncio
 import re
+from contextvars import ContextVar
+from typing import Any
 
 import socketio
 
-from app.database import get_pool
+from app import metrics
+from app.cluster import cluster
+from app.config import settings
 from app.models.game import JoinRealmData, MovePlayerData, TeleportData
+from app.services import realms as realm_store
+from app.services.snapshot import session_snapshots
 from app.services.users import AnonymousUser, users
+from app.services.writebehind import profile_writer
 from app.session import session_manager
-from app.sockets.helpers import kick_player
+from app.sockets.admission import join_admission
+from app.sockets.chat import chat_relay
+from app.sockets.context import connections
+from app.sockets.counts import MAX_SUBSCRIBED_REALMS, player_count_room
+from app.sockets.helpers import RESTART_MESSAGE, emit_proximity_changes, is_draining, kick_player
+from app.sockets.outbound import outbound
+from app.sockets.protocol import decode_move, decode_teleport, encode_positions
+from app.sockets.routing import kick_elsewhere, shard_counts
+from app.sockets.ticker import movement_ticker
 
 _joining_in_progress: set[str] = set()
 
+# Socket session of an event forwarded from the worker holding the connection (cluster mode)
+_forwarded_session: ContextVar[dict[str, Any] | None] = ContextVar("_forwarded_session", default=None)
+
+# Events that run on the worker owning the socket's realm
+_REALM_EVENTS = (
+    "joinRealm", "movePlayer", "movePlayerBin", "teleport", "teleportBin", "changedSkin", "sendMessage",
+)
+
 
 def _remove_extra_spaces(text: str) -> str:
     value = re.sub(r"\s\s+", " ", text)
@@ -20,35 +44,56 @@ def _remove_extra_spaces(text: str) -> str:
     return value.strip()
 
 
-def _emit_to_room(sio: socketio.AsyncServer, session, uid: str, event: str, data):
-    """Build a list of coroutines that emit to all players in the same game-room except uid."""
-    room_index = session.get_player_room(uid)
-    players = session.get_players_in_room(room_index)
-    coros = []
-    for player in players:
-        if player.socket_id != _get_sid_for_uid(session, uid):
-            coros.append(sio.emit(event, data, to=player.socket_id))
-    return coros
-
-
-def _get_sid_for_uid(session, uid: str) -> str | None:
-    player = session.players.get(uid)
-    return player.socket_id if player else None
-
-
-async def _emit_to_room_await(sio: socketio.AsyncServer, session, uid: str, event: str, data):
-    """Emit event to all players in the same game-room except the player with uid."""
-    room_index = session.get_player_room(uid)
-    players = session.get_players_in_room(room_index)
-    sid = _get_sid_for_uid(session, uid)
-    for player in players:
-        if player.socket_id != sid:
-            await sio.emit(event, data, to=player.socket_id)
+def _space_full_message() -> str:
+    total = settings.SHARD_CAPACITY * settings.MAX_SHARDS_PER_REALM
+    return f"Space is full. It's {total} players max."
+
+
+async def _session_data(sio: socketio.AsyncServer, sid: str) -> dict[str, Any] | None:
+    forwarded = _forwarded_session.get()
+    if forwarded is not None:
+        return forwarded
+    return await sio.get_session(sid)
+
+
+async def _emit_to_room_await(session, player, event: str, data):
+    """Emit event to all players in the same game-room except player."""
+    await outbound.emit(event, data, room=session.room_name(player.room), skip_sid=player.socket_id)
+
+
+async def _emit_teleported(session, player, viewers=None) -> None:
+    """Send a same-room teleport in each client's wire format, to the whole room or only to viewers."""
+    if viewers is None:
+        await asyncio.gather(
+            outbound.emit(
+                "playerTeleported",
+                {"uid": player.uid, "x": player.x, "y": player.y},
+                room=session.stream_room_name(player.room, False),
+                skip_sid=player.socket_id,
+            ),
+            outbound.emit(
+                "playerTeleportedBin",
+                encode_positions([player]),
+                room=session.stream_room_name(player.room, True),
+                skip_sid=player.socket_id,
+            ),
+        )
+        return
+
+    json_sids = [p.socket_id for p in viewers if not p.binary]
+    bin_sids = [p.socket_id for p in viewers if p.binary]
+    emits = []
+    if json_sids:
+        emits.append(outbound.emit("playerTeleported", {"uid": player.uid, "x": player.x, "y": player.y}, to=json_sids))
+    if bin_sids:
+        emits.append(outbound.emit("playerTeleportedBin", encode_positions([player]), to=bin_sids))
+    if emits:
+        await asyncio.gather(*emits)
 
 
 def register_handlers(sio: socketio.AsyncServer) -> None:
+    get_context = connections.get
 
-    @sio.event
     async def connect(sid, environ, auth):
         """Validate connection: extract uid and username from query string."""
         from urllib.parse import parse_qs
@@ -62,31 +107,35 @@ def register_handlers(sio: socketio.AsyncServer) -> None:
                 query_string = qs.decode()
 
         params = parse_qs(query_string)
+        if params.get("watch", [None])[0] == "playerCounts":
+            # Dashboard socket: follows realm player counts and never joins a realm
+            await sio.save_session(sid, {"watch": True})
+            outbound.register(sid, False)
+            return
+
         uid = params.get("uid", [None])[0]
         username = params.get("username", [None])[0]
 
         if not uid or not username:
             raise socketio.exceptions.ConnectionRefusedError("uid and username are required.")
 
+        binary = params.get("protocol", [None])[0] == "binary"
+
         # Store uid/username in session
-        await sio.save_session(sid, {"uid": uid, "username": username})
+        await sio.save_session(sid, {"uid": uid, "username": username, "binary": binary})
+        outbound.register(sid, binary)
+        connections.open(sid, uid)
 
-        # Upsert profile
-        pool = get_pool()
-        try:
-            await pool.execute(
-                "INSERT INTO profiles (id, username) VALUES ($1, $2) ON CONFLICT (id) DO UPDATE SET username = $2",
-                uid, username,
-            )
-        except Exception:
-            pass  # Profile upsert failed, but we can still proceed
+        # Upsert profile in the background; the handshake does not wait on the database
+        profile_writer.upsert_profile(uid, username)
 
         users.add_user(uid, AnonymousUser(id=uid, username=username))
 
-    @sio.event
     async def joinRealm(sid, data):
-        session_data = await sio.get_session(sid)
-        uid = session_data["uid"]
+        session_data = await _session_data(sio, sid)
+        uid = session_data.get("uid")
+        if not uid:
+            return
 
         async def reject_join(reason: str):
             await sio.emit("failedToJoinRoom", reason, to=sid)
@@ -106,53 +155,80 @@ def register_handlers(sio: socketio.AsyncServer) -> None:
             await reject_join("Already joining a space.")
             return
 
+        if is_draining():
+            await reject_join(RESTART_MESSAGE)
+            return
+
         _joining_in_progress.add(uid)
 
         session = session_manager.get_session(realm_data.realmId)
         if session:
-            if session.get_player_count() >= 30:
-                await reject_join("Space is full. It's 30 players max.")
+            if not session_manager.has_capacity(realm_data.realmId):
+                await reject_join(_space_full_message())
                 return
 
-        pool = get_pool()
+        if join_admission.full():
+            await reject_join("Too many people are joining right now. Try again in a moment.")
+            return
+        if not await join_admission.acquire(sid):
+            _joining_in_progress.discard(uid)  # Disconnected while waiting in line
+            return
+
         try:
-            row = await pool.fetchrow(
-                "SELECT owner_id, share_id, map_data, only_owner FROM realms WHERE id = $1::uuid",
-                realm_data.realmId,
-            )
+            realm = await realm_store.get_realm(realm_data.realmId)
 
-            if not row:
+            if not realm:
                 await reject_join("Space not found.")
                 return
 
-            realm = dict(row)
-
-            profile_row = await pool.fetchrow(
-                "SELECT skin FROM profiles WHERE id = $1",
-                uid,
-            )
-            skin = profile_row["skin"] if profile_row else "009"
+            skin = await realm_store.get_skin(uid)
 
             async def join():
                 if not session_manager.get_session(realm_data.realmId):
-                    session_manager.create_session(realm_data.realmId, realm["map_data"])
+                    # Shards and chat from before a restart, if the realm was live then
+                    if not session_snapshots.restore_realm(realm_data.realmId, realm["map_data"]):
+                        session_manager.create_session(realm_data.realmId, realm["map_data"])
 
                 current_session = session_manager.get_player_session(uid)
                 if current_session:
                     await kick_player(uid, "You have logged in from another location.")
+                await kick_elsewhere(uid, "You have logged in from another location.")
 
                 user = users.get_user(uid)
                 if not user:
                     await reject_join("User not found.")
                     return
 
-                session_manager.add_player_to_session(sid, realm_data.realmId, uid, user.username, skin)
+                # Back after a restart: same shard and position, unless the link asks for another shard
+                resume = session_snapshots.take_resume(uid, realm_data.realmId)
+                shard_id = realm_data.shardId
+                if resume and shard_id is None and realm_data.followUid is None:
+                    shard_id = resume.shard_id
+                shard = session_manager.assign_shard(realm_data.realmId, shard_id, realm_data.followUid)
+                if not shard:
+                    await reject_join(_space_full_message())
+                    return
+
+                session_manager.add_player_to_session(
+                    sid, shard.id, uid, user.username, skin, session_data.get("binary", False)
+                )
                 new_session = session_manager.get_player_session(uid)
                 player = new_session.get_player(uid)
+                if resume:
+                    new_session.place_player(uid, resume.room, resume.x, resume.y)
+                connections.bind(sid, uid, new_session, player)
 
                 await sio.enter_room(sid, realm_data.realmId)
-                await sio.emit("joinedRealm", to=sid)
-                await _emit_to_room_await(sio, new_session, uid, "playerJoinedRoom", player.to_dict())
+                await sio.emit("joinedRealm", {
+                    "index": player.index,
+                    "shardId": new_session.id,
+                    "room": player.room,
+                    "x": player.x,
+                    "y": player.y,
+                    "chat": chat_relay.history(new_session, player.room),
+                }, to=sid)
+                await _emit_to_room_await(new_session, player, "playerJoinedRoom", player.to_dict())
+                await emit_proximity_changes(new_session)
                 _joining_in_progress.discard(uid)
 
             owner_id = str(realm["owner_id"])
@@ -174,10 +250,22 @@ def register_handlers(sio: socketio.AsyncServer) -> None:
         except Exception:
             await reject_join("Server error.")
             return
+        finally:
+            join_admission.release()
+
+    async def disconnect(sid, reason=None):
+        outbound.discard(sid)
+        join_admission.cancel(sid)
+        connections.close(sid)
+        if cluster.enabled and _forwarded_session.get() is None:
+            session_data = await sio.get_session(sid)
+            realm_id = session_data.get("realmId") if session_data else None
+            if realm_id and not cluster.is_local(realm_id):
+                cluster.forward_event(cluster.owner_of(realm_id), "disconnect", sid, None, session_data)
+                users.remove_user(session_data["uid"])
+                return
 
-    @sio.event
-    async def disconnect(sid):
-        session_data = await sio.get_session(sid)
+        session_data = await _session_data(sio, sid)
         uid = session_data.get("uid") if session_data else None
         if not uid:
             return
@@ -186,25 +274,86 @@ def register_handlers(sio: socketio.AsyncServer) -> None:
         if not session:
             return
 
-        socket_ids = session_manager.get_socket_ids_in_room(session.id, session.get_player_room(uid))
+        room = session.room_name(session.get_player_room(uid))
         success = session_manager.log_out_by_socket_id(sid)
         if success:
-            for socket_id in socket_ids:
-                if socket_id != sid:
-                    await sio.emit("playerLeftRoom", uid, to=socket_id)
+            await outbound.emit("playerLeftRoom", uid, room=room, skip_sid=sid)
+            await emit_proximity_changes(session)
             users.remove_user(uid)
 
-    @sio.event
-    async def movePlayer(sid, data):
-        session_data = await sio.get_session(sid)
-        uid = session_data.get("uid") if session_data else None
-        if not uid:
+    async def subscribePlayerCounts(sid, data):
+        """Follow the player counts of up to MAX_SUBSCRIBED_REALMS realms, replacing any earlier subscription."""
+        if not isinstance(data, list) or len(data) > MAX_SUBSCRIBED_REALMS:
+            return
+        realm_ids = list(dict.fromkeys(realm_id for realm_id in data if isinstance(realm_id, str)))
+
+        rooms = {player_count_room(realm_id) for realm_id in realm_ids}
+        for room in sio.rooms(sid):
+            if room.startswith(player_count_room("")) and room not in rooms:
+                await sio.leave_room(sid, room)
+        for room in rooms:
+            await sio.enter_room(sid, room)
+
+        # Current counts first; "playerCounts" updates follow only for realms whose count changes
+        counts = await shard_counts(realm_ids)
+        await outbound.emit("playerCounts", {realm_id: sum(shards) for realm_id, shards in zip(realm_ids, counts)}, to=sid)
+
+    async def _move(sid: str, x: int, y: int) -> None:
+        context = get_context(sid)
+        if context is None or context.player is None:
             return
+        session = context.session
+        player = context.player
 
-        session = session_manager.get_player_session(uid)
-        if not session:
+        if not session.can_move_to(player.uid, x, y):
+            return
+
+        old_x, old_y = player.x, player.y
+        entered_cell = session.move_player(player.uid, x, y)
+        movement_ticker.queue_move(session.id, player.room, player.uid, (old_x, old_y) if entered_cell else None)
+        await emit_proximity_changes(session)
+
+    async def _teleport(sid: str, room_index: int, x: int, y: int) -> None:
+        context = get_context(sid)
+        if context is None or context.player is None:
+            return
+        session = context.session
+        player = context.player
+        uid = player.uid
+
+        if not session.can_teleport_to(uid, room_index, x, y):
+            return
+
+        if player.room != room_index:
+            old_room = session.room_name(player.room)
+            session.change_room(uid, room_index, x, y)
+            # Notify the old and the new game-room in one step; the player gets the new room's chat so far
+            await asyncio.gather(
+                outbound.emit("playerLeftRoom", uid, room=old_room, skip_sid=sid),
+                outbound.emit("playerJoinedRoom", player.to_dict(), room=session.room_name(player.room), skip_sid=sid),
+                outbound.emit("chatHistory", chat_relay.history(session, room_index), to=sid),
+                emit_proximity_changes(session),
+            )
+            return
+
+        old_x, old_y = player.x, player.y
+        entered_cell = session.move_player(player.uid, x, y)
+        if not settings.AOI_ENABLED:
+            await asyncio.gather(_emit_teleported(session, player), emit_proximity_changes(session))
             return
 
+        # Players around the origin drop the teleporter, players around the destination pick it up
+        viewers = {p.uid: p for p in session.get_players_in_view(player.room, old_x, old_y)}
+        viewers.update((p.uid, p) for p in session.get_players_in_view(player.room, player.x, player.y))
+        viewers.pop(uid, None)
+        await asyncio.gather(
+            _emit_teleported(session, player, list(viewers.values())),
+            emit_proximity_changes(session),
+        )
+        if entered_cell:
+            movement_ticker.queue_move(session.id, player.room, uid, (old_x, old_y))
+
+    async def movePlayer(sid, data):
         try:
             move_data = MovePlayerData(**data) if isinstance(data, dict) else None
         except Exception:
@@ -212,26 +361,16 @@ def register_handlers(sio: socketio.AsyncServer) -> None:
         if not move_data:
             return
 
-        player = session.get_player(uid)
-        session.move_player(player.uid, move_data.x, move_data.y)
+        await _move(sid, move_data.x, move_data.y)
 
-        await _emit_to_room_await(sio, session, uid, "playerMoved", {
-            "uid": player.uid,
-            "x": player.x,
-            "y": player.y,
-        })
-
-    @sio.event
-    async def teleport(sid, data):
-        session_data = await sio.get_session(sid)
-        uid = session_data.get("uid") if session_data else None
-        if not uid:
+    async def movePlayerBin(sid, data):
+        move = decode_move(data)
+        if move is None:
             return
 
-        session = session_manager.get_player_session(uid)
-        if not session:
-            return
+        await _move(sid, *move)
 
+    async def teleport(sid, data):
         try:
             tp_data = TeleportData(**data) if isinstance(data, dict) else None
         except Exception:
@@ -239,53 +378,34 @@ def register_handlers(sio: socketio.AsyncServer) -> None:
         if not tp_data:
             return
 
-        player = session.get_player(uid)
-        if player.room != tp_data.roomIndex:
-            # Leaving current room - notify current room players
-            await _emit_to_room_await(sio, session, uid, "playerLeftRoom", uid)
-            # Change room
-            session.change_room(uid, tp_data.roomIndex, tp_data.x, tp_data.y)
-            # Notify new room players
-            await _emit_to_room_await(sio, session, uid, "playerJoinedRoom", player.to_dict())
-        else:
-            session.move_player(player.uid, tp_data.x, tp_data.y)
-            await _emit_to_room_await(sio, session, uid, "playerTeleported", {
-                "uid": uid,
-                "x": player.x,
-                "y": player.y,
-            })
-
-    @sio.event
-    async def changedSkin(sid, data):
-        session_data = await sio.get_session(sid)
-        uid = session_data.get("uid") if session_data else None
-        if not uid:
+        await _teleport(sid, tp_data.roomIndex, tp_data.x, tp_data.y)
+
+    async def teleportBin(sid, data):
+        tp = decode_teleport(data)
+        if tp is None:
             return
 
-        session = session_manager.get_player_session(uid)
-        if not session:
+        await _teleport(sid, *tp)
+
+    async def changedSkin(sid, data):
+        context = get_context(sid)
+        if context is None or context.player is None:
             return
 
         if not isinstance(data, str):
             return
 
-        player = session.get_player(uid)
+        player = context.player
         player.skin = data
 
-        await _emit_to_room_await(sio, session, uid, "playerChangedSkin", {
-            "uid": uid,
+        await _emit_to_room_await(context.session, player, "playerChangedSkin", {
+            "uid": player.uid,
             "skin": player.skin,
         })
 
-    @sio.event
     async def sendMessage(sid, data):
-        session_data = await sio.get_session(sid)
-        uid = session_data.get("uid") if session_data else None
-        if not uid:
-            return
-
-        session = session_manager.get_player_session(uid)
-        if not session:
+        context = get_context(sid)
+        if context is None or context.player is None:
             return
 
         if not isinstance(data, str):
@@ -294,9 +414,65 @@ def register_handlers(sio: socketio.AsyncServer) -> None:
         if len(data) > 300 or data.strip() == "":
             return
 
-        message = _remove_extra_spaces(data)
+        chat_relay.post(context.session, context.player, _remove_extra_spaces(data))
+
+    # Timed where they run, so forwarded events count on the worker that owns the realm
+    handlers = {
+        "joinRealm": metrics.timed("joinRealm", joinRealm),
+        "movePlayer": metrics.timed("movePlayer", movePlayer),
+        "movePlayerBin": metrics.timed("movePlayerBin", movePlayerBin),
+        "teleport": metrics.timed("teleport", teleport),
+        "teleportBin": metrics.timed("teleportBin", teleportBin),
+        "changedSkin": metrics.timed("changedSkin", changedSkin),
+        "sendMessage": metrics.timed("sendMessage", sendMessage),
+    }
+    timed_disconnect = metrics.timed("disconnect", disconnect)
+
+    sio.on("connect", metrics.timed("connect", connect))
+    sio.on("disconnect", timed_disconnect)
+    sio.on("subscribePlayerCounts", metrics.timed("subscribePlayerCounts", subscribePlayerCounts))
+
+    def _routed(event: str):
+        handler = handlers[event]
+
+        async def route(sid, data):
+            """Run the event here, or hand it to the worker that owns the socket's realm."""
+            if not cluster.enabled:
+                await handler(sid, data)
+                return
 
-        await _emit_to_room_await(sio, session, uid, "receiveMessage", {
-            "uid": uid,
-            "message": message,
-        })
+            session_data = await sio.get_session(sid)
+            if event == "joinRealm" and isinstance(data, dict) and isinstance(data.get("realmId"), str):
+                previous = session_data.get("realmId")
+                session_data["realmId"] = data["realmId"]
+                await sio.save_session(sid, session_data)
+                if previous and previous != data["realmId"] and not cluster.is_local(previous):
+                    # Leaving a realm owned elsewhere: that worker drops the player like a disconnect
+                    cluster.forward_event(cluster.owner_of(previous), "disconnect", sid, None, session_data)
+
+            realm_id = session_data.get("realmId")
+            if realm_id and not cluster.is_local(realm_id):
+                cluster.forward_event(cluster.owner_of(realm_id), event, sid, data, session_data)
+                return
+            await handler(sid, data)
+
+        return route
+
+    for event in _REALM_EVENTS:
+        sio.on(event, _routed(event))
+
+    async def run_forwarded(message: dict[str, Any]) -> None:
+        """Run an event forwarded by the worker holding the socket, as if the socket were local."""
+        session_data = message["session"]
+        event = message["event"]
+        _forwarded_session.set(session_data)
+        if event == "disconnect":
+            await timed_disconnect(message["sid"])
+            return
+        if event == "joinRealm":
+            users.add_user(session_data["uid"], AnonymousUser(id=session_data["uid"], username=session_data["username"]))
+        handler = handlers.get(event)
+        if handler is not None:
+            await handler(message["sid"], message["data"])
+
+    cluster.on_socket_event(run_forwarded)
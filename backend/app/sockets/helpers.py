@@ -1,11 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+
 import socketio
 
+from app.cluster.manager import BackplaneManager
+from app.services.snapshot import session_snapshots
 from app.session import session_manager
+from app.sockets.context import connections
+from app.sockets.outbound import outbound
 
 # Set via set_sio() from main.py to avoid circular imports
 _sio: socketio.AsyncServer | None = None
+RESTART_MESSAGE = "The server is restarting. Rejoin in a moment."
+
+# Set once this worker starts draining for a deploy: joins are refused from then on
+_draining = False
 
 
 def set_sio(sio: socketio.AsyncServer) -> None:
@@ -13,6 +23,49 @@ def set_sio(sio: socketio.AsyncServer) -> None:
     _sio = sio
 
 
+def enter_game_room(socket_id: str, room: str) -> None:
+    """Synchronously add a socket to a Socket.IO room (used by Session bookkeeping)."""
+    if _sio is None:
+        return
+    manager = _sio.manager
+    if isinstance(manager, BackplaneManager) and not manager.is_connected(socket_id, "/"):
+        # The socket lives on another worker; its worker applies the join
+        manager.enter_room_nowait(socket_id, "/", room)
+        return
+    try:
+        manager.basic_enter_room(socket_id, "/", room)
+    except (KeyError, ValueError):
+        pass  # Socket already disconnected
+
+
+def leave_game_room(socket_id: str, room: str) -> None:
+    """Synchronously remove a socket from a Socket.IO room."""
+    if _sio is None:
+        return
+    manager = _sio.manager
+    if isinstance(manager, BackplaneManager) and not manager.is_connected(socket_id, "/"):
+        manager.leave_room_nowait(socket_id, "/", room)
+        return
+    manager.basic_leave_room(socket_id, "/", room)
+
+
+async def emit_proximity_changes(session) -> None:
+    """Send pending proximityLeft/proximityJoined deltas to the players whose channel changed."""
+    if _sio is None or session.proximity is None:
+        return
+    emits = []
+    for uid, left, joined in session.proximity.drain():
+        player = session.players.get(uid)
+        if player is None:
+            continue
+        if left is not None:
+            emits.append(outbound.emit("proximityLeft", {"channelId": left}, to=player.socket_id))
+        if joined is not None:
+            emits.append(outbound.emit("proximityJoined", {"channelId": joined}, to=player.socket_id))
+    if emits:
+        await asyncio.gather(*emits)
+
+
 async def kick_player(uid: str, reason: str) -> None:
     sio = _sio
     assert sio is not None, "Socket.IO server not initialized"
@@ -21,15 +74,59 @@ async def kick_player(uid: str, reason: str) -> None:
     if not session:
         return
 
-    room_index = session.get_player_room(uid)
-    players = session.get_players_in_room(room_index)
-
-    for player in players:
-        if player.uid == uid:
-            await sio.emit("kicked", reason, to=player.socket_id)
-        else:
-            await sio.emit("playerLeftRoom", uid, to=player.socket_id)
-
     player = session.get_player(uid)
-    await sio.leave_room(player.socket_id, session.id)
+    await asyncio.gather(
+        outbound.emit("kicked", reason, to=player.socket_id),
+        outbound.emit("playerLeftRoom", uid, room=session.room_name(player.room), skip_sid=player.socket_id),
+    )
+
+    await sio.leave_room(player.socket_id, session.realm_id)
+    connections.unbind(player.socket_id)
     session_manager.log_out_player(uid)
+    await emit_proximity_changes(session)
+
+
+async def close_realm(realm_id: str, reason: str) -> int:
+    """Kick everyone out of a realm and drop its shards. Returns the number of players removed.
+
+    One "kicked" broadcast to the realm room replaces a kick and a playerLeftRoom per
+    player, and the realm's Socket.IO rooms are closed instead of left socket by socket.
+    """
+    sio = _sio
+    assert sio is not None, "Socket.IO server not initialized"
+
+    shards = session_manager.terminate_session(realm_id)
+    if not shards:
+        return 0
+
+    rooms = [realm_id]
+    for shard in shards:
+        for player in shard.players.values():
+            connections.unbind(player.socket_id)
+        for room_index in range(len(shard.rooms)):
+            rooms.append(shard.room_name(room_index))
+            rooms.append(shard.stream_room_name(room_index, False))
+            rooms.append(shard.stream_room_name(room_index, True))
+
+    await outbound.emit("kicked", reason, room=realm_id)
+    await asyncio.gather(*(sio.close_room(room) for room in rooms))
+    return sum(shard.get_player_count() for shard in shards)
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+async def drain(reason: str, timeout: float) -> int:
+    """Refuse new joins, snapshot and close every realm on this worker and wait up to timeout for the kicks to go out.
+
+    Returns the number of players removed.
+    """
+    global _draining
+    if not _draining:
+        _draining = True
+        # Last look at the realms before they close, for the next start to resume from
+        await session_snapshots.save(final=True)
+    removed = await asyncio.gather(*(close_realm(realm_id, reason) for realm_id in session_manager.get_realm_ids()))
+    await outbound.wait_flushed(timeout)
+    return sum(removed)
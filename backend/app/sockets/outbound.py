@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Any
+
+import socketio
+
+from app import metrics
+from app.config import settings
+from app.session import Player
+from app.sockets.protocol import encode_positions, positions_json
+
+
+class _PositionBucket(dict):
+    """uid -> Player; consecutive position updates for a slow socket collapse into one bucket (latest wins)."""
+
+    __slots__ = ()
+
+
+class _Connection:
+    __slots__ = ("sid", "binary", "items", "writer")
+
+    def __init__(self, sid: str, binary: bool) -> None:
+        self.sid = sid
+        self.binary = binary
+        # (event, data) tuples and _PositionBucket entries, in delivery order
+        self.items: deque[tuple[str, Any] | _PositionBucket] = deque()
+        self.writer: asyncio.Task | None = None
+
+
+class OutboundManager:
+    """Shields fast clients from slow ones.
+
+    Broadcasts go straight to Socket.IO for every recipient whose engine.io send
+    queue is shallow. A recipient whose queue is deeper than OUTBOUND_SLOW_DEPTH is
+    skipped and served by its own writer task from a bounded queue instead: position
+    updates collapse per uid, everything else stays ordered and lossless. A client
+    that lets OUTBOUND_QUEUE_MAX lossless messages pile up is disconnected.
+
+    Sockets are marked slow as engine.io sends leave their queue too deep, and
+    unmarked once their writer has caught up, so a broadcast only looks at the
+    (usually empty) slow set, never at every member of the room.
+    """
+
+    def __init__(self, max_queue: int, slow_depth: int, poll_interval: float) -> None:
+        self._max_queue = max_queue
+        self._slow_depth = slow_depth
+        self._poll_interval = poll_interval
+        self._sio: socketio.AsyncServer | None = None
+        self._connections: dict[str, _Connection] = {}
+        # sids with queued items or a deep engine.io queue
+        self._slow: set[str] = set()
+        self.coalesced = 0
+        self.overflow_disconnects = 0
+
+    def set_sio(self, sio: socketio.AsyncServer) -> None:
+        self._sio = sio
+        self._watch_send_queues(sio)
+
+    def register(self, sid: str, binary: bool) -> None:
+        self._connections[sid] = _Connection(sid, binary)
+
+    def discard(self, sid: str) -> None:
+        self._slow.discard(sid)
+        conn = self._connections.pop(sid, None)
+        if conn is not None and conn.writer is not None:
+            conn.writer.cancel()
+
+    async def emit(self, event: str, data: Any, *, to=None, room=None, skip_sid=None) -> None:
+        """Drop-in for sio.emit that queues for slow recipients instead of sending to them."""
+        sio = self._sio
+        assert sio is not None, "Socket.IO server not initialized"
+        slow, recipients = self._slow_recipients(to or room, skip_sid)
+        metrics.fanout_recipients.labels(event).observe(recipients)
+        if not slow:
+            await sio.emit(event, data, to=to, room=room, skip_sid=skip_sid)
+            return
+
+        for conn in slow:
+            self._push(conn, (event, data))
+        await self._emit_to_fast(event, data, to, room, skip_sid, slow)
+
+    async def emit_positions(self, players: list[Player], binary: bool, *, to=None, room=None, skip_sid=None) -> None:
+        """Send a position batch in one wire format, coalescing it into the queues of slow recipients."""
+        sio = self._sio
+        assert sio is not None, "Socket.IO server not initialized"
+        if binary:
+            event, data = "playersMovedBin", encode_positions(players)
+        else:
+            event, data = "playersMoved", positions_json(players)
+
+        slow, recipients = self._slow_recipients(to or room, skip_sid)
+        metrics.fanout_recipients.labels(event).observe(recipients)
+        if not slow:
+            await sio.emit(event, data, to=to, room=room, skip_sid=skip_sid)
+            return
+
+        for conn in slow:
+            tail = conn.items[-1] if conn.items else None
+            if not isinstance(tail, _PositionBucket):
+                tail = _PositionBucket()
+                self._push(conn, tail)
+            for player in players:
+                if player.uid in tail:
+                    self.coalesced += 1
+                tail[player.uid] = player
+        await self._emit_to_fast(event, data, to, room, skip_sid, slow)
+
+    async def wait_flushed(self, timeout: float) -> bool:
+        """Wait until no message is queued here or in engine.io for any socket. False on timeout."""
+        sio = self._sio
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while True:
+            pending = any(conn.items for conn in self._connections.values()) or any(
+                not socket.queue.empty() for socket in list(sio.eio.sockets.values())
+            )
+            if not pending:
+                return True
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(self._poll_interval)
+
+    def stats(self) -> dict[str, int]:
+        depths = [len(conn.items) for conn in self._connections.values()]
+        return {
+            "connections": len(depths),
+            "queuedConnections": sum(1 for depth in depths if depth),
+            "queuedMessages": sum(depths),
+            "maxQueueDepth": max(depths, default=0),
+            "coalesced": self.coalesced,
+            "overflowDisconnects": self.overflow_disconnects,
+        }
+
+    def _watch_send_queues(self, sio: socketio.AsyncServer) -> None:
+        """Mark a socket slow as soon as a send leaves its engine.io queue deeper than slow_depth."""
+        eio = sio.eio
+        send_packet = eio.send_packet
+        sockets = eio.sockets
+
+        async def watched_send_packet(eio_sid, pkt):
+            await send_packet(eio_sid, pkt)
+            socket = sockets.get(eio_sid)
+            if socket is not None and socket.queue.qsize() > self._slow_depth:
+                sid = sio.manager.sid_from_eio_sid(eio_sid, "/")
+                if sid in self._connections:
+                    self._slow.add(sid)
+
+        eio.send_packet = watched_send_packet
+
+    def _slow_recipients(self, target, skip_sid) -> tuple[list[_Connection], int]:
+        """Recipients to queue for instead of sending to, and the number of local recipients overall.
+
+        Room sizes come from Socket.IO's room index; only the slow set is walked.
+        """
+        if target is None:
+            return [], len(self._connections)
+        rooms = self._sio.manager.rooms.get("/", {})
+        members = [rooms.get(name) for name in (target if isinstance(target, list) else (target,))]
+        members = [room for room in members if room]
+        skip = skip_sid if isinstance(skip_sid, list) else ((skip_sid,) if skip_sid else ())
+
+        recipients = sum(len(room) for room in members)
+        for sid in skip:
+            if any(sid in room for room in members):
+                recipients -= 1
+        if not self._slow:
+            return [], recipients
+
+        slow = [
+            self._connections[sid]
+            for sid in self._slow
+            if sid not in skip and sid in self._connections and any(sid in room for room in members)
+        ]
+        return slow, recipients
+
+    async def _emit_to_fast(self, event, data, to, room, skip_sid, slow: list[_Connection]) -> None:
+        skip = list(skip_sid) if isinstance(skip_sid, list) else ([skip_sid] if skip_sid else [])
+        skip.extend(conn.sid for conn in slow)
+        await self._sio.emit(event, data, to=to, room=room, skip_sid=skip)
+
+    def _push(self, conn: _Connection, item) -> None:
+        if len(conn.items) >= self._max_queue:
+            # Memory per connection is capped: a client this far behind is dropped
+            self.overflow_disconnects += 1
+            self.discard(conn.sid)
+            asyncio.get_event_loop().create_task(self._sio.disconnect(conn.sid))
+            return
+        conn.items.append(item)
+        self._slow.add(conn.sid)
+        if conn.writer is None:
+            conn.writer = asyncio.get_event_loop().create_task(self._drain(conn))
+
+    def _eio_depth(self, sid: str) -> int:
+        sio = self._sio
+        socket = sio.eio.sockets.get(sio.manager.eio_sid_from_sid(sid, "/"))
+        return socket.queue.qsize() if socket is not None else 0
+
+    async def _drain(self, conn: _Connection) -> None:
+        sio = self._sio
+        try:
+            while conn.items:
+                if self._eio_depth(conn.sid) > self._slow_depth:
+                    await asyncio.sleep(self._poll_interval)
+                    continue
+                item = conn.items.popleft()
+                if isinstance(item, _PositionBucket):
+                    players = list(item.values())
+                    if conn.binary:
+                        await sio.emit("playersMovedBin", encode_positions(players), to=conn.sid)
+                    else:
+                        await sio.emit("playersMoved", positions_json(players), to=conn.sid)
+                else:
+                    event, data = item
+                    await sio.emit(event, data, to=conn.sid)
+        finally:
+            conn.writer = None
+            if not conn.items and self._eio_depth(conn.sid) <= self._slow_depth:
+                self._slow.discard(conn.sid)
+
+
+outbound = OutboundManager(
+    settings.OUTBOUND_QUEUE_MAX,
+    settings.OUTBOUND_SLOW_DEPTH,
+    1 / max(1, settings.TICK_RATE),
+)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import struct
+from typing import Iterable
+
+from app.session import Player
+
+# Opt-in binary wire format for high-frequency events. Clients connect with
+# ?protocol=binary and refer to players by their per-session index.
+#
+#   movePlayerBin     client -> server   <hh    x, y
+#   teleportBin       client -> server   <Hhh   roomIndex, x, y
+#   playersMovedBin   server -> client   (<Hhh  index, x, y) * n
+#   playerTeleportedBin server -> client <Hhh   index, x, y
+MOVE = struct.Struct("<hh")
+TELEPORT = struct.Struct("<Hhh")
+POSITION = struct.Struct("<Hhh")
+
+_COORD_MIN = -0x8000
+_COORD_MAX = 0x7FFF
+
+
+def decode_move(data) -> tuple[int, int] | None:
+    if not isinstance(data, (bytes, bytearray)) or len(data) != MOVE.size:
+        return None
+    return MOVE.unpack(data)
+
+
+def decode_teleport(data) -> tuple[int, int, int] | None:
+    if not isinstance(data, (bytes, bytearray)) or len(data) != TELEPORT.size:
+        return None
+    return TELEPORT.unpack(data)
+
+
+def fits(x: int, y: int) -> bool:
+    """Whether a position is representable in the binary format."""
+    return _COORD_MIN <= x <= _COORD_MAX and _COORD_MIN <= y <= _COORD_MAX
+
+
+def encode_positions(players: Iterable[Player]) -> bytes:
+    """Pack positions for playersMovedBin.
+
+    Moves are validated against the int16 range (models.game.Coord), so only a map
+    whose spawnpoint lies outside it can put a player here that does not fit; such
+    players are left out rather than failing the whole batch.
+    """
+    players = [p for p in players if fits(p.x, p.y)]
+    buf = bytearray(POSITION.size * len(players))
+    pack_into = POSITION.pack_into
+    offset = 0
+    for p in players:
+        pack_into(buf, offset, p.index, p.x, p.y)
+        offset += POSITION.size
+    return bytes(buf)
+
+
+def positions_json(players: Iterable[Player]) -> list[dict]:
+    return [{"uid": p.uid, "x": p.x, "y": p.y} for p in players]
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from app.cluster import cluster
+from app.services import realms as realm_store
+from app.session import session_manager
+from app.sockets.helpers import RESTART_MESSAGE, close_realm, drain, emit_proximity_changes, kick_player
+from app.sockets.outbound import outbound
+
+# Cross-worker entry points for the REST routes and the join flow. With clustering
+# disabled every call resolves locally, exactly as before.
+
+
+async def _rpc_players_in_room(payload: dict[str, Any]) -> list[dict] | None:
+    session = session_manager.get_player_session(payload["uid"])
+    if not session:
+        return None
+    return [p.to_dict() for p in session.get_players_in_room(payload["roomIndex"])]
+
+
+async def _rpc_player_counts(payload: dict[str, Any]) -> list[list[int]]:
+    return [
+        [shard.get_player_count() for shard in session_manager.get_realm_shards(realm_id)]
+        for realm_id in payload["realmIds"]
+    ]
+
+
+async def _rpc_terminate(payload: dict[str, Any]) -> int:
+    return await close_realm(payload["realmId"], payload["reason"])
+
+
+async def _rpc_drain(payload: dict[str, Any]) -> int:
+    return await drain(payload["reason"], payload["timeout"])
+
+
+async def _rpc_kick(payload: dict[str, Any]) -> bool:
+    await kick_player(payload["uid"], payload["reason"])
+    return True
+
+
+async def _rpc_invalidate(payload: dict[str, Any]) -> bool:
+    if payload.get("realmId"):
+        realm_store.invalidate_realm(payload["realmId"])
+    if payload.get("uid"):
+        realm_store.invalidate_skin(payload["uid"])
+    return True
+
+
+async def _rpc_patch_room(payload: dict[str, Any]) -> bool:
+    realm_id = payload["realmId"]
+    room_index = payload["roomIndex"]
+    tiles = payload["tiles"]
+    if not session_manager.patch_room_tiles(realm_id, room_index, tiles):
+        return False
+    await outbound.emit("mapPatched", {"roomIndex": room_index, "tiles": tiles}, room=realm_id)
+    await asyncio.gather(*(emit_proximity_changes(shard) for shard in session_manager.get_realm_shards(realm_id)))
+    return True
+
+
+async def _release_moved_realms() -> None:
+    """Close the realms this worker lost in a membership change, so their players rejoin on the new owner.
+
+    Events of those players are already forwarded to the new owner, which has no
+    session for them; sessions are not handed over.
+    """
+    moved = [realm_id for realm_id in session_manager.get_realm_ids() if not cluster.is_local(realm_id)]
+    if moved:
+        await asyncio.gather(*(close_realm(realm_id, RESTART_MESSAGE) for realm_id in moved))
+
+
+def register_rpc() -> None:
+    cluster.on("playersInRoom", _rpc_players_in_room)
+    cluster.on("playerCounts", _rpc_player_counts)
+    cluster.on("terminate", _rpc_terminate)
+    cluster.on("kick", _rpc_kick)
+    cluster.on("invalidate", _rpc_invalidate)
+    cluster.on("patchRoom", _rpc_patch_room)
+    cluster.on("drain", _rpc_drain)
+    cluster.on_membership_change(_release_moved_realms)
+
+
+async def players_in_room(uid: str, room_index: int) -> list[dict] | None:
+    """Players in uid's game-room, or None when uid is not in a realm on any worker."""
+    payload = {"uid": uid, "roomIndex": room_index}
+    if not cluster.enabled:
+        return await _rpc_players_in_room(payload)
+    for players in await cluster.call_all("playersInRoom", payload):
+        if players is not None:
+            return players
+    return None
+
+
+async def shard_counts(realm_ids: list[str]) -> list[list[int]]:
+    """Per-shard player counts for each realm, asking each realm's owner."""
+    if not cluster.enabled:
+        return await _rpc_player_counts({"realmIds": realm_ids})
+
+    by_owner: dict[str, list[int]] = {}
+    for i, realm_id in enumerate(realm_ids):
+        by_owner.setdefault(cluster.owner_of(realm_id), []).append(i)
+
+    owners = list(by_owner)
+    results = await asyncio.gather(
+        *(cluster.call(owner, "playerCounts", {"realmIds": [realm_ids[i] for i in by_owner[owner]]}) for owner in owners),
+        return_exceptions=True,
+    )
+    counts: list[list[int]] = [[] for _ in realm_ids]
+    for owner, result in zip(owners, results):
+        if isinstance(result, BaseException):
+            continue  # Owner unreachable: report its realms as empty
+        for i, shard_list in zip(by_owner[owner], result):
+            counts[i] = shard_list
+    return counts
+
+
+async def terminate_realm(realm_id: str, reason: str) -> int:
+    """Kick everyone out of a realm on the worker that owns it. Returns once the kick is sent, with the number of players removed."""
+    return await cluster.call(cluster.owner_of(realm_id), "terminate", {"realmId": realm_id, "reason": reason})
+
+
+async def drain_all(reason: str, timeout: float) -> int:
+    """Drain every worker for a deploy (see helpers.drain). Returns the number of players removed."""
+    payload = {"reason": reason, "timeout": timeout}
+    if not cluster.enabled:
+        return await _rpc_drain(payload)
+    # The RPC itself may take the whole drain timeout
+    return sum(await cluster.call_all("drain", payload, timeout + 5.0))
+
+
+async def patch_room_live(realm_id: str, room_index: int, tiles: dict[str, Any]) -> None:
+    """Apply saved tile changes to the live realm, if any, and push them to its players."""
+    await cluster.call(
+        cluster.owner_of(realm_id), "patchRoom", {"realmId": realm_id, "roomIndex": room_index, "tiles": tiles}
+    )
+
+
+async def kick_elsewhere(uid: str, reason: str) -> None:
+    """Kick uid from any realm it is playing in on another worker."""
+    if not cluster.enabled:
+        return
+    others = [worker for worker in cluster.ring.workers if worker != cluster.worker_id]
+    await asyncio.gather(
+        *(cluster.call(worker, "kick", {"uid": uid, "reason": reason}) for worker in others),
+        return_exceptions=True,
+    )
+
+
+async def invalidate_cached(realm_id: str | None = None, uid: str | None = None) -> None:
+    """Drop a realm row and/or a skin from the join-path cache of every worker."""
+    payload = {"realmId": realm_id, "uid": uid}
+    if not cluster.enabled:
+        await _rpc_invalidate(payload)
+        return
+    await cluster.call_all("invalidate", payload)
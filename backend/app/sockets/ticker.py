@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.config import settings
+from app.session import Player, session_manager
+from app.sockets.outbound import outbound
+
+
+class MovementTicker:
+    """Collect the latest position of every moving player and broadcast one batch per game-room per tick."""
+
+    def __init__(self, tick_rate: int) -> None:
+        self._interval = 1 / max(1, tick_rate)
+        # (realmId, roomIndex) -> uids that moved this tick
+        self._pending: dict[tuple[str, int], set[str]] = {}
+        # (realmId, roomIndex) -> uid -> position before its first cell crossing this tick (AOI mode only)
+        self._entered: dict[tuple[str, int], dict[str, tuple[int, int]]] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def queue_move(
+        self, realm_id: str, room_index: int, uid: str, moved_from: tuple[int, int] | None = None
+    ) -> None:
+        """Mark a player as moved. The tick sends its position as of the flush, so the latest move wins.
+
+        moved_from is the position before a move into another grid cell. In AOI mode
+        the mover's view changed: it is sent the positions of everyone now in view,
+        and it and the players it no longer sees are told to drop each other.
+        """
+        key = (realm_id, room_index)
+        moves = self._pending.get(key)
+        if moves is None:
+            moves = self._pending[key] = set()
+        moves.add(uid)
+        if moved_from is not None and settings.AOI_ENABLED:
+            self._entered.setdefault(key, {}).setdefault(uid, moved_from)
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+
+        pending = self._pending
+        entered = self._entered
+        self._pending = {}
+        self._entered = {}
+
+        emits = []
+        for (realm_id, room_index), moves in pending.items():
+            session = session_manager.get_session(realm_id)
+            if not session:
+                continue
+
+            batch = []
+            for uid in moves:
+                player = session.players.get(uid)
+                # Drop moves of players that left the room before the tick fired
+                if player is None or player.room != room_index:
+                    continue
+                batch.append(player)
+            if not batch:
+                continue
+
+            if not settings.AOI_ENABLED:
+                emits.extend(self._emit_batch(session, room_index, batch))
+                continue
+
+            room_entered = entered.get((realm_id, room_index), {})
+            for viewer, in_view in self._split_by_view(session, room_index, batch, room_entered).values():
+                if not in_view:
+                    continue
+                emits.append(outbound.emit_positions(list(in_view.values()), viewer.binary, to=viewer.socket_id))
+            for sid, uids in self._left_view(session, room_index, room_entered).items():
+                emits.append(outbound.emit("playersLeftView", list(uids), to=sid))
+
+        if emits:
+            await asyncio.gather(*emits)
+
+    @staticmethod
+    def _emit_batch(session, room_index: int, batch: list[Player]) -> list:
+        """One broadcast per wire format actually in use in the room, leaving out the movers.
+
+        A mover already knows where it is: it only gets the other moves of the batch.
+        """
+        movers = [player.socket_id for player in batch]
+        emits = []
+        for binary in (False, True):
+            if session.has_stream_members(room_index, binary):
+                room = session.stream_room_name(room_index, binary)
+                emits.append(outbound.emit_positions(batch, binary, room=room, skip_sid=movers))
+        if len(batch) > 1:
+            for mover in batch:
+                others = [player for player in batch if player is not mover]
+                emits.append(outbound.emit_positions(others, mover.binary, to=mover.socket_id))
+        return emits
+
+    @staticmethod
+    def _split_by_view(
+        session, room_index: int, batch: list[Player], entered
+    ) -> dict[str, tuple[Player, dict[str, Player]]]:
+        """Group a room's batch per recipient, keeping only moves inside each recipient's view.
+
+        Each recipient gets a player once, whether it moved, came into view, or both,
+        and never its own position.
+        """
+        per_socket: dict[str, tuple[Player, dict[str, Player]]] = {}
+        for mover in batch:
+            for viewer in session.get_players_in_view(room_index, mover.x, mover.y):
+                if viewer.uid == mover.uid:
+                    continue
+                entry = per_socket.get(viewer.socket_id)
+                if entry is None:
+                    entry = per_socket[viewer.socket_id] = (viewer, {})
+                entry[1][mover.uid] = mover
+
+        # Players that crossed into a new cell get everyone now in view, including idle players
+        for uid in entered:
+            player = session.players.get(uid)
+            if player is None or player.room != room_index:
+                continue
+            entry = per_socket.get(player.socket_id)
+            if entry is None:
+                entry = per_socket[player.socket_id] = (player, {})
+            for other in session.get_players_in_view(room_index, player.x, player.y):
+                if other.uid != uid:
+                    entry[1][other.uid] = other
+
+        return per_socket
+
+    @staticmethod
+    def _left_view(session, room_index: int, entered: dict[str, tuple[int, int]]) -> dict[str, set[str]]:
+        """socket id -> uids it saw before this tick's cell crossings and no longer sees.
+
+        Visibility is symmetric: when a pair drifts apart, both sides drop the other.
+        Players that crossed cells this tick are compared at their position before it.
+        """
+        players = session.players
+        left: dict[str, set[str]] = {}
+        for uid, (old_x, old_y) in entered.items():
+            mover = players.get(uid)
+            if mover is None or mover.room != room_index:
+                continue
+            # Everyone that could see the mover before: players around its old cell, or that moved away too
+            before = [
+                (other, other.x, other.y)
+                for other in session.get_players_in_view(room_index, old_x, old_y)
+                if other.uid not in entered
+            ]
+            for other_uid, (other_x, other_y) in entered.items():
+                other = players.get(other_uid)
+                if other is not None and other.room == room_index:
+                    before.append((other, other_x, other_y))
+
+            for other, other_x, other_y in before:
+                if other.uid == uid or not session.in_view(room_index, old_x, old_y, other_x, other_y):
+                    continue
+                if session.in_view(room_index, mover.x, mover.y, other.x, other.y):
+                    continue
+                left.setdefault(other.socket_id, set()).add(uid)
+                left.setdefault(mover.socket_id, set()).add(other.uid)
+        return left
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            started = loop.time()
+            try:
+                await self.flush()
+            except Exception:
+                pass  # A failed broadcast must not stop the tick loop
+            await asyncio.sleep(max(0.0, self._interval - (loop.time() - started)))
+
+
+movement_ticker = MovementTicker(settings.TICK_RATE)
@@ -0,0 +1,104 @@
+"""JSON encode/decode cost of large realm map_data payloads.
+
+Run from the backend directory:
+
+    python -m bench.json_codec [--rooms 20] [--size 100] [--repeat 20]
+
+Compares the stdlib json module (what the asyncpg jsonb codec and JSONResponse
+used before app.codec) with the configured codec on a synthetic map_data of
+--rooms rooms with --size x --size tiles each, and the old per-row UUID scan of
+record_to_dict with the codec-level uuid -> str decoding. Set JSON_CODEC=json
+to measure the stdlib fallback of app.codec itself.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import uuid
+from typing import Any, Callable
+
+from app import codec
+
+FLOORS = ["grass", "stone", "wood", "carpet_red", "tile_white"]
+OBJECTS = ["plant", "desk", "chair", "computer", "lamp", "bookshelf"]
+
+
+def _map_data(rooms: int, size: int, rng: random.Random) -> dict:
+    data_rooms = []
+    for r in range(rooms):
+        tilemap: dict[str, dict] = {}
+        for x in range(size):
+            for y in range(size):
+                tile: dict[str, Any] = {"floor": rng.choice(FLOORS)}
+                roll = rng.random()
+                if roll < 0.15:
+                    tile["object"] = rng.choice(OBJECTS)
+                    tile["impassable"] = True
+                elif roll < 0.2:
+                    tile["privateAreaId"] = f"area-{r}-{x // 10}-{y // 10}"
+                elif roll < 0.201:
+                    tile["teleporter"] = {"roomIndex": rng.randrange(rooms), "x": rng.randrange(size), "y": rng.randrange(size)}
+                tilemap[f"{x}, {y}"] = tile
+        data_rooms.append({"name": f"Room {r}", "tilemap": tilemap})
+    return {"spawnpoint": {"roomIndex": 0, "x": 0, "y": 0}, "rooms": data_rooms}
+
+
+def _best(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _record_to_dict_scan(row: dict) -> dict:
+    # record_to_dict before UUIDs were decoded by the connection codec
+    d = dict(row)
+    for k, v in d.items():
+        if hasattr(v, "hex") and hasattr(v, "int"):
+            d[k] = str(v)
+    return d
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=100_000, help="rows for the record_to_dict comparison")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    map_data = _map_data(args.rooms, args.size, random.Random(args.seed))
+    text = json.dumps(map_data)
+    raw = text.encode()
+    print(f"codec: {codec.name}, payload: {len(raw) / 1e6:.1f} MB ({args.rooms} rooms of {args.size}x{args.size})")
+
+    cases = [
+        # (operation, before, after)
+        ("jsonb encode (str)", lambda: json.dumps(map_data), lambda: codec.dumps(map_data)),
+        ("jsonb decode (str)", lambda: json.loads(text), lambda: codec.loads(text)),
+        (
+            "response body (bytes)",
+            lambda: json.dumps(map_data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode(),
+            lambda: codec.dumps_bytes(map_data),
+        ),
+    ]
+    print(f"{'operation':<24} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for label, before, after in cases:
+        b = _best(before, args.repeat) * 1000
+        a = _best(after, args.repeat) * 1000
+        print(f"{label:<24} {b:>10.2f} {a:>10.2f} {b / a:>7.1f}x")
+
+    rows_uuid = [{"id": uuid.uuid4(), "owner_id": uuid.uuid4(), "name": "Realm", "share_id": uuid.uuid4()} for _ in range(args.rows)]
+    rows_str = [{k: str(v) if isinstance(v, uuid.UUID) else v for k, v in row.items()} for row in rows_uuid]
+    b = _best(lambda: [_record_to_dict_scan(r) for r in rows_uuid], 3) * 1000
+    a = _best(lambda: [dict(r) for r in rows_str], 3) * 1000
+    print(f"{'record_to_dict x' + str(args.rows):<24} {b:>10.2f} {a:>10.2f} {b / a:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Per-event overhead of the movePlayer handler, before and after connection contexts.
+
+Run from the backend directory:
+
+    python -m bench.move_handler [--players 100] [--ops 200000] [--repeat 5]
+
+Registers the real handlers on the app's Socket.IO server, connects --players
+sockets without a network (an engine.io socket object per sid) and puts them in
+one realm. It then times, per event:
+
+  lookup   resolving sid -> Session and Player: await sio.get_session(sid),
+           session_manager.get_player_session(uid) and session.get_player(uid)
+           (before) against one ConnectionRegistry lookup (after)
+  handler  a whole movePlayer event: the registered handler (after) against
+           the previous implementation, reproduced below with the same
+           routing and metrics wrappers (before)
+
+Moves are queued for the ticker but never broadcast, so the numbers are the
+handler's own CPU cost.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import random
+import time
+
+from engineio.async_socket import AsyncSocket
+
+from app import metrics
+from app.config import settings
+from app.models.game import MovePlayerData
+
+REALM = "bench"
+ROOM_SIZE = 100
+
+
+def _map_data() -> dict:
+    tilemap = {f"{x}, {y}": {"floor": "grass"} for x in range(ROOM_SIZE) for y in range(ROOM_SIZE)}
+    return {"spawnpoint": {"roomIndex": 0, "x": 0, "y": 0}, "rooms": [{"name": "bench", "tilemap": tilemap}]}
+
+
+async def _best(run, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter_ns()
+        ops = await run()
+        best = min(best, (time.perf_counter_ns() - started) / ops)
+    return best
+
+
+async def run(players: int, ops: int, repeat: int, seed: int) -> dict[str, float]:
+    # Imported here so --proximity applies before the app builds anything
+    from app.main import sio
+    from app.session import session_manager
+    from app.sockets.context import connections
+    from app.sockets.helpers import emit_proximity_changes
+    from app.sockets.outbound import outbound
+    from app.sockets.ticker import movement_ticker
+
+    rng = random.Random(seed)
+    session_manager.create_session(REALM, _map_data())
+    sids = []
+    for i in range(players):
+        eio_sid = f"eio-{i}"
+        sio.eio.sockets[eio_sid] = AsyncSocket(sio.eio, eio_sid)
+        sid = await sio.manager.connect(eio_sid, "/")
+        uid = f"user-{i}"
+        await sio.save_session(sid, {"uid": uid, "username": uid, "binary": False})
+        outbound.register(sid, False)
+        connections.open(sid, uid)
+        session_manager.add_player_to_session(sid, REALM, uid, uid, "009")
+        session = session_manager.get_player_session(uid)
+        connections.bind(sid, uid, session, session.get_player(uid))
+        sids.append(sid)
+
+    events = [(rng.choice(sids), {"x": rng.randrange(ROOM_SIZE), "y": rng.randrange(ROOM_SIZE)}) for _ in range(ops)]
+
+    async def lookup_before() -> int:
+        for sid, _ in events:
+            session_data = await sio.get_session(sid)
+            uid = session_data.get("uid") if session_data else None
+            session = session_manager.get_player_session(uid)
+            session.get_player(uid)
+        return ops
+
+    async def lookup_after() -> int:
+        get_context = connections.get
+        for sid, _ in events:
+            context = get_context(sid)
+            context.session, context.player
+        return ops
+
+    # movePlayer as it was before connection contexts
+    async def legacy_move_player(sid, data):
+        try:
+            move_data = MovePlayerData(**data) if isinstance(data, dict) else None
+        except Exception:
+            return
+        if not move_data:
+            return
+        x, y = move_data.x, move_data.y
+
+        session_data = await sio.get_session(sid)
+        uid = session_data.get("uid") if session_data else None
+        if not uid:
+            return
+
+        session = session_manager.get_player_session(uid)
+        if not session:
+            return
+
+        if not session.can_move_to(uid, x, y):
+            return
+
+        player = session.get_player(uid)
+        old_x, old_y = player.x, player.y
+        entered_cell = session.move_player(player.uid, x, y)
+        movement_ticker.queue_move(session.id, player.room, player.uid, (old_x, old_y) if entered_cell else None)
+        await emit_proximity_changes(session)
+
+    legacy_timed = metrics.timed("bench", legacy_move_player)
+
+    async def legacy_routed(sid, data):
+        # Same shape as handlers._routed with clustering off
+        await legacy_timed(sid, data)
+
+    current = sio.handlers["/"]["movePlayer"]
+
+    async def handler(fn) -> int:
+        for sid, data in events:
+            await fn(sid, data)
+        return ops
+
+    results = {
+        "lookup_before": await _best(lookup_before, repeat),
+        "lookup_after": await _best(lookup_after, repeat),
+        "handler_before": await _best(lambda: handler(legacy_routed), repeat),
+        "handler_after": await _best(lambda: handler(current), repeat),
+    }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--proximity", action="store_true", help="keep the proximity engine on")
+    args = parser.parse_args()
+
+    settings.PROXIMITY_ENABLED = args.proximity
+    results = asyncio.run(run(args.players, args.ops, args.repeat, args.seed))
+
+    print(f"{'ns/event':<10} {'before':>10} {'after':>10} {'saved':>10}")
+    for name in ("lookup", "handler"):
+        before, after = results[f"{name}_before"], results[f"{name}_after"]
+        print(f"{name:<10} {before:>10.0f} {after:>10.0f} {before - after:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Memory and throughput of the per-session player store.
+
+Run from the backend directory:
+
+    python -m bench.player_store [--sizes 1000,10000,100000] [--moves 200000] [--proximity]
+
+Reports bytes per player (tracemalloc: everything Session allocates for a player,
+i.e. the record plus its room, grid and slot index entries; the uid and username
+strings are shared with the caller) and move_player calls per second for random
+walks over a 1000x1000 tile room.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from app.config import settings
+from app.session import Session
+
+ROOM_SIZE = 1000
+
+
+def _map_data() -> dict:
+    # An empty tilemap accepts any position, so the benchmark measures only the store
+    return {"spawnpoint": {"roomIndex": 0, "x": 0, "y": 0}, "rooms": [{"name": "bench", "tilemap": {}}]}
+
+
+def measure(count: int, moves: int, rng: random.Random) -> dict[str, float]:
+    uids = [f"user-{i:08d}" for i in range(count)]
+    usernames = [f"Player {i}" for i in range(count)]
+    socket_ids = [f"sid-{i:016x}" for i in range(count)]
+
+    gc.collect()
+    tracemalloc.start()
+    session = Session("bench", _map_data())
+    before = tracemalloc.get_traced_memory()[0]
+    for uid, username, socket_id in zip(uids, usernames, socket_ids):
+        session.add_player(socket_id, uid, username, "009")
+        session.move_player(uid, rng.randrange(ROOM_SIZE), rng.randrange(ROOM_SIZE))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    steps = [(rng.choice(uids), rng.randrange(ROOM_SIZE), rng.randrange(ROOM_SIZE)) for _ in range(moves)]
+    move_player = session.move_player
+    started = time.perf_counter()
+    for uid, x, y in steps:
+        move_player(uid, x, y)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "players": count,
+        "bytes_per_player": (after - before) / count,
+        "moves_per_second": moves / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--moves", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--proximity",
+        action="store_true",
+        help="keep the proximity engine on (off by default: everyone spawns on one tile)",
+    )
+    args = parser.parse_args()
+
+    settings.PROXIMITY_ENABLED = args.proximity
+    rng = random.Random(args.seed)
+
+    print(f"{'players':>10} {'bytes/player':>14} {'moves/s':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = measure(size, args.moves, rng)
+        print(f"{result['players']:>10} {result['bytes_per_player']:>14.0f} {result['moves_per_second']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Per-operation cost of Session and SessionManager, for comparing commits.
+
+Run from the backend directory:
+
+    python -m bench.session_ops [--sizes 50,500,5000,50000] [--ops 100000] [--output results.json] [--baseline old.json]
+
+For every realm size (players in one session) it times the operations the
+socket handlers run on each event: add_player, move_player, change_room,
+get_players_in_room, remove_player, get_socket_ids_in_room,
+log_out_by_socket_id, terminate_session and Player.to_dict. It also times two
+workloads that replay a recorded sequence of operations:
+
+  mixed   mostly moves, with room changes, room reads, serialization and
+          rejoins, spread evenly over the players and rooms
+  skewed  the same mix, but a few players make most of the calls (Zipf) and
+          most players sit in one crowded room
+
+Each result is the best of --repeat runs in nanoseconds per operation.
+--output writes the results with the commit and settings used. --baseline
+compares against an earlier file and prints the change per operation.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import itertools
+import json
+import platform
+import random
+import subprocess
+import time
+from typing import Callable
+
+from app.config import settings
+from app.session import Session, SessionManager
+
+ROOM_SIZE = 100
+ROOMS = 4
+
+
+def _map_data() -> dict:
+    tilemap = {f"{x}, {y}": {"floor": "grass"} for x in range(ROOM_SIZE) for y in range(ROOM_SIZE)}
+    return {
+        "spawnpoint": {"roomIndex": 0, "x": ROOM_SIZE // 2, "y": ROOM_SIZE // 2},
+        "rooms": [{"name": f"Room {r}", "tilemap": tilemap} for r in range(ROOMS)],
+    }
+
+
+def _players(count: int) -> list[tuple[str, str, str]]:
+    return [(f"sid-{i:016x}", f"user-{i:08d}", f"Player {i}") for i in range(count)]
+
+
+def _manager(map_data: dict, players: list[tuple[str, str, str]], rng: random.Random, hot_room: bool = False) -> SessionManager:
+    """A manager with one realm holding players spread over the rooms (or mostly in room 0)."""
+    manager = SessionManager()
+    manager.create_session("realm", map_data)
+    session = manager.get_session("realm")
+    for socket_id, uid, username in players:
+        manager.add_player_to_session(socket_id, "realm", uid, username, "009")
+        room = 0 if hot_room and rng.random() < 0.8 else rng.randrange(ROOMS)
+        session.change_room(uid, room, rng.randrange(ROOM_SIZE), rng.randrange(ROOM_SIZE))
+    return manager
+
+
+def _time(run: Callable[[], int], repeat: int, setup: Callable[[], None] | None = None) -> float:
+    """Best nanoseconds per operation; run() does the work and returns how many operations it did."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter_ns()
+            ops = run()
+            elapsed = time.perf_counter_ns() - started
+        finally:
+            gc.enable()
+        best = min(best, elapsed / max(1, ops))
+    return best
+
+
+def bench_size(count: int, ops: int, repeat: int, map_data: dict, seed: int) -> dict[str, float]:
+    rng = random.Random(seed)
+    players = _players(count)
+    uids = [uid for _, uid, _ in players]
+    results: dict[str, float] = {}
+
+    # add_player / log_out_by_socket_id / remove_player work on a fresh session each run
+    state: dict = {}
+
+    def fresh_manager() -> None:
+        state["manager"] = SessionManager()
+        state["manager"].create_session("realm", map_data)
+
+    def add_players() -> int:
+        add = state["manager"].add_player_to_session
+        for socket_id, uid, username in players:
+            add(socket_id, "realm", uid, username, "009")
+        return count
+
+    results["add_player"] = _time(add_players, repeat, fresh_manager)
+
+    def filled_manager() -> None:
+        state["manager"] = _manager(map_data, players, random.Random(seed))
+
+    def log_out_all() -> int:
+        log_out = state["manager"].log_out_by_socket_id
+        for socket_id, _, _ in players:
+            log_out(socket_id)
+        return count
+
+    results["log_out_by_socket_id"] = _time(log_out_all, repeat, filled_manager)
+
+    def remove_all() -> int:
+        remove = state["manager"].get_session("realm").remove_player
+        for uid in uids:
+            remove(uid)
+        return count
+
+    results["remove_player"] = _time(remove_all, repeat, filled_manager)
+
+    def terminate() -> int:
+        state["manager"].terminate_session("realm")
+        return 1
+
+    results["terminate_session"] = _time(terminate, repeat, filled_manager)
+
+    # Read and move operations share one populated session
+    manager = _manager(map_data, players, rng)
+    session: Session = manager.get_session("realm")
+
+    steps = [(rng.choice(uids), rng.randrange(ROOM_SIZE), rng.randrange(ROOM_SIZE)) for _ in range(ops)]
+
+    def move() -> int:
+        move_player = session.move_player
+        for uid, x, y in steps:
+            move_player(uid, x, y)
+        return ops
+
+    results["move_player"] = _time(move, repeat)
+
+    room_steps = [(rng.choice(uids), rng.randrange(ROOMS), rng.randrange(ROOM_SIZE), rng.randrange(ROOM_SIZE)) for _ in range(ops)]
+
+    def change_room() -> int:
+        change = session.change_room
+        for uid, room, x, y in room_steps:
+            change(uid, room, x, y)
+        return ops
+
+    results["change_room"] = _time(change_room, repeat)
+
+    # Reads scale with the room population, so fewer calls at large sizes
+    reads = max(100, min(ops, ops * 100 // count))
+    rooms = [rng.randrange(ROOMS) for _ in range(reads)]
+
+    def players_in_room() -> int:
+        get = session.get_players_in_room
+        for room in rooms:
+            get(room)
+        return reads
+
+    results["get_players_in_room"] = _time(players_in_room, repeat)
+
+    def socket_ids_in_room() -> int:
+        get = manager.get_socket_ids_in_room
+        for room in rooms:
+            get("realm", room)
+        return reads
+
+    results["get_socket_ids_in_room"] = _time(socket_ids_in_room, repeat)
+
+    targets = [session.get_player(uid) for uid in (rng.choice(uids) for _ in range(ops))]
+
+    def to_dict() -> int:
+        for player in targets:
+            player.to_dict()
+        return ops
+
+    results["Player.to_dict"] = _time(to_dict, repeat)
+
+    results["workload_mixed"] = _workload(map_data, players, ops, repeat, seed, skewed=False)
+    results["workload_skewed"] = _workload(map_data, players, ops, repeat, seed, skewed=True)
+    return results
+
+
+# Share of each operation in the workloads
+_MIX = (("move", 80), ("change_room", 6), ("room_read", 5), ("to_dict", 5), ("rejoin", 4))
+
+
+def _workload(map_data: dict, players: list[tuple[str, str, str]], ops: int, repeat: int, seed: int, skewed: bool) -> float:
+    rng = random.Random(seed)
+    count = len(players)
+    if skewed:
+        # Zipf(1.1) over the players: a handful generate most of the traffic
+        weights = list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(count)))
+        chosen = rng.choices(range(count), cum_weights=weights, k=ops)
+    else:
+        chosen = [rng.randrange(count) for _ in range(ops)]
+    kinds = rng.choices([kind for kind, _ in _MIX], weights=[weight for _, weight in _MIX], k=ops)
+    script = [
+        (kind, players[i], rng.randrange(ROOMS), rng.randrange(ROOM_SIZE), rng.randrange(ROOM_SIZE))
+        for kind, i in zip(kinds, chosen)
+    ]
+    state: dict = {}
+
+    def setup() -> None:
+        state["manager"] = _manager(map_data, players, random.Random(seed), hot_room=skewed)
+
+    def run() -> int:
+        manager: SessionManager = state["manager"]
+        session = manager.get_session("realm")
+        for kind, (socket_id, uid, username), room, x, y in script:
+            if kind == "move":
+                session.move_player(uid, x, y)
+            elif kind == "change_room":
+                session.change_room(uid, room, x, y)
+            elif kind == "room_read":
+                manager.get_socket_ids_in_room("realm", session.get_player_room(uid))
+            elif kind == "to_dict":
+                session.get_player(uid).to_dict()
+            else:
+                manager.log_out_by_socket_id(socket_id)
+                manager.add_player_to_session(socket_id, "realm", uid, username, "009")
+        return ops
+
+    return _time(run, repeat, setup)
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,500,5000,50000")
+    parser.add_argument("--ops", type=int, default=100_000, help="operations per timed run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--proximity",
+        action="store_true",
+        help="keep the proximity engine on (off by default: every player joins on the spawn tile)",
+    )
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    settings.PROXIMITY_ENABLED = args.proximity
+    map_data = _map_data()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    results: dict[str, dict[str, float]] = {}
+    for size in sizes:
+        results[str(size)] = bench_size(size, args.ops, args.repeat, map_data, args.seed)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    header = f"{'operation':<24}" + "".join(f"{size:>14}" for size in sizes)
+    print("ns/op" + (" (change vs baseline)" if baseline else ""))
+    print(header)
+    for operation in results[str(sizes[0])]:
+        row = f"{operation:<24}"
+        for size in sizes:
+            value = results[str(size)][operation]
+            cell = f"{value:.0f}"
+            old = (baseline or {}).get(str(size), {}).get(operation)
+            if old:
+                cell += f" {(value - old) / old * 100:+.0f}%"
+            row += f"{cell:>14}"
+        print(row)
+
+    if args.output:
+        report = {
+            "commit": _commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "config": {
+                "ops": args.ops,
+                "repeat": args.repeat,
+                "seed": args.seed,
+                "rooms": ROOMS,
+                "room_size": ROOM_SIZE,
+                "proximity": args.proximity,
+                "aoi_cell_size": settings.AOI_CELL_SIZE,
+            },
+            "unit": "ns/op",
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""Bot swarm: end-to-end latency and throughput of the Socket.IO server under load.
+
+Run from the backend directory:
+
+    python -m bench.swarm --spawn memory [--bots 500] [--realms 10] [--duration 30] [--json out.json]
+    python -m bench.swarm --url http://127.0.0.1:3001 --server-pid <pid> [...]
+
+Spawns --bots Socket.IO clients spread over --realms swarm realms (see
+bench.swarm_server) and random-walks them with movePlayer, teleport and
+sendMessage at the given per-bot rates. Every realm lives in one load process,
+so a broadcast's latency is measured from the sender's emit to each receiver's
+event on one clock. Use --procs to drive more bots than one process can.
+
+--spawn memory|postgres starts bench.swarm_server itself (add --seed-db for
+postgres to create the realms first); otherwise point --url at a running server
+and pass --server-pid to get its CPU use. Reports p50/p95/p99 latency of move,
+teleport and chat broadcasts, server CPU (the process and its children, from
+/proc) and messages per second, both received by the bots and sent by the server
+(from /metrics when it is enabled).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import socketio
+
+from app.sockets.protocol import MOVE, POSITION, TELEPORT
+from bench.swarm_server import realm_id, share_id, teleport_target
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+class Reservoir:
+    """Uniform sample of at most capacity values."""
+
+    def __init__(self, capacity: int, rng: random.Random) -> None:
+        self.capacity = capacity
+        self.values: list[float] = []
+        self.seen = 0
+        self._rng = rng
+
+    def add(self, value: float) -> None:
+        self.seen += 1
+        if len(self.values) < self.capacity:
+            self.values.append(value)
+            return
+        slot = self._rng.randrange(self.seen)
+        if slot < self.capacity:
+            self.values[slot] = value
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return {
+        "p50": ordered[round(0.50 * last)] * 1000,
+        "p95": ordered[round(0.95 * last)] * 1000,
+        "p99": ordered[round(0.99 * last)] * 1000,
+        "max": ordered[last] * 1000,
+    }
+
+
+class Swarm:
+    """The bots of one load process and the send times their broadcasts are matched against."""
+
+    def __init__(self, args: argparse.Namespace, proc: int) -> None:
+        self.args = args
+        self.rng = random.Random(args.seed * 1000 + proc)
+        self.recording = False
+        # (uid, x, y) / chat text -> perf_counter() at emit
+        self.sent_moves: dict[tuple[str, int, int], float] = {}
+        self.sent_chat: dict[str, float] = {}
+        # (shardId, player index) -> uid, for the binary protocol
+        self.indexes: dict[tuple[str, int], str] = {}
+        self.latency = {kind: Reservoir(args.samples, self.rng) for kind in ("move", "teleport", "chat")}
+        self.emitted = 0
+        self.received = 0
+        self.joined = 0
+        self.errors: dict[str, int] = {}
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def record(self, kind: str, sent: float | None, now: float) -> None:
+        if sent is not None and self.recording:
+            self.latency[kind].add(now - sent)
+
+
+class Bot:
+    def __init__(self, swarm: Swarm, number: int, realm: str) -> None:
+        self.swarm = swarm
+        self.uid = f"swarm-bot-{number}"
+        self.realm = realm
+        self.shard: str | None = None
+        self.room = 0
+        size = swarm.args.map_size
+        self.x = self.y = size // 2
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.joined = asyncio.Event()
+        self.chat_seq = 0
+        self._register()
+
+    def _register(self) -> None:
+        swarm = self.swarm
+        on = self.client.on
+
+        @on("joinedRealm")
+        def joined(data):
+            self.shard = data["shardId"]
+            swarm.indexes[(self.shard, data["index"])] = self.uid
+            swarm.joined += 1
+            self.joined.set()
+
+        @on("failedToJoinRoom")
+        def failed(reason):
+            swarm.error(f"join: {reason}")
+            self.joined.set()
+
+        @on("playerJoinedRoom")
+        def player_joined(player):
+            # Also how a teleport into another room reaches that room
+            swarm.received += 1
+            swarm.record("teleport", swarm.sent_moves.get((player["uid"], player["x"], player["y"])), time.perf_counter())
+            if self.shard is not None:
+                swarm.indexes[(self.shard, player["index"])] = player["uid"]
+
+        @on("playersMoved")
+        def players_moved(moves):
+            now = time.perf_counter()
+            swarm.received += 1
+            sent = swarm.sent_moves
+            for move in moves:
+                swarm.record("move", sent.get((move["uid"], move["x"], move["y"])), now)
+
+        @on("playersMovedBin")
+        def players_moved_bin(data):
+            now = time.perf_counter()
+            swarm.received += 1
+            for index, x, y in POSITION.iter_unpack(data):
+                uid = swarm.indexes.get((self.shard, index))
+                swarm.record("move", swarm.sent_moves.get((uid, x, y)), now)
+
+        @on("playerTeleported")
+        def player_teleported(move):
+            swarm.received += 1
+            swarm.record("teleport", swarm.sent_moves.get((move["uid"], move["x"], move["y"])), time.perf_counter())
+
+        @on("playerTeleportedBin")
+        def player_teleported_bin(data):
+            now = time.perf_counter()
+            swarm.received += 1
+            for index, x, y in POSITION.iter_unpack(data):
+                uid = swarm.indexes.get((self.shard, index))
+                swarm.record("teleport", swarm.sent_moves.get((uid, x, y)), now)
+
+        @on("receiveMessages")
+        def receive_messages(messages):
+            now = time.perf_counter()
+            swarm.received += 1
+            for message in messages:
+                swarm.record("chat", swarm.sent_chat.get(message["message"]), now)
+
+        @on("*")
+        def other(event, data=None):
+            swarm.received += 1
+
+    async def connect(self, url: str) -> None:
+        query = f"uid={self.uid}&username={self.uid}"
+        if self.swarm.args.binary:
+            query += "&protocol=binary"
+        await self.client.connect(f"{url}?{query}", transports=["websocket"])
+        await self.client.emit("joinRealm", {"realmId": self.realm, "shareId": share_id(self.realm)})
+        await asyncio.wait_for(self.joined.wait(), 30)
+
+    async def _emit(self, event: str, data) -> None:
+        self.swarm.emitted += 1
+        await self.client.emit(event, data)
+
+    async def move(self) -> None:
+        size = self.swarm.args.map_size
+        rng = self.swarm.rng
+        if rng.random() < 0.5:
+            self.x = min(size - 1, max(1, self.x + rng.choice((-1, 1))))
+        else:
+            self.y = min(size - 1, max(1, self.y + rng.choice((-1, 1))))
+        self.swarm.sent_moves[(self.uid, self.x, self.y)] = time.perf_counter()
+        if self.swarm.args.binary:
+            await self._emit("movePlayerBin", MOVE.pack(self.x, self.y))
+        else:
+            await self._emit("movePlayer", {"x": self.x, "y": self.y})
+
+    async def teleport(self) -> None:
+        rooms = self.swarm.args.rooms
+        if rooms < 2:
+            return
+        room = self.swarm.rng.choice([r for r in range(rooms) if r != self.room])
+        x, y = teleport_target(room, self.swarm.args.map_size)
+        self.room, self.x, self.y = room, x, y
+        self.swarm.sent_moves[(self.uid, x, y)] = time.perf_counter()
+        if self.swarm.args.binary:
+            await self._emit("teleportBin", TELEPORT.pack(room, x, y))
+        else:
+            await self._emit("teleport", {"roomIndex": room, "x": x, "y": y})
+
+    async def chat(self) -> None:
+        self.chat_seq += 1
+        text = f"{self.uid} {self.chat_seq}"
+        self.swarm.sent_chat[text] = time.perf_counter()
+        await self._emit("sendMessage", text)
+
+    async def run(self, until: float) -> None:
+        args = self.swarm.args
+        rng = self.swarm.rng
+        interval = 1 / args.move_rate
+        teleport_chance = args.teleport_rate / args.move_rate
+        chat_chance = args.chat_rate / args.move_rate
+        # Desynchronize the bots
+        await asyncio.sleep(rng.random() * interval)
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while loop.time() < until:
+            try:
+                if rng.random() < teleport_chance:
+                    await self.teleport()
+                else:
+                    await self.move()
+                if rng.random() < chat_chance:
+                    await self.chat()
+            except Exception:
+                self.swarm.error("emit")
+                return
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+
+
+def _cpu_seconds(pid: int) -> float:
+    """User plus system CPU time of pid and all its descendants."""
+    total = 0.0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / _CLK_TCK
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def _server_messages(url: str) -> int | None:
+    """socketio_sent_messages_total summed over kinds, or None when /metrics is not available."""
+    try:
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            body = response.read().decode()
+    except Exception:
+        return None
+    return sum(int(float(m)) for m in re.findall(r"^socketio_sent_messages_total\{[^}]*\} (\S+)$", body, re.M))
+
+
+def _bot_realms(args: argparse.Namespace, proc: int) -> list[tuple[int, str]]:
+    """(bot number, realm id) of the bots driven by load process proc; realm r belongs to process r % procs."""
+    return [
+        (number, realm_id(number % args.realms))
+        for number in range(args.bots)
+        if (number % args.realms) % args.procs == proc
+    ]
+
+
+async def _run_process(args: argparse.Namespace, proc: int, barrier, results) -> None:
+    swarm = Swarm(args, proc)
+    bots = [Bot(swarm, number, realm) for number, realm in _bot_realms(args, proc)]
+
+    # Ramp up at --connect-rate joins per second over all processes
+    delay = args.procs / args.connect_rate
+    connects = []
+    for bot in bots:
+        connects.append(asyncio.create_task(bot.connect(args.url)))
+        await asyncio.sleep(delay)
+    for bot, outcome in zip(bots, await asyncio.gather(*connects, return_exceptions=True)):
+        if isinstance(outcome, Exception):
+            swarm.error(f"connect: {type(outcome).__name__}")
+    active = [bot for bot in bots if bot.shard is not None]
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, barrier.wait)
+    started = loop.time()
+    until = started + args.warmup + args.duration
+    runners = [asyncio.create_task(bot.run(until)) for bot in active]
+
+    await asyncio.sleep(args.warmup)
+    swarm.recording = True
+    emitted, received = swarm.emitted, swarm.received
+    cpu = time.process_time()
+    await asyncio.sleep(max(0.0, until - loop.time()))
+    swarm.recording = False
+    result = {
+        "joined": len(active),
+        "emitted": swarm.emitted - emitted,
+        "received": swarm.received - received,
+        "cpu": time.process_time() - cpu,
+        "latency": {kind: reservoir.values for kind, reservoir in swarm.latency.items()},
+        "samples": {kind: reservoir.seen for kind, reservoir in swarm.latency.items()},
+        "errors": swarm.errors,
+    }
+
+    await asyncio.gather(*runners, return_exceptions=True)
+    await asyncio.gather(*(bot.client.disconnect() for bot in bots), return_exceptions=True)
+    results.put(result)
+
+
+def _process_main(args: argparse.Namespace, proc: int, barrier, results) -> None:
+    asyncio.run(_run_process(args, proc, barrier, results))
+
+
+def _spawn_server(args: argparse.Namespace) -> subprocess.Popen:
+    port = int(args.url.rsplit(":", 1)[1])
+    command = [
+        sys.executable, "-m", "bench.swarm_server",
+        "--storage", args.spawn,
+        "--realms", str(args.realms),
+        "--rooms", str(args.rooms),
+        "--map-size", str(args.map_size),
+        "--port", str(port),
+    ]
+    if args.seed_db:
+        command.append("--seed")
+    server = subprocess.Popen(command)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit("swarm server did not start")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:3001")
+    parser.add_argument("--spawn", choices=("memory", "postgres"), help="start bench.swarm_server with this storage")
+    parser.add_argument("--seed-db", action="store_true", help="with --spawn postgres: create the swarm realms first")
+    parser.add_argument("--server-pid", type=int, help="server process to measure CPU of, when not spawned")
+    parser.add_argument("--bots", type=int, default=200)
+    parser.add_argument("--realms", type=int, default=10)
+    parser.add_argument("--rooms", type=int, default=2)
+    parser.add_argument("--map-size", type=int, default=64)
+    parser.add_argument("--procs", type=int, default=1, help="load processes; realms are split between them")
+    parser.add_argument("--binary", action="store_true", help="use the binary movement protocol")
+    parser.add_argument("--move-rate", type=float, default=5.0, help="moves per second per bot")
+    parser.add_argument("--teleport-rate", type=float, default=0.05, help="teleports per second per bot")
+    parser.add_argument("--chat-rate", type=float, default=0.02, help="chat messages per second per bot")
+    parser.add_argument("--connect-rate", type=float, default=100.0, help="joins per second during ramp-up")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--samples", type=int, default=200_000, help="latency samples kept per kind per process")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    args.procs = max(1, min(args.procs, args.realms))
+
+    server = _spawn_server(args) if args.spawn else None
+    server_pid = server.pid if server else args.server_pid
+    try:
+        report = _run(args, server_pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    _print(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def _run(args: argparse.Namespace, server_pid: int | None) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.procs + 1)
+    results = context.Queue()
+    procs = [context.Process(target=_process_main, args=(args, proc, barrier, results)) for proc in range(args.procs)]
+    for proc in procs:
+        proc.start()
+
+    barrier.wait()
+    time.sleep(args.warmup)
+    cpu = _cpu_seconds(server_pid) if server_pid else None
+    sent = _server_messages(args.url)
+    started = time.monotonic()
+    time.sleep(args.duration)
+    elapsed = time.monotonic() - started
+    cpu = _cpu_seconds(server_pid) - cpu if server_pid else None
+    sent_after = _server_messages(args.url)
+
+    parts = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    errors: dict[str, int] = {}
+    for part in parts:
+        for kind, count in part["errors"].items():
+            errors[kind] = errors.get(kind, 0) + count
+    latency = {}
+    for kind in ("move", "teleport", "chat"):
+        values = [value for part in parts for value in part["latency"][kind]]
+        latency[kind] = {**percentiles(values), "samples": sum(part["samples"][kind] for part in parts)}
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "bots": args.bots,
+        "joined": sum(part["joined"] for part in parts),
+        "seconds": elapsed,
+        "latency_ms": latency,
+        "emitted_per_second": sum(part["emitted"] for part in parts) / elapsed,
+        "received_per_second": sum(part["received"] for part in parts) / elapsed,
+        "server_sent_per_second": (sent_after - sent) / elapsed if sent is not None and sent_after is not None else None,
+        "server_cpu_percent": cpu / elapsed * 100 if cpu is not None else None,
+        "load_cpu_percent": sum(part["cpu"] for part in parts) / elapsed * 100,
+        "errors": errors,
+    }
+
+
+def _print(report: dict) -> None:
+    def number(value, spec: str) -> str:
+        if value is None:
+            return format("-", ">" + spec.split(".")[0])
+        return format(value, spec)
+
+    print(f"bots joined: {report['joined']}/{report['bots']} over {report['seconds']:.1f}s")
+    print(f"{'latency ms':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'samples':>10}")
+    for kind, stats in report["latency_ms"].items():
+        print(
+            f"{kind:<12} {number(stats['p50'], '8.2f')} {number(stats['p95'], '8.2f')} "
+            f"{number(stats['p99'], '8.2f')} {number(stats['max'], '8.2f')} {stats['samples']:>10}"
+        )
+    print(f"client emits/s:     {report['emitted_per_second']:.0f}")
+    print(f"client receives/s:  {report['received_per_second']:.0f}")
+    print(f"server sends/s:     {number(report['server_sent_per_second'], '.0f')}")
+    print(f"server CPU %:       {number(report['server_cpu_percent'], '.1f')}")
+    print(f"load CPU %:         {report['load_cpu_percent']:.1f}")
+    if report["errors"]:
+        print(f"errors: {report['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Backend server for bench.swarm, backed by Postgres or an in-memory stand-in.
+
+Run from the backend directory:
+
+    python -m bench.swarm_server [--storage memory|postgres] [--realms 20] [--rooms 2] [--map-size 64]
+
+With --storage memory the server answers the realm and profile reads on the join
+path from memory and drops writes, so it runs without a database. Every realm id
+resolves to a swarm realm, so --realms only matters for --seed. With --storage
+postgres it is the regular server; --seed first writes the swarm realms to
+DATABASE_URL (they are upserted, so reseeding is safe).
+
+bench.swarm starts this module itself with --spawn; it can also be run by hand.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import uuid
+from typing import Any
+
+import uvicorn
+
+from app.config import settings
+
+# Ids of swarm realms are derived from their number, so the swarm and the server agree without a handshake
+_NAMESPACE = uuid.UUID("6d0c0f6e-3c1b-4f77-9a51-6b9a1f2e7c40")
+OWNER_ID = "swarm-owner"
+
+
+def realm_id(number: int) -> str:
+    return str(uuid.uuid5(_NAMESPACE, f"realm-{number}"))
+
+
+def share_id(realm: str) -> str:
+    return str(uuid.uuid5(_NAMESPACE, f"share-{realm}"))
+
+
+def teleport_target(room: int, size: int) -> tuple[int, int]:
+    """Where the teleporters into room lead."""
+    return 1 + room % (size - 2), 1
+
+
+def build_map(rooms: int, size: int) -> dict:
+    """size x size floor rooms. Tile (0, k) of every room teleports to room k."""
+    data_rooms = []
+    for r in range(rooms):
+        tilemap: dict[str, dict[str, Any]] = {f"{x}, {y}": {"floor": "grass"} for x in range(size) for y in range(size)}
+        for k in range(rooms):
+            if k != r:
+                x, y = teleport_target(k, size)
+                tilemap[f"0, {k}"]["teleporter"] = {"roomIndex": k, "x": x, "y": y}
+        data_rooms.append({"name": f"Room {r}", "tilemap": tilemap})
+    return {"spawnpoint": {"roomIndex": 0, "x": size // 2, "y": size // 2}, "rooms": data_rooms}
+
+
+class _Transaction:
+    async def __aenter__(self) -> None:
+        return None
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+
+class MemoryPool:
+    """Stand-in for the asyncpg pool: realm and skin reads from memory, writes dropped."""
+
+    def __init__(self, map_data: dict) -> None:
+        self._map_data = map_data
+        # realm id -> row; any id resolves to a swarm realm
+        self._realms: dict[str, dict[str, Any]] = {}
+        self._shares: dict[str, str] = {}
+
+    def _realm(self, id: str) -> dict[str, Any]:
+        row = self._realms.get(id)
+        if row is None:
+            row = self._realms[id] = {
+                "id": id,
+                "name": "Swarm",
+                "owner_id": OWNER_ID,
+                "map_data": self._map_data,
+                "share_id": share_id(id),
+                "only_owner": False,
+                "version": 1,
+            }
+            self._shares[row["share_id"]] = id
+        return row
+
+    async def fetchrow(self, query: str, *args: Any) -> dict[str, Any] | None:
+        if "FROM realms WHERE share_id" in query:
+            realm = self._shares.get(args[0])
+            return self._realm(realm) if realm else None
+        if "FROM realms WHERE id" in query:
+            return self._realm(args[0])
+        if "FROM profiles" in query:
+            return {"skin": "009"}
+        return None
+
+    async def fetch(self, query: str, *args: Any) -> list:
+        return []
+
+    async def execute(self, query: str, *args: Any) -> str:
+        return "OK"
+
+    async def executemany(self, query: str, args: Any) -> None:
+        return None
+
+    def acquire(self) -> "MemoryPool":
+        return self
+
+    def transaction(self) -> _Transaction:
+        return _Transaction()
+
+    async def __aenter__(self) -> "MemoryPool":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+
+async def seed(realms: int, map_data: dict) -> None:
+    """Upsert the swarm realms into DATABASE_URL."""
+    from app.database import close_pool, create_pool
+
+    pool = await create_pool()
+    try:
+        await pool.executemany(
+            """
+            INSERT INTO realms (id, owner_id, name, map_data, share_id, only_owner)
+            VALUES ($1::uuid, $2, $3, $4::jsonb, $5::uuid, false)
+            ON CONFLICT (id) DO UPDATE SET map_data = EXCLUDED.map_data, share_id = EXCLUDED.share_id, only_owner = false,
+                version = realms.version + 1
+            """,
+            [(realm_id(i), OWNER_ID, f"Swarm {i}", map_data, share_id(realm_id(i))) for i in range(realms)],
+        )
+    finally:
+        await close_pool()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--seed", action="store_true", help="write the swarm realms to DATABASE_URL first")
+    parser.add_argument("--realms", type=int, default=20)
+    parser.add_argument("--rooms", type=int, default=2)
+    parser.add_argument("--map-size", type=int, default=64)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    args = parser.parse_args()
+
+    map_data = build_map(args.rooms, args.map_size)
+    if args.seed:
+        asyncio.run(seed(args.realms, map_data))
+
+    import app.database as database
+    import app.main as server
+
+    if args.storage == "memory":
+        pool = MemoryPool(map_data)
+
+        async def create_pool() -> MemoryPool:
+            database.pool = pool
+            return pool
+
+        # main.py imported create_pool by name, so replace it there as well
+        database.create_pool = create_pool
+        server.create_pool = create_pool
+
+    uvicorn.run(server.combined_app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
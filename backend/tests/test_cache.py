@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from app.services.cache import LRUCache, SingleFlight
+
+
+def test_get_counts_hits_and_misses():
+    cache: LRUCache[str] = LRUCache(100)
+    cache.put("a", "A", 10)
+
+    assert cache.get("a") == "A"
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.peek("a") == "A"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache: LRUCache[str] = LRUCache(30)
+    cache.put("a", "A", 10)
+    cache.put("b", "B", 10)
+    cache.put("c", "C", 10)
+    cache.get("a")
+
+    cache.put("d", "D", 10)
+
+    assert cache.peek("b") is None
+    assert [cache.peek(key) for key in "acd"] == ["A", "C", "D"]
+    assert cache.bytes == 30
+    assert cache.evictions == 1
+
+
+def test_replacing_a_key_updates_its_size():
+    cache: LRUCache[str] = LRUCache(100)
+    cache.put("a", "A", 10)
+    cache.put("a", "AA", 40)
+
+    assert len(cache) == 1
+    assert cache.bytes == 40
+
+
+def test_values_larger_than_the_budget_are_not_stored():
+    cache: LRUCache[str] = LRUCache(10)
+    cache.put("a", "A", 5)
+    cache.put("big", "B", 11)
+
+    assert cache.peek("big") is None
+    assert cache.peek("a") == "A"
+
+
+def test_stale_loads_are_not_stored():
+    cache: LRUCache[str] = LRUCache(100)
+    generation = cache.generation
+    cache.invalidate("a")
+
+    cache.put("a", "stale", 10, generation)
+    assert cache.peek("a") is None
+
+    cache.put("a", "fresh", 10, cache.generation)
+    assert cache.peek("a") == "fresh"
+
+
+def test_invalidate_and_clear():
+    cache: LRUCache[str] = LRUCache(100)
+    cache.put("a", "A", 10)
+    cache.put("b", "B", 10)
+
+    cache.invalidate("a")
+    assert cache.peek("a") is None
+    assert cache.bytes == 10
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.bytes == 0
+    assert cache.stats()["entries"] == 0
+
+
+def test_single_flight_coalesces_concurrent_loads():
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        flight: SingleFlight[int] = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", load) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert results == [1] * 5
+    assert calls == 1
+    assert flight.coalesced == 4
+
+
+def test_single_flight_loads_again_once_done():
+    async def main():
+        flight: SingleFlight[str] = SingleFlight()
+        first = await flight.do("key", lambda: asyncio.sleep(0, "first"))
+        second = await flight.do("key", lambda: asyncio.sleep(0, "second"))
+        return first, second
+
+    assert asyncio.run(main()) == ("first", "second")
+
+
+def test_single_flight_shares_failures():
+    async def load():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("down")
+
+    async def main():
+        flight: SingleFlight[None] = SingleFlight()
+        return await asyncio.gather(flight.do("key", load), flight.do("key", load), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+
+
+def test_single_flight_survives_a_cancelled_caller():
+    async def main():
+        flight: SingleFlight[str] = SingleFlight()
+        started = asyncio.Event()
+
+        async def load():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "loaded"
+
+        first = asyncio.ensure_future(flight.do("key", load))
+        await started.wait()
+        second = asyncio.ensure_future(flight.do("key", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "loaded"
@@ -0,0 +1,79 @@
+import asyncio
+
+from app import database, metrics
+from app.database import MeteredPool
+
+
+class FakeConnection:
+    async def fetchrow(self, query, *args, timeout=None):
+        return {"query": query, "args": args}
+
+
+class FakeAcquire:
+    """Mimics asyncpg's PoolAcquireContext: usable with `async with` and with `await`."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def __aenter__(self):
+        await asyncio.sleep(0.01)
+        self.pool.acquired += 1
+        return FakeConnection()
+
+    async def __aexit__(self, *exc):
+        self.pool.released += 1
+
+    def __await__(self):
+        return self.__aenter__().__await__()
+
+
+class FakePool:
+    def __init__(self):
+        self.acquired = 0
+        self.released = 0
+
+    def acquire(self, *, timeout=None):
+        return FakeAcquire(self)
+
+    def get_size(self):
+        return 10
+
+
+def test_metered_pool_times_every_acquire():
+    inner = FakePool()
+    pool = MeteredPool(inner)
+    before_count = metrics.pool_acquire_seconds.count
+    before_sum = metrics.pool_acquire_seconds.sum
+
+    async def main():
+        row = await pool.fetchrow("SELECT $1", 1)
+        assert row == {"query": "SELECT $1", "args": (1,)}
+        async with pool.acquire() as conn:
+            assert isinstance(conn, FakeConnection)
+        assert isinstance(await pool.acquire(), FakeConnection)
+
+    asyncio.run(main())
+    assert metrics.pool_acquire_seconds.count == before_count + 3
+    assert metrics.pool_acquire_seconds.sum - before_sum >= 0.03
+    assert inner.acquired == 3 and inner.released == 2
+
+
+def test_metered_pool_passes_the_rest_through():
+    pool = MeteredPool(FakePool())
+    assert pool.get_size() == 10
+
+
+def test_create_pool_keeps_asyncpg_defaults(monkeypatch):
+    created = {}
+
+    async def fake_create_pool(dsn, **kwargs):
+        created.update(dsn=dsn, **kwargs)
+        return FakePool()
+
+    monkeypatch.setattr(database.asyncpg, "create_pool", fake_create_pool)
+    monkeypatch.setattr(database.settings, "DATABASE_URL", "postgres://u@h/db")
+    monkeypatch.setattr(database.settings, "METRICS_ENABLED", True)
+    monkeypatch.setattr(database, "pool", None)
+    pool = asyncio.run(database.create_pool())
+    assert isinstance(pool, MeteredPool)
+    assert created == {"dsn": "postgresql://u@h/db", "init": database._init_connection}
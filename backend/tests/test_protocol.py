@@ -0,0 +1,63 @@
+import struct
+
+import pytest
+from pydantic import ValidationError
+
+from app.models.game import MovePlayerData, TeleportData
+from app.session import Player
+from app.sockets.protocol import (
+    POSITION,
+    decode_move,
+    decode_teleport,
+    encode_positions,
+    fits,
+    positions_json,
+)
+
+
+def _player(uid: str, index: int, x: int, y: int) -> Player:
+    return Player(uid=uid, username=uid, x=x, y=y, room=0, socket_id=f"sid-{uid}", skin="009", index=index)
+
+
+def test_decode_move():
+    assert decode_move(struct.pack("<hh", -3, 700)) == (-3, 700)
+    assert decode_move(bytearray(struct.pack("<hh", 1, 2))) == (1, 2)
+
+
+@pytest.mark.parametrize("data", [b"", b"\x00\x00\x00", b"\x00" * 5, "abcd", None, [1, 2]])
+def test_decode_move_rejects_malformed(data):
+    assert decode_move(data) is None
+
+
+def test_decode_teleport():
+    assert decode_teleport(struct.pack("<Hhh", 2, -1, 5)) == (2, -1, 5)
+    assert decode_teleport(b"\x00" * 4) is None
+    assert decode_teleport("xxxxxx") is None
+
+
+def test_encode_positions_round_trips():
+    players = [_player("a", 0, 1, 2), _player("b", 65535, -32768, 32767)]
+
+    body = encode_positions(players)
+
+    assert len(body) == 2 * POSITION.size
+    assert list(POSITION.iter_unpack(body)) == [(0, 1, 2), (65535, -32768, 32767)]
+
+
+def test_encode_positions_leaves_out_players_outside_int16():
+    players = [_player("a", 0, 40000, 0), _player("b", 1, 3, 4)]
+
+    assert list(POSITION.iter_unpack(encode_positions(players))) == [(1, 3, 4)]
+    assert not fits(0, -32769)
+
+
+def test_positions_json():
+    assert positions_json([_player("a", 0, 1, 2)]) == [{"uid": "a", "x": 1, "y": 2}]
+
+
+def test_moves_outside_int16_are_rejected():
+    with pytest.raises(ValidationError):
+        MovePlayerData(x=32768, y=0)
+    with pytest.raises(ValidationError):
+        TeleportData(x=0, y=-32769, roomIndex=0)
+    assert MovePlayerData(x=-32768, y=32767).x == -32768
@@ -0,0 +1,105 @@
+import pytest
+
+from app.config import settings
+from app.session.session import Session
+
+MAP = {
+    "spawnpoint": {"roomIndex": 0, "x": 0, "y": 0},
+    "rooms": [
+        {
+            "name": "a",
+            "tilemap": {
+                "20, 20": {"floor": "g", "privateAreaId": "office"},
+                "30, 30": {"floor": "g", "privateAreaId": "office"},
+            },
+        }
+    ],
+}
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(settings, "PROXIMITY_ENABLED", True)
+    monkeypatch.setattr(settings, "PROXIMITY_RADIUS", 2)
+    session = Session("realm", MAP)
+    for uid in ("a", "b", "c"):
+        session.add_player(f"sid-{uid}", uid, uid, "009")
+        session.move_player(uid, 100 + 10 * len(session.players), 100)
+    session.proximity.drain()
+    return session
+
+
+def channel(session, uid):
+    return session.proximity.get_channel(uid)
+
+
+def test_players_within_radius_share_a_channel(session):
+    session.move_player("a", 0, 0)
+    session.move_player("b", 2, 2)
+
+    assert channel(session, "a") is not None
+    assert channel(session, "a") == channel(session, "b")
+    assert channel(session, "c") is None
+    assert session.proximity.get_members(channel(session, "a")) == {"a", "b"}
+
+
+def test_groups_are_connected_components(session):
+    session.move_player("a", 0, 0)
+    session.move_player("b", 2, 0)
+    session.move_player("c", 4, 0)
+
+    assert channel(session, "a") == channel(session, "b") == channel(session, "c")
+
+    # Taking out the middle player splits the chain
+    session.move_player("b", 50, 50)
+    assert channel(session, "a") is None
+    assert channel(session, "b") is None
+    assert channel(session, "c") is None
+
+
+def test_larger_group_keeps_its_channel_on_split(session):
+    session.move_player("a", 0, 0)
+    session.move_player("b", 1, 0)
+    first = channel(session, "a")
+    session.move_player("c", 3, 0)
+    assert channel(session, "c") == first
+
+    session.move_player("c", 10, 0)
+    assert channel(session, "a") == channel(session, "b") == first
+    assert channel(session, "c") is None
+
+
+def test_private_areas_share_a_channel_regardless_of_distance(session):
+    session.move_player("a", 20, 20)
+    session.move_player("b", 30, 30)
+    session.move_player("c", 21, 20)
+
+    area = channel(session, "a")
+    assert area == channel(session, "b") == "realm:0:office"
+    # Standing next to the area is not being in it
+    assert channel(session, "c") is None
+
+
+def test_drain_reports_net_changes(session):
+    session.move_player("a", 0, 0)
+    session.move_player("b", 1, 0)
+    joined = channel(session, "a")
+
+    assert sorted(session.proximity.drain()) == [("a", None, joined), ("b", None, joined)]
+    assert session.proximity.drain() == []
+
+    # Leaving a group that lives on and coming back within one drain is no change
+    session.move_player("c", 2, 0)
+    session.proximity.drain()
+    session.move_player("c", 20, 0)
+    session.move_player("c", 2, 0)
+    assert session.proximity.drain() == []
+
+
+def test_removing_a_player_regroups_the_rest(session):
+    session.move_player("a", 0, 0)
+    session.move_player("b", 1, 0)
+    session.remove_player("a")
+
+    assert channel(session, "a") is None
+    assert channel(session, "b") is None
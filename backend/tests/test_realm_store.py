@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from app.services import realms
+from app.services.cache import LRUCache
+
+REALM = "11111111-1111-1111-1111-111111111111"
+MAP = {"spawnpoint": {"roomIndex": 0, "x": 0, "y": 0}, "rooms": [{"name": "a", "tilemap": {"0, 0": {}, "1, 0": {}}}]}
+
+
+class FakePool:
+    def __init__(self, row):
+        self.row = row
+        self.queries = 0
+
+    async def fetchrow(self, query, *args):
+        self.queries += 1
+        return dict(self.row)
+
+
+@pytest.fixture(autouse=True)
+def caches(monkeypatch):
+    for name in ("realm_cache", "share_cache", "body_cache"):
+        monkeypatch.setattr(realms, name, LRUCache(1 << 20))
+
+
+def _row(**extra):
+    return {
+        "id": REALM, "name": "r", "owner_id": "o", "map_data": MAP, "share_id": "s", "only_owner": False,
+        "version": 3, **extra,
+    }
+
+
+def test_a_join_load_does_not_encode_the_body(monkeypatch):
+    pool = FakePool(_row(map_bytes=1000))
+    monkeypatch.setattr(realms, "get_pool", lambda: pool)
+
+    realm = asyncio.run(realms.get_realm(REALM))
+
+    assert "map_bytes" not in realm
+    assert realms.realm_cache.bytes == 1000 + 256
+    assert len(realms.body_cache) == 0
+
+
+def test_rows_without_a_map_length_are_estimated_per_tile(monkeypatch):
+    monkeypatch.setattr(realms, "get_pool", lambda: FakePool(_row()))
+
+    asyncio.run(realms.get_realm(REALM))
+
+    assert realms.realm_cache.bytes == 2 * realms._TILE_BYTES + 256
+
+
+def test_the_body_is_built_on_the_first_get(monkeypatch):
+    pool = FakePool(_row(map_bytes=1000))
+    monkeypatch.setattr(realms, "get_pool", lambda: pool)
+
+    async def main():
+        await realms.get_realm(REALM)
+        return await realms.get_realm_body(REALM), await realms.get_realm_body(REALM)
+
+    first, second = asyncio.run(main())
+    assert first is second
+    assert first.etag == f'"full.{REALM}.3"'
+    assert pool.queries == 1
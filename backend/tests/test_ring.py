@@ -0,0 +1,56 @@
+from app.cluster.ring import HashRing
+
+KEYS = [f"realm-{i}" for i in range(2000)]
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().owner_of("realm") is None
+
+
+def test_single_worker_owns_everything():
+    ring = HashRing(["w1"])
+
+    assert {ring.owner_of(key) for key in KEYS} == {"w1"}
+
+
+def test_owners_are_stable_and_order_independent():
+    first = HashRing(["w1", "w2", "w3"])
+    second = HashRing(["w3", "w1", "w2", "w1"])
+
+    assert second.workers == ("w1", "w2", "w3")
+    assert [first.owner_of(key) for key in KEYS] == [second.owner_of(key) for key in KEYS]
+
+
+def test_keys_spread_over_workers():
+    ring = HashRing(["w1", "w2", "w3", "w4"])
+    counts: dict[str, int] = {}
+    for key in KEYS:
+        owner = ring.owner_of(key)
+        counts[owner] = counts.get(owner, 0) + 1
+
+    assert set(counts) == {"w1", "w2", "w3", "w4"}
+    assert min(counts.values()) > len(KEYS) / 4 / 2
+
+
+def test_only_the_leaving_workers_keys_move():
+    ring = HashRing(["w1", "w2", "w3", "w4"])
+    before = {key: ring.owner_of(key) for key in KEYS}
+
+    ring.set_workers(["w1", "w2", "w3"])
+    after = {key: ring.owner_of(key) for key in KEYS}
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved
+    assert all(before[key] == "w4" for key in moved)
+    assert "w4" not in after.values()
+
+
+def test_a_joining_worker_only_takes_keys():
+    ring = HashRing(["w1", "w2"])
+    before = {key: ring.owner_of(key) for key in KEYS}
+
+    ring.set_workers(["w1", "w2", "w3"])
+
+    for key in KEYS:
+        owner = ring.owner_of(key)
+        assert owner == before[key] or owner == "w3"
@@ -0,0 +1,143 @@
+import asyncio
+import gzip
+import time
+
+import pytest
+
+from app import codec
+from app.services.snapshot import SNAPSHOT_VERSION, SessionSnapshots
+from app.session.manager import SessionManager
+
+REALM = "11111111-1111-1111-1111-111111111111"
+MAP = {
+    "spawnpoint": {"roomIndex": 0, "x": 0, "y": 0},
+    "rooms": [{"name": "a", "tilemap": {}}, {"name": "b", "tilemap": {}}],
+}
+MESSAGE = {"uid": "a", "username": "a", "message": "hi", "ts": 1}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.json.gz")
+
+
+def _live_manager() -> tuple[SessionManager, str]:
+    manager = SessionManager()
+    manager.create_session(REALM, MAP)
+    second = manager._add_shard(REALM)
+    manager.add_player_to_session("sid-a", REALM, "a", "a", "009")
+    manager.add_player_to_session("sid-b", second.id, "b", "b", "009")
+    manager.get_session(REALM).change_room("a", 1, 4, 4)
+    second.move_player("b", 2, 3)
+    manager.get_session(REALM).add_chat_message(1, MESSAGE)
+    return manager, second.id
+
+
+def _save(manager, path, resume_ttl=300.0) -> SessionSnapshots:
+    snapshots = SessionSnapshots(manager, path, 30.0, resume_ttl)
+    assert asyncio.run(snapshots.save())
+    return snapshots
+
+
+def test_round_trip(path):
+    manager, second_id = _live_manager()
+    _save(manager, path)
+
+    fresh = SessionManager()
+    snapshots = SessionSnapshots(fresh, path, 30.0, 300.0)
+    assert snapshots.restore() == 2
+    # Nothing is rebuilt until the realm's first join has loaded it from the database
+    assert fresh.get_session(REALM) is None
+
+    assert snapshots.restore_realm(REALM, MAP)
+    assert [shard.id for shard in fresh.get_realm_shards(REALM)] == [REALM, second_id]
+    assert fresh.get_shard_counter(REALM) == manager.get_shard_counter(REALM)
+    assert fresh.get_session(REALM).get_chat_history(1) == [MESSAGE]
+    # A realm is restored once
+    assert not snapshots.restore_realm(REALM, MAP)
+
+    point = snapshots.take_resume("a", REALM)
+    assert (point.shard_id, point.room, point.x, point.y) == (REALM, 1, 4, 4)
+    assert snapshots.take_resume("a", REALM) is None
+    point = snapshots.take_resume("b", REALM)
+    assert (point.shard_id, point.room, point.x, point.y) == (second_id, 0, 2, 3)
+
+
+def test_resume_points_are_for_their_realm_only(path):
+    manager, _ = _live_manager()
+    _save(manager, path)
+
+    snapshots = SessionSnapshots(SessionManager(), path, 30.0, 300.0)
+    snapshots.restore()
+    assert snapshots.take_resume("a", "another realm") is None
+
+
+def test_expired_snapshots_are_ignored(path):
+    manager, _ = _live_manager()
+    _save(manager, path, resume_ttl=0.0)
+
+    snapshots = SessionSnapshots(SessionManager(), path, 30.0, 300.0)
+    assert snapshots.restore() == 0
+    assert not snapshots.restore_realm(REALM, MAP)
+
+
+def test_pending_realms_survive_another_save(path):
+    manager, _ = _live_manager()
+    _save(manager, path)
+
+    # Restarted again before anyone rejoined: the second snapshot still has the realm and a's position
+    first = SessionSnapshots(SessionManager(), path, 30.0, 300.0)
+    first.restore()
+    first.take_resume("b", REALM)
+    assert asyncio.run(first.save())
+
+    second = SessionSnapshots(SessionManager(), path, 30.0, 300.0)
+    assert second.restore() == 1
+    assert second.take_resume("a", REALM).room == 1
+    assert second.restore_realm(REALM, MAP)
+
+
+def test_final_save_is_not_overwritten(path):
+    manager, _ = _live_manager()
+    snapshots = _save(manager, path)
+    assert asyncio.run(snapshots.save(final=True))
+
+    manager.log_out_player("a")
+    assert not asyncio.run(snapshots.save())
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"not gzip",
+        gzip.compress(b"not json"),
+        gzip.compress(codec.dumps_bytes({"version": SNAPSHOT_VERSION - 1, "savedAt": 0, "realms": []})),
+    ],
+)
+def test_unusable_files_start_cold(path, body):
+    with open(path, "wb") as f:
+        f.write(body)
+
+    snapshots = SessionSnapshots(SessionManager(), path, 30.0, 300.0)
+    assert snapshots.restore() == 0
+    assert snapshots.pending_resumes() == 0
+
+
+def test_missing_file_starts_cold(path):
+    snapshots = SessionSnapshots(SessionManager(), path, 30.0, 300.0)
+    assert snapshots.restore() == 0
+    assert snapshots.failures == 0
+
+
+def test_expire_drops_stale_resume_points(path, monkeypatch):
+    manager, _ = _live_manager()
+    _save(manager, path)
+    snapshots = SessionSnapshots(SessionManager(), path, 30.0, 300.0)
+    snapshots.restore()
+
+    later = time.time() + 301
+    monkeypatch.setattr(time, "time", lambda: later)
+    snapshots._expire()
+
+    assert snapshots.stats()["pendingResumes"] == 0
+    assert snapshots.stats()["pendingRealms"] == 0
@@ -0,0 +1,65 @@
+from app.session.spatial import SpatialGrid, cell_key
+
+
+def test_insert_buckets_by_cell():
+    grid = SpatialGrid(4)
+    grid.insert("a", 1, 1)
+    grid.insert("b", 3, 3)
+    grid.insert("c", 4, 3)
+
+    assert len(grid) == 3
+    assert "a" in grid
+    assert grid.cell_of(3, 3) == cell_key(0, 0)
+    assert grid.cell_of(4, 3) == cell_key(1, 0)
+    assert [set(cell) for cell in grid.iter_view(0, 0, 0)] == [{"a", "b"}]
+
+
+def test_negative_coordinates_get_their_own_cells():
+    grid = SpatialGrid(4)
+    grid.insert("a", -1, -1)
+    grid.insert("b", 0, 0)
+
+    assert grid.cell_of(-1, -1) == cell_key(-1, -1)
+    assert [set(cell) for cell in grid.iter_view(0, 0, 0)] == [{"b"}]
+    assert sorted(sorted(cell) for cell in grid.iter_view(0, 0, 1)) == [["a"], ["b"]]
+
+
+def test_move_reports_cell_crossings():
+    grid = SpatialGrid(4)
+    grid.insert("a", 0, 0)
+
+    assert grid.move("a", 3, 3) is False
+    assert grid.move("a", 4, 3) is True
+    assert grid.cell_of(4, 3) == grid._uid_cells["a"]
+    # A uid that was not in the grid yet is inserted, not reported as a crossing
+    assert grid.move("b", 9, 9) is False
+    assert "b" in grid
+
+
+def test_remove_drops_empty_cells():
+    grid = SpatialGrid(4)
+    grid.insert("a", 0, 0)
+    grid.remove("a")
+    grid.remove("a")
+
+    assert len(grid) == 0
+    assert grid._cells == {}
+
+
+def test_iter_cells_covers_the_radius():
+    grid = SpatialGrid(4)
+    grid.insert("near", 5, 5)
+    grid.insert("far", 20, 20)
+
+    found = {uid for cell in grid.iter_cells(2, 2, 3) for uid in cell}
+    assert found == {"near"}
+
+
+def test_in_view_compares_cells():
+    grid = SpatialGrid(4)
+
+    assert grid.in_view(0, 0, 3, 3, 0)
+    assert not grid.in_view(0, 0, 4, 0, 0)
+    assert grid.in_view(0, 0, 7, 7, 1)
+    assert not grid.in_view(0, 0, 8, 0, 1)
+    assert grid.in_view(-1, 0, 0, 0, 1)
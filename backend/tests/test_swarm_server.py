@@ -0,0 +1,51 @@
+import asyncio
+
+import socketio
+import uvicorn
+
+import app.database as database
+import app.main as server
+from app.services.snapshot import session_snapshots
+from bench.swarm_server import MemoryPool, build_map, realm_id, share_id
+
+
+async def _join(realm: str) -> tuple[str, object]:
+    config = uvicorn.Config(server.combined_app, host="127.0.0.1", port=0, log_level="warning")
+    uvicorn_server = uvicorn.Server(config)
+    serving = asyncio.create_task(uvicorn_server.serve())
+    try:
+        while not uvicorn_server.started:
+            await asyncio.sleep(0.01)
+        port = uvicorn_server.servers[0].sockets[0].getsockname()[1]
+
+        client = socketio.AsyncClient()
+        joined: asyncio.Future = asyncio.get_running_loop().create_future()
+        for event in ("joinedRealm", "failedToJoinRoom"):
+            client.on(event, lambda data, event=event: joined.done() or joined.set_result((event, data)))
+        await client.connect(f"http://127.0.0.1:{port}?uid=bot-0&username=bot", transports=["websocket"])
+        try:
+            await client.emit("joinRealm", {"realmId": realm, "shareId": share_id(realm)})
+            return await asyncio.wait_for(joined, 5)
+        finally:
+            await client.disconnect()
+    finally:
+        uvicorn_server.should_exit = True
+        await serving
+
+
+def test_join_against_the_memory_pool(monkeypatch):
+    """bench.swarm --spawn memory: a join is answered from MemoryPool without a database."""
+    pool = MemoryPool(build_map(2, 16))
+
+    async def create_pool() -> MemoryPool:
+        database.pool = pool
+        return pool
+
+    monkeypatch.setattr(database, "create_pool", create_pool)
+    monkeypatch.setattr(server, "create_pool", create_pool)
+    monkeypatch.setattr(session_snapshots, "path", "")
+
+    event, data = asyncio.run(_join(realm_id(0)))
+
+    assert event == "joinedRealm", data
+    assert (data["room"], data["x"], data["y"]) == (0, 8, 8)
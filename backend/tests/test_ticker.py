@@ -0,0 +1,88 @@
+import pytest
+
+from app.config import settings
+from app.session.session import Session
+from app.sockets import ticker
+from app.sockets.ticker import MovementTicker
+
+MAP = {"spawnpoint": {"roomIndex": 0, "x": 0, "y": 0}, "rooms": [{"name": "a", "tilemap": {}}]}
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(settings, "AOI_CELL_SIZE", 2)
+    monkeypatch.setattr(settings, "AOI_VIEW_CELLS", 0)
+    session = Session("realm", MAP)
+    for uid in ("a", "b"):
+        session.add_player(f"sid-{uid}", uid, uid, "009")
+    return session
+
+
+def _move(session, uid, x, y):
+    player = session.players[uid]
+    moved_from = (player.x, player.y)
+    return moved_from if session.move_player(uid, x, y) else None
+
+
+def test_players_drifting_apart_drop_each_other(session):
+    entered = {"a": _move(session, "a", 2, 0)}
+
+    assert MovementTicker._left_view(session, 0, entered) == {"sid-a": {"b"}, "sid-b": {"a"}}
+
+
+def test_players_still_in_view_are_kept(session):
+    assert _move(session, "a", 1, 1) is None
+    session.move_player("b", 4, 0)
+    entered = {"b": (0, 0), "a": _move(session, "a", 4, 1)}
+
+    # b left a's view and a followed it: they still see each other
+    assert MovementTicker._left_view(session, 0, entered) == {}
+
+
+def test_both_crossing_cells_compare_old_positions(session):
+    entered = {"a": _move(session, "a", 2, 0), "b": _move(session, "b", 0, 2)}
+
+    assert MovementTicker._left_view(session, 0, entered) == {"sid-a": {"b"}, "sid-b": {"a"}}
+
+
+def test_split_by_view_sends_each_player_once(session):
+    entered = {"a": _move(session, "a", 2, 0)}
+    session.move_player("b", 3, 0)
+    batch = [session.players["a"], session.players["b"]]
+
+    per_socket = MovementTicker._split_by_view(session, 0, batch, entered)
+
+    viewer, in_view = per_socket["sid-a"]
+    assert viewer.uid == "a"
+    # Movers are not sent their own position
+    assert sorted(in_view) == ["b"]
+    assert sorted(per_socket["sid-b"][1]) == ["a"]
+
+
+def test_a_lone_mover_gets_nothing_back(session):
+    session.move_player("b", 6, 6)
+    session.move_player("a", 1, 0)
+
+    per_socket = MovementTicker._split_by_view(session, 0, [session.players["a"]], {})
+
+    assert "sid-a" not in per_socket
+
+
+def test_room_broadcast_leaves_out_the_movers(session, monkeypatch):
+    sent = []
+
+    def emit_positions(players, binary, **target):
+        sent.append(([p.uid for p in players], target))
+
+    monkeypatch.setattr(ticker.outbound, "emit_positions", emit_positions)
+    session.add_player("sid-c", "c", "c", "009")
+    batch = [session.players["a"], session.players["b"]]
+
+    MovementTicker._emit_batch(session, 0, batch)
+
+    room = session.stream_room_name(0, False)
+    assert sent == [
+        (["a", "b"], {"room": room, "skip_sid": ["sid-a", "sid-b"]}),
+        (["b"], {"to": "sid-a"}),
+        (["a"], {"to": "sid-b"}),
+    ]
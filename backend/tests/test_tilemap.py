@@ -0,0 +1,85 @@
+from app.session.tilemap import CompiledRoom, compile_rooms, diff_tilemap, is_structural_change
+
+TILEMAP = {
+    "2, 3": {"floor": "grass"},
+    "3, 3": {"floor": "grass", "impassable": True},
+    "4, 5": {"floor": "grass", "teleporter": {"roomIndex": 1, "x": 7, "y": 8}},
+    "2, 5": {"floor": "grass", "privateAreaId": "office"},
+    "3, 5": {"floor": "grass", "privateAreaId": "office"},
+    "4, 4": {"floor": "grass", "privateAreaId": "kitchen"},
+    "not a key": {"impassable": True},
+}
+
+
+def test_bounding_box():
+    room = CompiledRoom(TILEMAP)
+
+    assert (room.min_x, room.min_y, room.width, room.height) == (2, 3, 3, 3)
+
+
+def test_only_impassable_tiles_block():
+    room = CompiledRoom(TILEMAP)
+
+    assert room.can_stand(2, 3)
+    assert not room.can_stand(3, 3)
+    # Gaps inside the bounding box and cells outside it are free, as on the client
+    assert room.can_stand(4, 3)
+    assert room.can_stand(-10, 3)
+    assert room.can_stand(100, 100)
+
+
+def test_teleport_targets():
+    room = CompiledRoom(TILEMAP)
+
+    assert room.teleport_targets == {(1, 7, 8)}
+
+
+def test_malformed_teleporters_are_ignored():
+    room = CompiledRoom({"0, 0": {"teleporter": {"roomIndex": "x"}}, "1, 0": {"teleporter": None}})
+
+    assert room.teleport_targets == set()
+
+
+def test_private_areas():
+    room = CompiledRoom(TILEMAP)
+
+    assert room.private_area_at(2, 5) == "office"
+    assert room.private_area_at(3, 5) == "office"
+    assert room.private_area_at(4, 4) == "kitchen"
+    assert room.private_area_at(2, 3) is None
+    assert room.private_area_at(50, 50) is None
+    assert room.private_area_ids == [None, "office", "kitchen"]
+
+
+def test_empty_room():
+    room = CompiledRoom({})
+
+    assert room.width == room.height == 0
+    assert room.can_stand(0, 0)
+    assert room.private_area_at(0, 0) is None
+
+
+def test_compile_rooms_handles_missing_tilemaps():
+    rooms = compile_rooms({"rooms": [{"name": "a"}, {"name": "b", "tilemap": {"0, 0": {"impassable": True}}}]})
+
+    assert len(rooms) == 2
+    assert rooms[0].can_stand(0, 0)
+    assert not rooms[1].can_stand(0, 0)
+
+
+def test_diff_tilemap():
+    old = {"0, 0": {"floor": "a"}, "1, 0": {"floor": "a"}, "2, 0": {"floor": "a"}}
+    new = {"0, 0": {"floor": "a"}, "1, 0": {"floor": "b"}, "3, 0": {"floor": "c"}}
+
+    assert diff_tilemap(old, new) == {"1, 0": {"floor": "b"}, "2, 0": None, "3, 0": {"floor": "c"}}
+    assert diff_tilemap(new, new) == {}
+
+
+def test_structural_changes():
+    base = {"spawnpoint": {"roomIndex": 0, "x": 0, "y": 0}, "rooms": [{"name": "a", "tilemap": {}}]}
+
+    tiles_only = {**base, "rooms": [{"name": "a", "tilemap": {"0, 0": {"floor": "b"}}}]}
+    assert not is_structural_change(base, tiles_only)
+    assert is_structural_change(base, {**base, "spawnpoint": {"roomIndex": 0, "x": 1, "y": 0}})
+    assert is_structural_change(base, {**base, "rooms": [{"name": "b", "tilemap": {}}]})
+    assert is_structural_change(base, {**base, "rooms": base["rooms"] * 2})
@@ -0,0 +1,190 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services import writebehind
+from app.services.writebehind import ProfileWriter
+
+
+class FakePool:
+    """Records committed rows per query; `fail(query, args)` may return an exception to raise."""
+
+    def __init__(self, fail=None):
+        self.fail = fail or (lambda query, args: None)
+        self.rows: list[tuple[str, tuple]] = []
+
+    def _check(self, query, args):
+        error = self.fail(query, args)
+        if error is not None:
+            raise error
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self)
+
+    async def execute(self, query, *args):
+        self._check(query, args)
+        self.rows.append((query, args))
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.staged: list[tuple[str, tuple]] = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+        self.pool.rows.extend(self.staged)
+
+    async def executemany(self, query, rows):
+        for args in rows:
+            args = tuple(args)
+            self.pool._check(query, args)
+            self.staged.append((query, args))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(writebehind, "get_pool", lambda: pool)
+    return pool
+
+
+def _writer(max_pending=100):
+    return ProfileWriter(interval=1.0, batch_size=50, max_pending=max_pending)
+
+
+def test_flush_writes_everything_in_one_batch(pool):
+    writer = _writer()
+    writer.upsert_profile("u1", "first")
+    writer.upsert_profile("u1", "latest")
+    writer.update_skin("u1", "010")
+    writer.add_visited_realm("u1", "share")
+    writer.add_visited_realm("u1", "share")
+
+    asyncio.run(writer.flush())
+
+    assert [args for _, args in pool.rows] == [("u1", "latest"), ("u1", "010"), ("u1", "share")]
+    assert writer.pending() == 0
+    assert writer.flushed == 3
+
+
+def test_a_bad_row_is_dropped_and_the_rest_written(pool):
+    pool.fail = lambda query, args: ValueError("bad skin") if args == ("u2", 42) else None
+    writer = _writer()
+    writer.update_skin("u1", "010")
+    writer.update_skin("u2", 42)
+    writer.update_skin("u3", "011")
+
+    asyncio.run(writer.flush())
+
+    assert [args for _, args in pool.rows] == [("u1", "010"), ("u3", "011")]
+    assert writer.pending() == 0
+    assert writer.dropped == 1
+
+
+def test_an_unavailable_database_keeps_the_writes(pool):
+    writer = _writer()
+
+    def fail(query, args):
+        # A newer write arrives while the batch is in flight
+        writer.upsert_profile("u1", "newer")
+        return ConnectionRefusedError()
+
+    pool.fail = fail
+    writer.upsert_profile("u1", "older")
+    writer.update_skin("u1", "010")
+
+    with pytest.raises(ConnectionRefusedError):
+        asyncio.run(writer.flush())
+
+    assert pool.rows == []
+    assert writer._usernames == {"u1": "newer"}
+    assert writer._skins == {"u1": "010"}
+    assert writer.has_pending_profile("u1")
+
+    pool.fail = lambda query, args: None
+    asyncio.run(writer.flush())
+    assert [args for _, args in pool.rows] == [("u1", "newer"), ("u1", "010")]
+
+
+def test_database_failure_during_row_retry_keeps_unwritten_rows(pool):
+    def fail(query, args):
+        if args == ("u1", "bad"):
+            return ValueError("bad row")
+        if args == ("u3", "011"):
+            return ConnectionRefusedError()
+        return None
+
+    pool.fail = fail
+    writer = _writer()
+    writer.update_skin("u1", "bad")
+    writer.update_skin("u2", "010")
+    writer.update_skin("u3", "011")
+
+    with pytest.raises(ConnectionRefusedError):
+        asyncio.run(writer.flush())
+
+    assert [args for _, args in pool.rows] == [("u2", "010")]
+    assert writer._skins == {"u3": "011"}
+    assert writer.dropped == 1
+
+
+def test_pending_writes_are_capped(pool):
+    writer = _writer(max_pending=2)
+    writer.update_skin("u1", "010")
+    writer.update_skin("u2", "011")
+    writer.update_skin("u3", "012")
+
+    assert writer._skins == {"u2": "011", "u3": "012"}
+    assert writer.dropped == 1
+
+
+def test_the_cap_drops_the_oldest_write_of_any_kind(pool):
+    writer = _writer(max_pending=2)
+    writer.update_skin("u1", "010")
+    writer.upsert_profile("u2", "second")
+    writer.upsert_profile("u3", "third")
+
+    assert writer._skins == {}
+    assert writer._usernames == {"u2": "second", "u3": "third"}
+
+    # A rewrite counts as the newest write
+    writer.upsert_profile("u2", "rewritten")
+    writer.add_visited_realm("u4", "share")
+    assert writer._usernames == {"u2": "rewritten"}
+    assert writer._visits == {("u4", "share"): None}
+    assert writer.dropped == 2
+
+
+def test_writes_put_back_after_a_failure_stay_oldest(pool):
+    writer = _writer(max_pending=2)
+
+    def fail(query, args):
+        writer.update_skin("u3", "012")
+        return ConnectionRefusedError()
+
+    pool.fail = fail
+    writer.update_skin("u1", "010")
+    writer.update_skin("u2", "011")
+
+    with pytest.raises(ConnectionRefusedError):
+        asyncio.run(writer.flush())
+
+    # u1 was queued first, so it is the one dropped, not the write made during the flush
+    assert writer._skins == {"u2": "011", "u3": "012"}
+    assert writer.dropped == 1
+
+
+def test_profile_is_pending_while_its_batch_is_written(pool):
+    writer = _writer()
+    seen = []
+    pool.fail = lambda query, args: seen.append(writer.has_pending_profile("u1"))
+    writer.upsert_profile("u1", "name")
+
+    asyncio.run(writer.flush())
+
+    assert seen == [True]
+    assert not writer.has_pending_profile("u1")
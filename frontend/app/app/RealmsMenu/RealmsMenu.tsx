@@ -4,7 +4,7 @@ import { toast } from 'react-toastify'
 import BasicButton from '@/components/BasicButton'
 import DesktopRealmItem from './DesktopRealmItem'
 import { useRouter } from 'next/navigation'
-import { request } from '@/utils/backend/requests'
+import { subscribePlayerCounts } from '@/utils/backend/playerCounts'
 
 type Realm = {
     id: string,
@@ -21,7 +21,7 @@ type RealmsMenuProps = {
 const RealmsMenu:React.FC<RealmsMenuProps> = ({ realms, errorMessage }) => {
 
     const [selectedRealm, setSelectedRealm] = useState<Realm | null>(null)
-    const [playerCounts, setPlayerCounts] = useState<number[]>([])
+    const [playerCounts, setPlayerCounts] = useState<{ [realmId: string]: number }>({})
     const router = useRouter()
 
     useEffect(() => {
@@ -31,8 +31,11 @@ const RealmsMenu:React.FC<RealmsMenuProps> = ({ realms, errorMessage }) => {
     }, [errorMessage])
 
     useEffect(() => {
-        getPlayerCounts()
-    }, [])
+        if (realms.length === 0) return
+        return subscribePlayerCounts(realms.map((realm) => realm.id), (counts) => {
+            setPlayerCounts((current) => ({ ...current, ...counts }))
+        })
+    }, [realms])
 
     function getLink() {
         if (selectedRealm?.share_id) {
@@ -42,20 +45,12 @@ const RealmsMenu:React.FC<RealmsMenuProps> = ({ realms, errorMessage }) => {
         }
     }
 
-    async function getPlayerCounts() {
-        if (realms.length === 0) return
-        const { data: playerCountData, error: playerCountsError } = await request('/getPlayerCounts', { realmIds: realms.map((realm: any) => realm.id)})
-        if (playerCountData) {
-            setPlayerCounts(playerCountData.playerCounts)
-        }
-    }
-
     return (
         <>
             {/* Mobile View */}
             <div className='flex flex-col items-center p-4 gap-2 sm:hidden'>
                 {realms.length === 0 && <p className='text-center'>You have no spaces you can join. Create one on desktop to get started!</p>}
-                {realms.map((realm, index) => {
+                {realms.map((realm) => {
 
                     function selectRealm() {
                         setSelectedRealm(realm)
@@ -64,8 +59,8 @@ const RealmsMenu:React.FC<RealmsMenuProps> = ({ realms, errorMessage }) => {
                     return (
                         <BasicButton key={realm.id} className={`w-full h-12 border-4 border-transparent flex flex-row items-center justify-between ${selectedRealm?.id === realm.id ? 'border-white' : ''}`} onClick={selectRealm}>
                             <p className='text-button text-xl text-left'>{realm.name}</p>
-                            {playerCounts[index] !== undefined && <div className='rounded-full grid place-items-center w-8 h-8 font-bold bg-green-500'>
-                                {playerCounts[index]}
+                            {playerCounts[realm.id] !== undefined && <div className='rounded-full grid place-items-center w-8 h-8 font-bold bg-green-500'>
+                                {playerCounts[realm.id]}
                             </div>}
                         </BasicButton>
                     )
@@ -81,9 +76,9 @@ const RealmsMenu:React.FC<RealmsMenuProps> = ({ realms, errorMessage }) => {
             <div className='flex-col items-center w-full p-8 hidden sm:flex'>
                 {realms.length === 0 && <p className='text-center'>You have no spaces you can join. Create a space to get started!</p>}
                 <div className='hidden sm:grid grid-cols-2 md:grid-cols-3 gap-8 w-full'>
-                    {realms.map((realm, index) => {
+                    {realms.map((realm) => {
                         return (
-                            <DesktopRealmItem key={realm.id} name={realm.name} id={realm.id} shareId={realm.share_id} shared={realm.shared} playerCount={playerCounts[index]}/>
+                            <DesktopRealmItem key={realm.id} name={realm.name} id={realm.id} shareId={realm.share_id} shared={realm.shared} playerCount={playerCounts[realm.id]}/>
                         )
                     })}
                 </div>
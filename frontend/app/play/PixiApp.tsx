@@ -27,7 +27,9 @@ const PixiApp:React.FC<PixiAppProps> = ({ className, mapData, username, realmId,
             appRef.current = app
             setModal('Loading')
             setLoadingText('Connecting to server...')
-            const { success, errorMessage } = await server.connect(realmId, uid, shareId, username)
+            const { success, errorMessage, position, chat } = await server.connect(realmId, uid, shareId, username, (position) => {
+                setLoadingText(`Waiting to join... (${position} in line)`)
+            })
             if (!success) {
                 setErrorModal('Failed To Connect')
                 setFailedConnectionMessage(errorMessage)
@@ -35,7 +37,7 @@ const PixiApp:React.FC<PixiAppProps> = ({ className, mapData, username, realmId,
             }
 
             setLoadingText('Loading game...')
-            await app.init()
+            await app.init(position, chat)
             setModal('None')
             const pixiApp = app.getApp()
 
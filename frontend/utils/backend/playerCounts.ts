@@ -0,0 +1,29 @@
+import io from 'socket.io-client'
+
+const backend_url: string = process.env.NEXT_PUBLIC_BACKEND_URL as string
+
+type PlayerCounts = { [realmId: string]: number }
+
+// Follows the player counts of realmIds: onCounts gets all of them once, then only the realms whose count changed.
+// Returns a function that stops the subscription.
+export function subscribePlayerCounts(realmIds: string[], onCounts: (counts: PlayerCounts) => void) {
+    const socket = io(backend_url, {
+        reconnection: true,
+        reconnectionDelay: 2000,
+        transports: ['websocket', 'polling'],
+        query: {
+            watch: 'playerCounts',
+        }
+    })
+
+    // Subscribe again after every reconnect; the server answers with the current counts
+    socket.on('connect', () => {
+        socket.emit('subscribePlayerCounts', realmIds)
+    })
+
+    socket.on('playerCounts', onCounts)
+
+    return () => {
+        socket.disconnect()
+    }
+}
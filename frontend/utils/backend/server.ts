@@ -1,9 +1,26 @@
 import io, { Socket } from 'socket.io-client'
 import { request } from './requests'
 
+type StartPosition = {
+    room: number
+    x: number
+    y: number
+}
+
+type ChatEntry = {
+    uid: string
+    username: string
+    message: string
+    ts: number
+}
+
 type ConnectionResponse = {
     success: boolean
     errorMessage: string
+    // Where the server placed the player: the spawnpoint, or where they stood before a server restart
+    position?: StartPosition
+    // Recent messages of the starting room, oldest first
+    chat?: ChatEntry[]
 }
 
 const backend_url: string = process.env.NEXT_PUBLIC_BACKEND_URL as string
@@ -12,12 +29,14 @@ class Server {
     public socket: Socket = {} as Socket
     private connected: boolean = false
 
-    public async connect(realmId: string, uid: string, shareId: string, username: string) {
+    public async connect(realmId: string, uid: string, shareId: string, username: string, onQueued?: (position: number) => void) {
         this.socket = io(backend_url, {
         reconnection: true,
         autoConnect: false,
         reconnectionAttempts: 5,
         reconnectionDelay: 2000,
+        // Websocket first: a multi-worker backend only accepts websocket connections
+        transports: ['websocket', 'polling'],
         query: {
             uid,
             username,
@@ -36,13 +55,19 @@ class Server {
                 })
             })
 
-            this.socket.on('joinedRealm', () => {
+            this.socket.on('joinedRealm', ({ room, x, y, chat }: StartPosition & { chat: ChatEntry[] }) => {
                 resolve({
                     success: true,
-                    errorMessage: ''
+                    errorMessage: '',
+                    position: { room, x, y },
+                    chat
                 })
             })
 
+            this.socket.on('joinQueued', ({ position }: { position: number }) => {
+                onQueued?.(position)
+            })
+
             this.socket.on('failedToJoinRoom', (reason: string) => {
                 resolve({
                     success: false,
@@ -78,3 +103,4 @@ class Server {
 const server = new Server()
 
 export { server }
+export type { StartPosition, ChatEntry }
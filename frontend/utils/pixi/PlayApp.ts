@@ -2,7 +2,7 @@ import { App } from './App'
 import { Player } from './Player/Player'
 import { Point, RealmData, SpriteMap, TilePoint } from './types'
 import * as PIXI from 'pixi.js'
-import { server } from '../backend/server'
+import { server, StartPosition, ChatEntry } from '../backend/server'
 import { defaultSkin } from './Player/skins'
 import signal from '../signal'
 
@@ -83,10 +83,18 @@ export class PlayApp extends App {
         this.sortObjectsByY()
     }
 
-    public async init() {
+    public async init(start?: StartPosition, chat: ChatEntry[] = []) {
         await super.init()
         await this.loadAssets()
-        await this.loadRoom(this.realmData.spawnpoint.roomIndex)
+        if (start) {
+            this.currentRoomIndex = start.room
+            this.teleportLocation = { x: start.x, y: start.y }
+        } else {
+            this.currentRoomIndex = this.realmData.spawnpoint.roomIndex
+        }
+        await this.loadRoom(this.currentRoomIndex)
+        this.teleportLocation = null
+        this.onChatHistory(chat)
         this.app.stage.eventMode = 'static'
         this.setScale(this.scale)
         this.app.renderer.on('resize', this.resizeEvent)
@@ -268,8 +276,19 @@ export class PlayApp extends App {
         if (this.blocked.has(`${data.x}, ${data.y}`)) return
 
         const player = this.players[data.uid]
-        if (player) {
-            player.moveToTile(data.x, data.y)
+        if (!player) return
+        if (!player.parent.visible) {
+            // Back in view: appear where the player is now instead of walking from where it was last seen
+            player.setPosition(data.x, data.y)
+            player.parent.visible = true
+            return
+        }
+        player.moveToTile(data.x, data.y)
+    }
+
+    private onPlayersMoved = (batch: any[]) => {
+        for (const data of batch) {
+            this.onPlayerMoved(data)
         }
     }
 
@@ -277,6 +296,17 @@ export class PlayApp extends App {
         const player = this.players[data.uid]
         if (player) {
             player.setPosition(data.x, data.y)
+            player.parent.visible = true
+        }
+    }
+
+    // Area-of-interest mode: these players are out of view and get no more updates until they are back
+    private onPlayersLeftView = (uids: string[]) => {
+        for (const uid of uids) {
+            const player = this.players[uid]
+            if (player) {
+                player.parent.visible = false
+            }
         }
     }
 
@@ -340,6 +370,42 @@ export class PlayApp extends App {
         }
     }
 
+    private onMapPatched = async (data: { roomIndex: number, tiles: { [key: string]: any } }) => {
+        const room = this.realmData.rooms[data.roomIndex]
+        if (!room) return
+
+        for (const [key, tile] of Object.entries(data.tiles)) {
+            if (tile) {
+                room.tilemap[key as TilePoint] = tile
+            } else {
+                delete room.tilemap[key as TilePoint]
+            }
+        }
+
+        if (data.roomIndex === this.currentRoomIndex) {
+            // Redraw the room in place, keeping the local player where it stands
+            this.teleportLocation = { ...this.player.currentTilePosition }
+            await this.loadRoom(this.currentRoomIndex)
+            this.teleportLocation = null
+        }
+    }
+
+    private onReceiveMessages = (batch: any[]) => {
+        for (const data of batch) {
+            this.onReceiveMessage(data)
+        }
+    }
+
+    // Messages sent in the room before we entered it, oldest first; the server sends them on join and room change
+    private onChatHistory = (history: ChatEntry[]) => {
+        for (const entry of history) {
+            signal.emit('newMessage', {
+                content: entry.message,
+                username: entry.username
+            })
+        }
+    }
+
     private displayInitialChatMessage = async () => {
         let channelName = ''
 
@@ -353,9 +419,13 @@ export class PlayApp extends App {
         server.socket.on('playerLeftRoom', this.onPlayerLeftRoom)
         server.socket.on('playerJoinedRoom', this.onPlayerJoinedRoom)
         server.socket.on('playerMoved', this.onPlayerMoved)
+        server.socket.on('playersMoved', this.onPlayersMoved)
         server.socket.on('playerTeleported', this.onPlayerTeleported)
+        server.socket.on('playersLeftView', this.onPlayersLeftView)
         server.socket.on('playerChangedSkin', this.onPlayerChangedSkin)
-        server.socket.on('receiveMessage', this.onReceiveMessage)
+        server.socket.on('receiveMessages', this.onReceiveMessages)
+        server.socket.on('chatHistory', this.onChatHistory)
+        server.socket.on('mapPatched', this.onMapPatched)
         server.socket.on('disconnect', this.onDisconnect)
         server.socket.on('kicked', this.onKicked)
     }
@@ -364,9 +434,13 @@ export class PlayApp extends App {
         server.socket.off('playerLeftRoom', this.onPlayerLeftRoom)
         server.socket.off('playerJoinedRoom', this.onPlayerJoinedRoom)
         server.socket.off('playerMoved', this.onPlayerMoved)
+        server.socket.off('playersMoved', this.onPlayersMoved)
         server.socket.off('playerTeleported', this.onPlayerTeleported)
+        server.socket.off('playersLeftView', this.onPlayersLeftView)
         server.socket.off('playerChangedSkin', this.onPlayerChangedSkin)
-        server.socket.off('receiveMessage', this.onReceiveMessage)
+        server.socket.off('receiveMessages', this.onReceiveMessages)
+        server.socket.off('chatHistory', this.onChatHistory)
+        server.socket.off('mapPatched', this.onMapPatched)
         server.socket.off('disconnect', this.onDisconnect)
         server.socket.off('kicked', this.onKicked)
     }
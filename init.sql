@@ -6,7 +6,9 @@ CREATE TABLE realms (
     name TEXT NOT NULL,
     map_data JSONB DEFAULT '{"spawnpoint":{"roomIndex":0,"x":0,"y":0},"rooms":[]}'::jsonb,
     share_id UUID DEFAULT uuid_generate_v4(),
-    only_owner BOOLEAN DEFAULT false
+    only_owner BOOLEAN DEFAULT false,
+    -- Bumped by every update; the ETags of the realm GET endpoints are built from it
+    version BIGINT NOT NULL DEFAULT 1
 );
 
 CREATE TABLE profiles (
@@ -15,3 +17,14 @@ CREATE TABLE profiles (
     skin TEXT DEFAULT '009',
     visited_realms TEXT[] DEFAULT '{}'
 );
+
+CREATE TABLE chat_messages (
+    id BIGSERIAL PRIMARY KEY,
+    realm_id UUID NOT NULL,
+    room_index INTEGER NOT NULL,
+    uid TEXT NOT NULL,
+    message TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX chat_messages_room_idx ON chat_messages (realm_id, room_index, created_at);